@@ -0,0 +1,480 @@
+"""
+Timed and recurring relay commands for the plant app.
+
+Once the app is running, `ActuatorScheduler` owns the relays. /control
+toggles, one-shot pulses ("pump on for 5 s") and duty cycles ("light 18 h
+on / 6 h off", "fan 10 min of every 30") all switch outputs through it.
+One worker thread sleeps until the next due edge on a heap. A pulse's
+length is therefore measured on the Pi's clock, not across two HTTP calls.
+
+Every switch-on is checked against per-device safety limits:
+- a cooldown after the device switched off;
+- a budget of on-time per rolling hour;
+- a maximum continuous on-time, enforced by a forced switch-off whatever
+  turned the device on.
+
+Commands are saved to a JSON file and resumed after a restart. Cycles are
+anchored to a wall-clock time, so they resume in the right phase. With a
+`ManualClock`, no thread is started and `advance()` steps through the due
+edges one by one, which makes schedules testable.
+"""
+
+import collections
+import heapq
+import itertools
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from atomic_io import atomic_write_json
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Per-device safety limits in seconds; None means no limit
+DEFAULT_LIMITS = {
+    'max_on_seconds': None,   # longest the device may stay on in one go
+    'min_off_seconds': 0,     # cooldown before it may switch on again
+    'max_on_per_hour': None,  # on-time budget over any rolling hour
+}
+MAX_SLEEP = 1.0      # re-check the wall clock at least this often (NTP steps, suspend)
+MISSED_GRACE = 60    # a pulse that was due while the app was down still runs if this late
+HISTORY_SIZE = 50
+
+SWITCHES = REGISTRY.counter('plant_app_actuator_switches', 'Relay switch operations', ['device', 'source'])
+BLOCKED = REGISTRY.counter('plant_app_actuator_blocked', 'Switch-ons refused by a safety limit', ['device'])
+LATENESS_SECONDS = REGISTRY.histogram(
+    'plant_app_actuator_lateness_seconds', 'Delay between a scheduled edge and the relay switching',
+    buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+)
+
+_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+class ActuatorError(ValueError):
+    """Invalid device, duration or command"""
+
+
+class SafetyLimitError(ActuatorError):
+    """A switch-on refused by the device's safety limits"""
+
+
+def parse_duration(value):
+    """Seconds from a number or a string such as '500ms', '5s', '10m' or '18h'"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        seconds = float(value)
+    else:
+        match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*(ms|s|m|h)?\s*', str(value))
+        if not match:
+            raise ActuatorError(f"Invalid duration '{value}' (e.g. 500ms, 5s, 10m, 18h)")
+        seconds = float(match.group(1)) * _DURATION_UNITS[match.group(2) or 's']
+    if seconds <= 0:
+        raise ActuatorError(f"Duration must be positive, got '{value}'")
+    return seconds
+
+
+def parse_anchor(value, now):
+    """Epoch time from None (now), an epoch number, 'HH:MM' (today, local time) or an ISO datetime"""
+    if value is None:
+        return now
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    try:
+        if re.fullmatch(r'\d{1,2}:\d{2}', value):
+            hour, minute = (int(part) for part in value.split(':'))
+            return datetime.fromtimestamp(now).replace(hour=hour, minute=minute, second=0,
+                                                       microsecond=0).timestamp()
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        raise ActuatorError(f"Invalid time '{value}' (expected HH:MM or an ISO datetime)")
+
+
+class SystemClock:
+    manual = False
+
+    def time(self):
+        return time.time()
+
+
+class ManualClock:
+    """A clock that only moves when told to; see ActuatorScheduler.advance"""
+
+    manual = True
+
+    def __init__(self, start=0.0):
+        self.now = float(start)
+
+    def time(self):
+        return self.now
+
+
+class ActuatorScheduler:
+    """Runs pulses and duty cycles on named relays within per-device safety limits"""
+
+    def __init__(self, relays, devices, path, limits=None, clock=None):
+        self.relays = relays
+        self.devices = dict(devices)  # name -> pin
+        self.path = path
+        self.clock = clock or SystemClock()
+        self.limits = {name: {**DEFAULT_LIMITS, **(limits or {}).get(name, {})} for name in self.devices}
+        self._cond = threading.Condition(threading.RLock())
+        self._io_lock = threading.Lock()
+        self._heap = []
+        self._seq = itertools.count()
+        self._commands = {}
+        self._history = collections.deque(maxlen=HISTORY_SIZE)
+        self._on_since = {}          # device -> when it switched on (absent while off)
+        self._off_at = {}            # device -> when it last switched off
+        self._usage = {name: collections.deque() for name in self.devices}  # [start, end] on-intervals
+        self._watchdog_token = {}
+        self._thread = None
+        self._stopped = False
+        self._loaded = self._load()
+
+    def _load(self):
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Error loading actuator commands: {e}")
+        return {}
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+
+    def start(self):
+        """Resume saved commands and, on the system clock, start the worker thread.
+
+        Call this after the relays are set up: resuming can switch outputs on.
+        """
+        with self._cond:
+            self._off_at.update(self._loaded.get('off_at', {}))
+            for device, intervals in self._loaded.get('usage', {}).items():
+                if device in self._usage:
+                    self._usage[device].extend(intervals)
+            for command in self._loaded.get('commands', []):
+                if command.get('device') in self.devices:
+                    self._resume(command)
+            self._loaded = {}
+        self._save()
+        if not self.clock.manual:
+            self._thread = threading.Thread(target=self._run, name='actuator-scheduler', daemon=True)
+            self._thread.start()
+
+    def close(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self._save()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    delay = self._heap[0][0] - self.clock.time() if self._heap else MAX_SLEEP
+                    if delay <= 0:
+                        break
+                    self._cond.wait(min(delay, MAX_SLEEP))
+                if self._stopped:
+                    return
+            try:
+                self.run_pending()
+            except Exception as e:
+                logger.error(f"Actuator scheduler error: {e}")
+
+    def run_pending(self):
+        """Run every edge that is due; returns how many ran"""
+        ran = 0
+        with self._cond:
+            now = self.clock.time()
+            while self._heap and self._heap[0][0] <= now:
+                due, _, _, action, args = heapq.heappop(self._heap)
+                action(due, *args)
+                ran += 1
+        if ran:
+            self._save()
+        return ran
+
+    def advance(self, seconds):
+        """ManualClock only: move time forward, running each edge at its own due time"""
+        target = self.clock.now + seconds
+        while True:
+            with self._cond:
+                if not self._heap or self._heap[0][0] > target:
+                    break
+                self.clock.now = max(self.clock.now, self._heap[0][0])
+            self.run_pending()
+        self.clock.now = target
+
+    def _schedule(self, due, action, *args, priority=0):
+        # On a tie the command's own edge runs before the safety watchdog (priority 1)
+        heapq.heappush(self._heap, (due, priority, next(self._seq), action, args))
+        self._cond.notify()
+
+    # ------------------------------------------------------------------
+    # Switching and safety limits
+
+    def _pin(self, device):
+        try:
+            return self.devices[device]
+        except KeyError:
+            raise ActuatorError(f"Unknown device '{device}'")
+
+    def _used_last_hour(self, device, now):
+        usage = self._usage[device]
+        while usage and usage[0][1] <= now - 3600:
+            usage.popleft()
+        used = sum(min(end, now) - max(start, now - 3600) for start, end in usage)
+        if device in self._on_since:
+            used += now - max(self._on_since[device], now - 3600)
+        return used
+
+    def _refusal(self, device, now):
+        limits = self.limits[device]
+        cooldown_end = self._off_at.get(device, float('-inf')) + (limits['min_off_seconds'] or 0)
+        if now < cooldown_end:
+            return f"{device} is cooling down for another {cooldown_end - now:.1f}s"
+        budget = limits['max_on_per_hour']
+        if budget is not None and self._used_last_hour(device, now) >= budget:
+            return f"{device} has used its {budget:g}s of on-time for this hour"
+        return None
+
+    def _switch(self, device, is_on, now, source):
+        """Drive one output; returns None on success or the reason a switch-on was refused"""
+        if is_on == (device in self._on_since):
+            return None
+        if is_on:
+            reason = self._refusal(device, now)
+            if reason:
+                BLOCKED.inc(device=device)
+                logger.warning(f"Refused to switch {device} on ({source}): {reason}")
+                return reason
+        self.relays.set(self.devices[device], is_on)
+        SWITCHES.inc(device=device, source=source)
+        token = self._watchdog_token[device] = self._watchdog_token.get(device, 0) + 1
+        if is_on:
+            self._on_since[device] = now
+            limits = self.limits[device]
+            allowed = [limit for limit in (limits['max_on_seconds'],) if limit is not None]
+            if limits['max_on_per_hour'] is not None:
+                allowed.append(limits['max_on_per_hour'] - self._used_last_hour(device, now))
+            if allowed:
+                self._schedule(now + max(min(allowed), 0), self._watchdog, device, token, priority=1)
+        else:
+            self._usage[device].append([self._on_since.pop(device), now])
+            self._off_at[device] = now
+        logger.info(f"Switched {device} {'on' if is_on else 'off'} ({source})")
+        return None
+
+    def _watchdog(self, due, device, token):
+        if self._watchdog_token.get(device) != token or device not in self._on_since:
+            return
+        logger.warning(f"{device} reached its on-time limit; switching it off")
+        self._switch(device, False, due, 'safety')
+        for command in list(self._commands.values()):
+            if command['device'] == device and command['status'] == 'running':
+                self._finish(command, 'limited', due)
+
+    def _cycle_wants_on(self, device, now):
+        """What an active duty cycle on `device` asks for right now (False without one)"""
+        for command in self._commands.values():
+            if command['type'] == 'cycle' and command['device'] == device:
+                return self._cycle_phase(command, now)[0]
+        return False
+
+    # ------------------------------------------------------------------
+    # Pulses
+
+    def pulse(self, device, duration, start=None):
+        """Switch `device` on for `duration` seconds, now or at epoch time `start`"""
+        self._pin(device)
+        duration = parse_duration(duration)
+        max_on = self.limits[device]['max_on_seconds']
+        if max_on is not None and duration > max_on:
+            raise ActuatorError(f"{device} may stay on for at most {max_on:g}s")
+        with self._cond:
+            now = self.clock.time()
+            command = {'id': uuid.uuid4().hex[:12], 'type': 'pulse', 'device': device, 'duration': duration,
+                       'start': parse_anchor(start, now), 'created': now, 'status': 'scheduled'}
+            self._commands[command['id']] = command
+            self._schedule(command['start'], self._pulse_on, command['id'])
+            result = dict(command)
+        self._save()
+        return result
+
+    def _pulse_on(self, due, command_id, duration=None):
+        command = self._commands.get(command_id)
+        if command is None or command['status'] not in ('scheduled', 'running'):
+            return
+        now = self.clock.time()
+        LATENESS_SECONDS.observe(max(now - due, 0))
+        reason = self._switch(command['device'], True, now, 'pulse')
+        if reason:
+            command['reason'] = reason
+            self._finish(command, 'blocked', now)
+            return
+        command['status'] = 'running'
+        command['started_at'] = now
+        # Time the pulse from the moment the relay actually closed
+        self._schedule(now + (duration or command['duration']), self._pulse_off, command_id)
+
+    def _pulse_off(self, due, command_id):
+        command = self._commands.get(command_id)
+        if command is None or command['status'] != 'running':
+            return
+        now = self.clock.time()
+        LATENESS_SECONDS.observe(max(now - due, 0))
+        device = command['device']
+        # Fall back to whatever a duty cycle on the same device wants
+        if not self._cycle_wants_on(device, now):
+            self._switch(device, False, now, 'pulse')
+        self._finish(command, 'done', now)
+
+    def _finish(self, command, status, now):
+        command['status'] = status
+        command['ended_at'] = now
+        if 'started_at' in command:
+            command['actual_ms'] = round((now - command['started_at']) * 1000, 1)
+        self._commands.pop(command['id'], None)
+        self._history.append(command)
+
+    # ------------------------------------------------------------------
+    # Duty cycles
+
+    def cycle(self, device, on, off, anchor=None):
+        """Repeat `on` seconds on / `off` seconds off, with an on-edge at `anchor`.
+
+        A new cycle replaces any cycle already running on the device.
+        """
+        self._pin(device)
+        on, off = parse_duration(on), parse_duration(off)
+        max_on = self.limits[device]['max_on_seconds']
+        if max_on is not None and on > max_on:
+            raise ActuatorError(f"{device} may stay on for at most {max_on:g}s")
+        with self._cond:
+            now = self.clock.time()
+            for old in [c for c in self._commands.values() if c['type'] == 'cycle' and c['device'] == device]:
+                self._finish(old, 'replaced', now)
+            command = {'id': uuid.uuid4().hex[:12], 'type': 'cycle', 'device': device, 'on': on, 'off': off,
+                       'anchor': parse_anchor(anchor, now), 'created': now, 'status': 'active'}
+            self._commands[command['id']] = command
+            self._cycle_edge(now, command['id'])
+            result = dict(command)
+        self._save()
+        return result
+
+    def _cycle_phase(self, command, at):
+        """(is_on, time of the next edge) for a cycle at time `at`"""
+        period = command['on'] + command['off']
+        phase = (at - command['anchor']) % period
+        if phase < command['on']:
+            return True, at + command['on'] - phase
+        return False, at + period - phase
+
+    def _cycle_edge(self, due, command_id):
+        command = self._commands.get(command_id)
+        if command is None:
+            return
+        # Evaluate the phase at the due time, so each edge lands exactly one
+        # on/off span after the previous one no matter how late this runs
+        is_on, next_edge = self._cycle_phase(command, due)
+        now = self.clock.time()
+        LATENESS_SECONDS.observe(max(now - due, 0))
+        reason = self._switch(command['device'], is_on, now, 'cycle')
+        if reason:
+            command['blocked'] = command.get('blocked', 0) + 1
+            command['reason'] = reason
+        self._schedule(next_edge, self._cycle_edge, command_id)
+
+    # ------------------------------------------------------------------
+    # Manual control, cancellation and status
+
+    def switch(self, device, is_on, source='manual'):
+        """Switch a device on or off now; raises SafetyLimitError if a limit refuses it"""
+        return self._manual(device, lambda: bool(is_on), source)
+
+    def toggle(self, device, source='manual'):
+        """Flip a device; returns the new state"""
+        return self._manual(device, lambda: device not in self._on_since, source)
+
+    def _manual(self, device, target, source):
+        self._pin(device)
+        with self._cond:
+            is_on = target()
+            reason = self._switch(device, is_on, self.clock.time(), source)
+        if reason:
+            raise SafetyLimitError(reason)
+        self._save()
+        return is_on
+
+    def cancel(self, command_id):
+        """Stop a pending or running command; a running output is switched off"""
+        with self._cond:
+            command = self._commands.get(command_id)
+            if command is None:
+                return False
+            now = self.clock.time()
+            if command['status'] in ('running', 'active'):
+                self._switch(command['device'], False, now, 'cancel')
+            self._finish(command, 'cancelled', now)
+        self._save()
+        return True
+
+    def status(self):
+        with self._cond:
+            now = self.clock.time()
+            devices = {
+                name: {
+                    'on': name in self._on_since,
+                    'on_since': self._on_since.get(name),
+                    'used_last_hour': round(self._used_last_hour(name, now), 3),
+                    'limits': dict(self.limits[name]),
+                }
+                for name in self.devices
+            }
+            return {
+                'time': now,
+                'devices': devices,
+                'commands': [dict(c) for c in self._commands.values()],
+                'history': [dict(c) for c in reversed(self._history)],
+            }
+
+    def _save(self):
+        with self._cond:
+            now = self.clock.time()
+            state = {
+                'commands': [dict(c) for c in self._commands.values()],
+                'usage': {name: [list(i) for i in usage if i[1] > now - 3600] for name, usage in self._usage.items()},
+                'off_at': dict(self._off_at),
+            }
+        try:
+            with self._io_lock:
+                atomic_write_json(self.path, state)
+        except OSError as e:
+            logger.error(f"Error saving actuator commands: {e}")
+
+    def _resume(self, command):
+        now = self.clock.time()
+        self._commands[command['id']] = command
+        if command['type'] == 'cycle':
+            self._cycle_edge(now, command['id'])
+        elif command['status'] == 'running':
+            remaining = command['started_at'] + command['duration'] - now
+            if remaining > 0:
+                logger.info(f"Resuming {command['device']} pulse for {remaining:.1f}s")
+                self._schedule(now, self._pulse_on, command['id'], remaining)
+            else:
+                self._finish(command, 'done', now)
+        elif command['start'] < now - MISSED_GRACE:
+            self._finish(command, 'missed', now)
+        else:
+            self._schedule(command['start'], self._pulse_on, command['id'])
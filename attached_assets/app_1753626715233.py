@@ -1,24 +1,62 @@
-from flask import Flask, render_template, jsonify, request, redirect, url_for
-import RPi.GPIO as GPIO
+from flask import Flask, render_template, jsonify, request, redirect, url_for, Response, send_file, send_from_directory, g
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import uuid
 import json
-import requests
-from picamera import PiCamera
-from time import sleep
 import calendar
+import math
 from dotenv import load_dotenv
+import atexit
 import logging
+import logging.handlers
+import queue
+import threading
+import time
+from calendar_store import CalendarStore
+from plant_registry import PlantRegistry
+from plant_db import Database, SqliteCalendarStore, SqlitePlantRegistry, import_json_files
+from photo_index import PhotoIndex
+from camera_service import CameraService, create_backend
+from notifier import TelegramDispatcher, TELEGRAM_API
+from image_pipeline import ImagePipeline
+from schedule_planner import SchedulePlanner, PlanError, parse_date
+from sensor_store import SensorStore
+from hardware import create_relays
+from actuator_scheduler import ActuatorScheduler, ActuatorError, SafetyLimitError
+from metrics import REGISTRY
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # not on the Pi; single-process serving is then up to the operator
+    fcntl = None
+
+# Importing this module only defines configuration and routes. Files, hardware,
+# stores and worker threads are opened by create_app(), so the import is cheap.
+# The app owns the relays, the camera and the actuator watchdog, so only one
+# process may serve an APP_DIR; create_app() holds LOCK_FILE to enforce that.
 
-# Initialize logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', filename='/home/pi/MyPlantApp/flask.log')
 logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
+# Everything the app stores lives here; override to run off the Pi
+APP_DIR = os.getenv('PLANT_APP_DIR', '/home/pi/MyPlantApp')
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+TELEGRAM_API_BASE = os.getenv('TELEGRAM_API_BASE', TELEGRAM_API)
+# "gpio", "simulated", or "auto" (GPIO when RPi.GPIO imports). The camera defaults
+# to the fake backend whenever the relays are simulated.
+HARDWARE_BACKEND = os.getenv('HARDWARE_BACKEND', 'auto')
+CAMERA_BACKEND = os.getenv('CAMERA_BACKEND')
+# "production" serves with waitress (if installed) on SERVER_THREADS worker threads;
+# "development" uses Flask's debug server
+SERVER_MODE = os.getenv('SERVER_MODE', 'production')
+SERVER_THREADS = int(os.getenv('SERVER_THREADS', '8'))
+SERVER_PORT = int(os.getenv('SERVER_PORT', '5000'))
+# "sqlite" keeps plants and calendars in DB_FILE, importing plants.json and the
+# calendar files once on first start; "json" keeps using the JSON files
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sqlite')
 
 app = Flask(__name__)
 
@@ -44,105 +82,249 @@ STAGE_PRESETS = {
     ]
 }
 
+schedule_planner = SchedulePlanner(STAGE_PRESETS)
+
 # File paths
-PLANTS_FILE = '/home/pi/MyPlantApp/plants.json'
-PHOTO_FOLDER = '/home/pi/MyPlantApp/static/photos'
-CALENDAR_FILE = '/home/pi/MyPlantApp/calendar_data.json'
-
-# Initialize files and directories
-os.makedirs(PHOTO_FOLDER, exist_ok=True)
-if not os.path.exists(PLANTS_FILE):
-    with open(PLANTS_FILE, 'w') as f:
-        json.dump([], f)
-if not os.path.exists(CALENDAR_FILE):
-    with open(CALENDAR_FILE, 'w') as f:
-        json.dump({}, f)
+DB_FILE = os.path.join(APP_DIR, 'plant_app.db')
+PLANTS_FILE = os.path.join(APP_DIR, 'plants.json')
+PHOTO_FOLDER = os.path.join(APP_DIR, 'static/photos')
+CALENDAR_FILE = os.path.join(APP_DIR, 'calendar_data.json')
+PHOTO_INDEX_FILE = os.path.join(APP_DIR, 'photo_index.db')
+SENSOR_DB_FILE = os.path.join(APP_DIR, 'sensor_data.db')
+ACTUATOR_FILE = os.path.join(APP_DIR, 'actuator_commands.json')
+LOCK_FILE = os.path.join(APP_DIR, 'app.lock')
+TELEGRAM_QUEUE_DIR = os.path.join(APP_DIR, 'telegram_queue')
+DERIVED_FOLDER = os.path.join(APP_DIR, 'derived')  # thumbnails and timelapses
+
+# Thumbnails are named after their (never rewritten) photo, so they can be cached forever
+THUMBNAIL_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Calendar reads may be stored but must be revalidated (cheap 304s via ETag)
+CALENDAR_CACHE_CONTROL = 'no-cache'
+CALENDAR_CACHE_SIZE = 256
+# A playing timelapse holds a server thread, so each response streams at most this
+# many seconds of frames; the plant page links every part, the latest one first
+TIMELAPSE_MAX_SECONDS = 15
+TIMELAPSE_DEFAULT_FPS = 8
+UPCOMING_DEFAULT_DAYS = 7
+# Charts default to the last day, drawn with about this many points
+SENSOR_HISTORY_DEFAULT_SECONDS = 24 * 3600
+SENSOR_HISTORY_MAX_POINTS = 500
 
 # GPIO pins
 LIGHT_PIN = 17
 FAN_PIN = 27
 PUMP_PIN = 22
 
+# Safety limits in seconds, enforced for manual, pulsed and cycled switching alike
+# (see actuator_scheduler.DEFAULT_LIMITS)
+ACTUATOR_LIMITS = {
+    'pump': {'max_on_seconds': 60, 'min_off_seconds': 30, 'max_on_per_hour': 300},
+    'light': {'max_on_seconds': 20 * 3600},
+}
+
+# Set by create_app()
+log_listener = None
+lock_file = None
+relays = None
+actuators = None
+notifier = None
+database = None
+plants = None
+calendar_store = None
+photo_index = None
+image_pipeline = None
+sensor_store = None
+camera_service = None
+
+def setup_logging():
+    """Handlers only enqueue records; one listener thread writes flask.log"""
+    global log_listener
+    if log_listener is not None:
+        return
+    os.makedirs(APP_DIR, exist_ok=True)
+    log_queue = queue.SimpleQueue()
+    log_file_handler = logging.FileHandler(os.path.join(APP_DIR, 'flask.log'))
+    log_file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    log_listener = logging.handlers.QueueListener(log_queue, log_file_handler)
+    log_listener.start()
+    atexit.register(log_listener.stop)  # drain queued records on exit
+    logging.basicConfig(level=logging.INFO, handlers=[logging.handlers.QueueHandler(log_queue)])
+
 def setup_gpio():
     try:
-        GPIO.setwarnings(False)
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(LIGHT_PIN, GPIO.OUT, initial=GPIO.LOW)
-        GPIO.setup(FAN_PIN, GPIO.OUT, initial=GPIO.LOW)
-        GPIO.setup(PUMP_PIN, GPIO.OUT, initial=GPIO.LOW)
-        logger.info("GPIO setup completed")
+        relays.setup([LIGHT_PIN, FAN_PIN, PUMP_PIN])
+        logger.info(f"GPIO setup completed{' (simulated)' if relays.simulated else ''}")
     except Exception as e:
         logger.error(f"GPIO setup failed: {e}")
 
-def toggle(pin):
-    try:
-        GPIO.output(pin, not GPIO.input(pin))
-        logger.info(f"Toggled GPIO pin {pin}")
-    except Exception as e:
-        logger.error(f"Failed to toggle GPIO pin {pin}: {e}")
-
 def send_telegram_message(text, image_path=None):
     try:
-        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-        data = {"chat_id": TELEGRAM_CHAT_ID, "text": text}
-        response = requests.post(url, data=data)
-        response.raise_for_status()
-        logger.info(f"Sent Telegram message: {text}")
-
-        if image_path and os.path.exists(image_path):
-            url_photo = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendPhoto"
-            with open(image_path, "rb") as photo:
-                response = requests.post(url_photo, data={"chat_id": TELEGRAM_CHAT_ID}, files={"photo": photo})
-                response.raise_for_status()
-                logger.info(f"Sent Telegram photo: {image_path}")
-    except requests.RequestException as e:
-        logger.error(f"Telegram error: {e}")
-
-def load_plants():
-    try:
-        if os.path.exists(PLANTS_FILE):
-            with open(PLANTS_FILE, 'r') as f:
-                return json.load(f)
-        logger.info("Plants file not found, returning empty list")
-        return []
-    except json.JSONDecodeError as e:
-        logger.error(f"Error loading plants: {e}")
-        return []
-    except Exception as e:
-        logger.error(f"Unexpected error loading plants: {e}")
-        return []
-
-def save_plants(plants):
-    try:
-        with open(PLANTS_FILE, 'w') as f:
-            json.dump(plants, f, indent=2)
-        logger.info("Plants saved successfully")
-    except Exception as e:
-        logger.error(f"Error saving plants: {e}")
-
-def load_calendar_data():
-    try:
-        if os.path.exists(CALENDAR_FILE):
-            with open(CALENDAR_FILE, 'r') as f:
-                return json.load(f)
-        logger.info("Calendar file not found, returning empty dict")
-        return {}
-    except json.JSONDecodeError as e:
-        logger.error(f"Error loading calendar data: {e}")
-        return {}
+        notifier.send(text, image_path=image_path)
     except Exception as e:
-        logger.error(f"Unexpected error loading calendar data: {e}")
-        return {}
-
-def save_calendar_data(data):
+        logger.error(f"Failed to queue Telegram message: {e}")
+
+# Serialized calendar responses keyed by request path; an entry is reused while its ETag is current.
+# The ETag includes an epoch token because JSON store versions restart from zero on boot;
+# the SQLite store keeps its versions and epoch in the database, shared by every process.
+calendar_cache = OrderedDict()
+calendar_cache_lock = threading.Lock()
+CALENDAR_ETAG_EPOCH = uuid.uuid4().hex[:8]
+
+def calendar_response(version, modified, build):
+    etag = f"{getattr(calendar_store, 'etag_epoch', CALENDAR_ETAG_EPOCH)}-{version}"
+    key = request.full_path
+    with calendar_cache_lock:
+        cached = calendar_cache.get(key)
+        if cached is not None and cached[0] == etag:
+            calendar_cache.move_to_end(key)
+            body = cached[1]
+        else:
+            body = None
+    if body is None:
+        body = json.dumps(build())
+        with calendar_cache_lock:
+            calendar_cache[key] = (etag, body)
+            calendar_cache.move_to_end(key)
+            while len(calendar_cache) > CALENDAR_CACHE_SIZE:
+                calendar_cache.popitem(last=False)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.last_modified = datetime.fromtimestamp(modified, timezone.utc)
+    response.headers['Cache-Control'] = CALENDAR_CACHE_CONTROL
+    return response.make_conditional(request)
+
+def month_bounds(value):
+    """'YYYY-MM' -> ('YYYY-MM-01', 'YYYY-MM-<last day>')"""
     try:
-        with open(CALENDAR_FILE, 'w') as f:
-            json.dump(data, f, indent=2)
-        logger.info("Calendar data saved successfully")
-    except Exception as e:
-        logger.error(f"Error saving calendar data: {e}")
-
-plants = load_plants()
+        year, month = (int(part) for part in value.split('-'))
+        last_day = calendar.monthrange(year, month)[1]
+    except (ValueError, calendar.IllegalMonthError):
+        raise PlanError(f"Invalid month '{value}' (expected YYYY-MM)")
+    return f"{year:04d}-{month:02d}-01", f"{year:04d}-{month:02d}-{last_day:02d}"
+
+def on_photo_captured(job, path):
+    photo_index.add(job['filename'], job['plant_id'])
+    image_pipeline.submit(job['filename'], job['plant_id'])
+    plant = plants.get(job['plant_id'])
+    name = plant['name'] if plant else job['plant_id']
+    send_telegram_message(f"New photo for plant {name}", image_path=path)
+
+def create_app():
+    """Open storage, hardware handles and worker threads; returns the Flask app.
+
+    Serve it from a single process (threads are fine, forked workers are not):
+    each process would drive the same relays and camera and run its own
+    actuator watchdog. A second process on the same APP_DIR gets a
+    RuntimeError. Later calls in the same process return the same app.
+    The relay pins are configured and the actuator scheduler started here;
+    the camera, Telegram's HTTP session and Pillow are only touched on first use.
+    """
+    global relays, actuators, notifier, database, plants, calendar_store
+    global photo_index, image_pipeline, sensor_store, camera_service, lock_file
+    if plants is not None:
+        return app
+    started = time.perf_counter()
+    setup_logging()
+
+    os.makedirs(PHOTO_FOLDER, exist_ok=True)
+    lock_file = acquire_app_lock(LOCK_FILE)
+    if STORAGE_BACKEND == 'sqlite':
+        # One pooled connection per server thread, plus one for background work
+        database = Database(DB_FILE, pool_size=SERVER_THREADS + 1)
+        import_json_files(database, PLANTS_FILE, CALENDAR_FILE)
+        plants = SqlitePlantRegistry(database)
+        calendar_store = SqliteCalendarStore(database)
+    else:
+        for path, empty in ((PLANTS_FILE, []), (CALENDAR_FILE, {})):
+            if not os.path.exists(path):
+                with open(path, 'w') as f:
+                    json.dump(empty, f)
+        plants = PlantRegistry(PLANTS_FILE)
+        calendar_store = CalendarStore(CALENDAR_FILE)
+
+    relays = create_relays(HARDWARE_BACKEND)
+    actuators = ActuatorScheduler(relays, {'light': LIGHT_PIN, 'fan': FAN_PIN, 'pump': PUMP_PIN},
+                                  ACTUATOR_FILE, limits=ACTUATOR_LIMITS)
+    notifier = TelegramDispatcher(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, TELEGRAM_QUEUE_DIR,
+                                  api_base=TELEGRAM_API_BASE)
+    notifier.start()
+    photo_index = PhotoIndex(PHOTO_INDEX_FILE, PHOTO_FOLDER)
+    image_pipeline = ImagePipeline(PHOTO_FOLDER, DERIVED_FOLDER)
+    image_pipeline.start()
+    sensor_store = SensorStore(SENSOR_DB_FILE)
+    sensor_store.start()
+    camera_service = CameraService(
+        create_backend(CAMERA_BACKEND or ('fake' if relays.simulated else 'picamera'), resolution=(1024, 768)),
+        PHOTO_FOLDER,
+        on_capture=on_photo_captured
+    )
+    camera_service.start()
+    setup_gpio()
+    # After the relays are set up: resuming saved commands can switch outputs on
+    actuators.start()
+    # Checking every photo for missing thumbnails can take a while; don't hold up startup
+    threading.Thread(target=lambda: image_pipeline.backfill(photo_index.all()),
+                     name='thumbnail-backfill', daemon=True).start()
+
+    logger.info(f"App ready in {(time.perf_counter() - started) * 1000:.0f} ms")
+    return app
+
+def acquire_app_lock(path):
+    """Hold an exclusive lock on `path` for the life of the process, or raise if another process has it"""
+    handle = open(path, 'a+')
+    if fcntl is not None:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            raise RuntimeError(f"Another process is already serving {APP_DIR}; run a single server process")
+    handle.seek(0)
+    handle.truncate()
+    handle.write(f"{os.getpid()}\n")
+    handle.flush()
+    return handle
+
+def shutdown():
+    """Stop worker threads and close stores and hardware opened by create_app()"""
+    global lock_file
+    if plants is None:
+        return
+    camera_service.stop()
+    image_pipeline.stop()
+    notifier.stop()
+    calendar_store.close()
+    sensor_store.close()
+    actuators.close()
+    plants.close()
+    photo_index.close()
+    relays.cleanup()
+    logger.info("GPIO cleanup completed")
+    if lock_file is not None:
+        lock_file.close()
+        lock_file = None
+
+REQUEST_SECONDS = REGISTRY.histogram('plant_app_request_seconds', 'Time to handle an HTTP request',
+                                     ['method', 'route', 'status'])
+REGISTRY.gauge('plant_app_plants', 'Plants in the registry', function=lambda: len(plants))
+REGISTRY.gauge('plant_app_telegram_queue', 'Telegram messages waiting to be sent', function=lambda: notifier.pending())
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Label by route pattern, not path, so plant ids don't each become a series
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method, route=route,
+                                status=f"{response.status_code // 100}xx")
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/health')
 def health_check():
@@ -154,74 +336,160 @@ def health_check():
 
 @app.route('/')
 def home():
-    return render_template('index.html', plants=plants)
+    return render_template('index.html', plants=plants.all())
 
 @app.route('/plants')
 def list_plants():
-    return render_template('plants.html', plants=plants)
+    return render_template('plants.html', plants=plants.all())
+
+def parse_time(value):
+    """Epoch seconds or an ISO 8601 timestamp -> epoch seconds"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
 
 @app.route('/sensor-data')
 def sensor_data():
-    return jsonify({
-        'temperature': 22.5,
-        'humidity': 55.0,
-        'soil': 300
-    })
+    """Newest value per metric, e.g. {'temperature': 22.5, 'humidity': 55.0, 'soil': 300, 'timestamp': ...}"""
+    latest = sensor_store.latest(request.args.get('source', ''))
+    data = {'temperature': None, 'humidity': None, 'soil': None}
+    data.update({metric: value for metric, (_, value) in latest.items()})
+    data['timestamp'] = max((ts for ts, _ in latest.values()), default=None)
+    return jsonify(data)
+
+@app.route('/sensor-data', methods=['POST'])
+def ingest_sensor_data():
+    """Store one reading or a list: {"temperature": 22.5, "soil": 300, "timestamp"?: ..., "source"?: ...}"""
+    try:
+        payload = request.json
+        readings = payload if isinstance(payload, list) else [payload]
+        # Validate the whole request first so a bad reading doesn't leave the earlier ones stored
+        parsed = []
+        for reading in readings:
+            reading = dict(reading)
+            timestamp = reading.pop('timestamp', None)
+            source = reading.pop('source', '')
+            values = {k: v for k, v in reading.items()
+                      if isinstance(v, (int, float)) and not isinstance(v, bool)}
+            timestamp = parse_time(timestamp) if timestamp is not None else None
+            for name, value in list(values.items()) + [('timestamp', timestamp or 0)]:
+                if not math.isfinite(value):
+                    raise ValueError(f"{name} must be a finite number")
+            parsed.append((values, timestamp, source))
+        for values, timestamp, source in parsed:
+            sensor_store.add(values, timestamp, source)
+        return jsonify({'accepted': len(readings)}), 202
+    except (TypeError, ValueError, AttributeError) as e:
+        logger.error(f"Rejected sensor data: {e}")
+        return jsonify({'error': f'Invalid sensor data: {str(e)}'}), 400
+    except Exception as e:
+        logger.error(f"Error storing sensor data: {e}")
+        return jsonify({'error': f'Failed to store sensor data: {str(e)}'}), 500
+
+@app.route('/sensor-data/history')
+def sensor_history():
+    """?metric=temperature&start=&end=&points=&source= -> downsampled [[t, avg, min, max, count], ...]"""
+    try:
+        metric = request.args.get('metric')
+        if not metric:
+            return jsonify({'error': 'metric is required'}), 400
+        end = parse_time(request.args['end']) if request.args.get('end') else time.time()
+        start = parse_time(request.args['start']) if request.args.get('start') else end - SENSOR_HISTORY_DEFAULT_SECONDS
+        points = request.args.get('points', SENSOR_HISTORY_MAX_POINTS, type=int)
+        if end <= start or points < 1:
+            return jsonify({'error': 'start must be before end and points positive'}), 400
+        result = sensor_store.query(metric, start, end, request.args.get('source', ''), points)
+        result.update(metric=metric, start=start, end=end)
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid time range: {str(e)}'}), 400
+    except Exception as e:
+        logger.error(f"Error querying sensor history: {e}")
+        return jsonify({'error': f'Failed to load sensor history: {str(e)}'}), 500
 
 @app.route('/control', methods=['POST'])
 def control():
     try:
         device = request.json.get('device')
-        if device == 'light':
-            toggle(LIGHT_PIN)
-        elif device == 'fan':
-            toggle(FAN_PIN)
-        elif device == 'pump':
-            toggle(PUMP_PIN)
-        return jsonify({'status': 'ok'})
+        if device not in actuators.devices:
+            return jsonify({'status': 'ok'})
+        return jsonify({'status': 'ok', 'device': device, 'on': actuators.toggle(device)})
+    except SafetyLimitError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 409
     except Exception as e:
         logger.error(f"Control endpoint failed: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/api/actuators', methods=['GET'])
+def actuator_status():
+    return jsonify(actuators.status())
+
+@app.route('/api/actuators/commands', methods=['POST'])
+def add_actuator_command():
+    """Schedule a pulse or a duty cycle.
+
+    {"device": "pump", "type": "pulse", "duration": "5s", "start": "2025-07-01T06:00"}
+    {"device": "light", "type": "cycle", "on": "18h", "off": "6h", "anchor": "06:00"}
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        kind = data.get('type', 'pulse')
+        if kind == 'pulse':
+            command = actuators.pulse(data.get('device'), data.get('duration'), start=data.get('start'))
+        elif kind == 'cycle':
+            command = actuators.cycle(data.get('device'), data.get('on'), data.get('off'),
+                                      anchor=data.get('anchor'))
+        else:
+            return jsonify({'error': f"Unknown command type '{kind}' (expected pulse or cycle)"}), 400
+        return jsonify(command), 201
+    except ActuatorError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error scheduling actuator command: {e}")
+        return jsonify({'error': f'Failed to schedule command: {str(e)}'}), 500
+
+@app.route('/api/actuators/commands/<command_id>', methods=['DELETE'])
+def cancel_actuator_command(command_id):
+    if not actuators.cancel(command_id):
+        return jsonify({'error': 'Command not found'}), 404
+    return jsonify({'status': 'cancelled'})
+
 @app.route('/capture/<plant_id>', methods=['POST'])
 def capture(plant_id):
-    plant = next((p for p in plants if p["id"] == plant_id), None)
+    plant = plants.get(plant_id)
     if not plant:
         logger.error(f"Plant not found: {plant_id}")
         return jsonify({'error': 'Plant not found'}), 404
 
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = os.path.join(PHOTO_FOLDER, f'{plant_id}_{timestamp}.jpg')
-
     try:
-        camera = PiCamera()
-        camera.resolution = (1024, 768)
-        sleep(2)  # Camera warm-up
-        camera.capture(filename)
-        camera.close()
-        logger.info(f"Photo captured: {filename}")
-
-        send_telegram_message(f"New photo for plant {plant['name']}", image_path=filename)
-        return redirect(url_for('view_plant', plant_id=plant_id))
+        job = camera_service.submit(plant_id)
+        logger.info(f"Queued capture job {job['id']} for plant {plant_id}")
+        if request.accept_mimetypes.best == 'application/json' or request.is_json:
+            return jsonify({'job_id': job['id'], 'status': job['status'],
+                            'status_url': url_for('capture_status', job_id=job['id'])}), 202
+        return redirect(url_for('view_plant', plant_id=plant_id, capture_job=job['id']))
     except Exception as e:
-        logger.error(f"Failed to capture photo: {e}")
+        logger.error(f"Failed to queue photo capture: {e}")
         return jsonify({'error': f'Failed to capture photo: {str(e)}'}), 500
 
+@app.route('/capture/jobs/<job_id>')
+def capture_status(job_id):
+    job = camera_service.get(job_id)
+    if not job:
+        return jsonify({'error': 'Capture job not found'}), 404
+    return jsonify(job)
+
 @app.route('/plant/<plant_id>')
 def view_plant(plant_id):
-    plant = next((p for p in plants if p["id"] == plant_id), None)
+    plant = plants.get(plant_id)
     if not plant:
         logger.error(f"Plant not found: {plant_id}")
         return "Plant not found", 404
 
     # Photos
-    prefix = f"{plant_id}_"
     try:
-        photo_files = sorted(
-            [f for f in os.listdir(PHOTO_FOLDER) if f.startswith(prefix) and f.endswith('.jpg')],
-            key=lambda x: os.path.getmtime(os.path.join(PHOTO_FOLDER, x)),
-            reverse=True
-        )
+        photo_files = photo_index.latest(plant_id, limit=6)
         latest_photo = photo_files[0] if photo_files else None
         photo_history = photo_files[1:6] if len(photo_files) > 1 else []
         logger.info(f"Loaded {len(photo_files)} photos for plant {plant_id}")
@@ -231,7 +499,7 @@ def view_plant(plant_id):
         photo_history = []
 
     # Calendar
-    today = datetime.date.today()
+    today = datetime.now().date()
     year = today.year
     month = today.month
     month_days = calendar.monthrange(year, month)[1]
@@ -242,6 +510,7 @@ def view_plant(plant_id):
         plant=plant,
         latest_photo=latest_photo,
         photo_history=photo_history,
+        timelapse_parts=timelapse_parts(image_pipeline.frame_count(plant_id), TIMELAPSE_DEFAULT_FPS),
         year=year,
         month=month,
         month_name=month_name,
@@ -251,11 +520,11 @@ def view_plant(plant_id):
 @app.route('/latest-photo')
 def latest_photo():
     try:
-        photos = [f for f in os.listdir(PHOTO_FOLDER) if f.endswith('.jpg')]
+        photos = photo_index.latest(limit=1)
         if not photos:
             logger.info("No photos available")
             return "No photos available", 404
-        latest_photo = max(photos, key=lambda f: os.path.getmtime(os.path.join(PHOTO_FOLDER, f)))
+        latest_photo = photos[0]
         logger.info(f"Latest photo: {latest_photo}")
         return render_template('photo.html', photo_url=os.path.join(PHOTO_FOLDER, latest_photo))
     except Exception as e:
@@ -270,6 +539,71 @@ def view_photo(filename):
         return "Photo not found", 404
     return render_template('photo.html', photo_url=filepath)
 
+@app.route('/thumb/<size>/<filename>')
+def thumbnail(size, filename):
+    if size not in image_pipeline.sizes:
+        return "Unknown thumbnail size", 404
+    try:
+        path = image_pipeline.ensure_thumbnail(size, filename)
+    except Exception as e:
+        logger.error(f"Failed to render thumbnail {size}/{filename}: {e}")
+        path = None
+    if path is None:
+        # No thumbnail possible (e.g. Pillow not installed): fall back to the original
+        if not os.path.exists(os.path.join(PHOTO_FOLDER, filename)):
+            return "Photo not found", 404
+        return send_from_directory(PHOTO_FOLDER, filename)
+    response = send_from_directory(os.path.dirname(path), filename)
+    response.headers['Cache-Control'] = THUMBNAIL_CACHE_CONTROL
+    return response
+
+def timelapse_parts(total, fps):
+    """Start frames of the timelapse parts at `fps`, oldest first; the last part ends on the newest frame"""
+    limit = max(int(fps * TIMELAPSE_MAX_SECONDS), 1)
+    return [max(end - limit, 0) for end in range(total, 0, -limit)][::-1]
+
+@app.route('/timelapse/<plant_id>')
+def timelapse(plant_id):
+    """Stream up to TIMELAPSE_MAX_SECONDS of frames from ?start (default: the latest part).
+
+    A Link header names the previous and next parts.
+    """
+    if not plants.get(plant_id):
+        return "Plant not found", 404
+    total = image_pipeline.frame_count(plant_id)
+    if total == 0:
+        return "No timelapse frames yet", 404
+    fps = min(max(request.args.get('fps', TIMELAPSE_DEFAULT_FPS, type=float), 1), 30)
+    limit = max(int(fps * TIMELAPSE_MAX_SECONDS), 1)
+    start = min(max(request.args.get('start', total - limit, type=int), 0), total - 1)
+
+    def frames():
+        for frame in image_pipeline.timelapse_frames(plant_id, start=start, limit=limit):
+            yield (b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: ' + str(len(frame)).encode()
+                   + b'\r\n\r\n' + frame + b'\r\n')
+            time.sleep(1 / fps)
+
+    # Browsers play multipart MJPEG directly in an <img> tag
+    response = Response(frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    links = []
+    if start > 0:
+        links.append((max(start - limit, 0), 'prev'))
+    if start + limit < total:
+        links.append((start + limit, 'next'))
+    if links:
+        response.headers['Link'] = ', '.join(
+            f'<{url_for("timelapse", plant_id=plant_id, start=part, fps=f"{fps:g}")}>; rel="{rel}"'
+            for part, rel in links)
+    return response
+
+@app.route('/timelapse/<plant_id>/download')
+def download_timelapse(plant_id):
+    path = image_pipeline.timelapse_path(plant_id) if plants.get(plant_id) else None
+    if not path:
+        return "No timelapse for this plant", 404
+    return send_file(path, mimetype='video/x-motion-jpeg', as_attachment=True,
+                     download_name=f"{plant_id}_timelapse.mjpeg")
+
 @app.route('/add-plant', methods=['POST'])
 def add_plant():
     try:
@@ -293,8 +627,7 @@ def add_plant():
             'location': location,
             'stage': stage
         }
-        plants.append(plant)
-        save_plants(plants)
+        plants.add(plant)
         logger.info(f"Added plant: {plant_id}")
         return redirect(url_for('home'))
     except Exception as e:
@@ -303,14 +636,45 @@ def add_plant():
 
 @app.route("/api/calendar/<plant_id>", methods=["GET"])
 def get_calendar(plant_id):
+    """Full calendar, or ?month=YYYY-MM, or ?start=YYYY-MM-DD&end=YYYY-MM-DD (both inclusive)"""
     try:
-        data = load_calendar_data()
-        logger.info(f"Loaded calendar data for plant {plant_id}")
-        return jsonify(data.get(plant_id, {}))
+        if request.args.get('month'):
+            start, end = month_bounds(request.args['month'])
+        elif request.args.get('start') or request.args.get('end'):
+            start = parse_date(request.args['start']).isoformat() if request.args.get('start') else ''
+            end = parse_date(request.args['end']).isoformat() if request.args.get('end') else '9999-12-31'
+        else:
+            start = end = None
+
+        version, modified = calendar_store.plant_version(plant_id)
+        if start is None:
+            return calendar_response(version, modified, lambda: calendar_store.get_plant(plant_id))
+        return calendar_response(version, modified, lambda: calendar_store.get_range(plant_id, start, end))
+    except PlanError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"Error retrieving calendar for plant {plant_id}: {e}")
         return jsonify({"error": f"Failed to load calendar: {str(e)}"}), 500
 
+@app.route("/api/calendar/upcoming", methods=["GET"])
+def upcoming_tasks():
+    """Tasks across all plants from ?start (default today) for ?days days, at most ?limit entries"""
+    try:
+        start = parse_date(request.args['start']) if request.args.get('start') else datetime.now().date()
+        days = request.args.get('days', UPCOMING_DEFAULT_DAYS, type=int)
+        limit = request.args.get('limit', type=int)
+        if days < 1 or (limit is not None and limit < 1):
+            return jsonify({"error": "days and limit must be positive"}), 400
+        end = start + timedelta(days=days - 1)
+        # The window moves at midnight without a write, so the start date is part of the version
+        return calendar_response(f"{calendar_store.version}.{start.isoformat()}", calendar_store.modified,
+                                 lambda: calendar_store.upcoming(start.isoformat(), end.isoformat(), limit))
+    except PlanError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error retrieving upcoming tasks: {e}")
+        return jsonify({"error": f"Failed to load upcoming tasks: {str(e)}"}), 500
+
 @app.route("/api/calendar/generate/<plant_id>", methods=["POST"])
 def generate_calendar(plant_id):
     try:
@@ -322,23 +686,55 @@ def generate_calendar(plant_id):
             logger.error(f"Generate calendar failed for plant {plant_id}: Invalid request")
             return jsonify({"error": "Invalid request"}), 400
 
-        start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-        data = load_calendar_data()
-        if plant_id not in data:
-            data[plant_id] = {}
-
-        for entry in STAGE_PRESETS[stage]:
-            task_date = start_date + timedelta(days=entry["offset"])
-            date_str = task_date.strftime("%Y-%m-%d")
-            data[plant_id][date_str] = entry["task"]
-
-        save_calendar_data(data)
+        tasks = schedule_planner.plan(start_date_str, [stage])
+        calendar_store.set_tasks(plant_id, tasks)
         logger.info(f"Generated calendar for plant {plant_id}, stage {stage}")
         return jsonify(success=True)
     except Exception as e:
         logger.error(f"Error generating calendar for plant {plant_id}: {e}")
         return jsonify({"error": f"Failed to generate calendar: {str(e)}"}), 500
 
+@app.route("/api/calendar/bulk-generate", methods=["POST"])
+def bulk_generate_calendar():
+    """Schedule many plants at once.
+
+    Body: {"plants": [id or {"plant_id", "start_date"?, "stages"?}] or "where": {"location": ...},
+           "start_date": "YYYY-MM-DD", "stages": ["seed", "veg", "flower"],
+           "durations": {"seed": 7, "veg": 28}, "replace": false}
+    """
+    try:
+        req = request.json or {}
+        if 'plants' in req:
+            targets = [p if isinstance(p, dict) else {'plant_id': p} for p in req['plants']]
+        elif 'where' in req:
+            targets = [{'plant_id': p['id']} for p in plants.find(**req['where'])]
+        else:
+            return jsonify({"error": "Either plants or where is required"}), 400
+
+        default_stages = req.get("stages") or ([req["stage"]] if req.get("stage") else None)
+        durations = req.get("durations")
+        generated = {}
+        for target in targets:
+            plant_id = target.get('plant_id')
+            if not plant_id:
+                return jsonify({"error": "Every plant entry needs a plant_id"}), 400
+            start = target.get('start_date', req.get('start_date'))
+            stages = target.get('stages', default_stages)
+            if not start or not stages:
+                return jsonify({"error": f"start_date and stages are required for plant {plant_id}"}), 400
+            generated[plant_id] = schedule_planner.plan(start, stages, target.get('durations', durations))
+
+        # One atomic write for the whole batch
+        written = calendar_store.set_many(generated, replace=bool(req.get("replace")))
+        logger.info(f"Bulk generated calendars for {len(generated)} plants ({written} records)")
+        return jsonify({"success": True, "count": len(generated), "plants": generated})
+    except (PlanError, ValueError, TypeError) as e:
+        logger.error(f"Bulk calendar generation rejected: {e}")
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error bulk generating calendars: {e}")
+        return jsonify({"error": f"Failed to generate calendars: {str(e)}"}), 500
+
 @app.route("/api/calendar/<plant_id>", methods=["POST"])
 def update_calendar(plant_id):
     try:
@@ -346,14 +742,10 @@ def update_calendar(plant_id):
         date = req.get("date")
         action = req.get("action")
 
-        data = load_calendar_data()
-        if plant_id not in data:
-            data[plant_id] = {}
         if action.strip() == "":
-            data[plant_id].pop(date, None)
+            calendar_store.remove_task(plant_id, date)
         else:
-            data[plant_id][date] = action
-        save_calendar_data(data)
+            calendar_store.set_task(plant_id, date, action)
         logger.info(f"Updated calendar for plant {plant_id} on {date}")
         return jsonify(success=True)
     except Exception as e:
@@ -371,11 +763,7 @@ def add_calendar(plant_id):
             logger.error(f"Add calendar failed for plant {plant_id}: Missing date or action")
             return jsonify({"error": "Date and action are required"}), 400
 
-        data = load_calendar_data()
-        if plant_id not in data:
-            data[plant_id] = {}
-        data[plant_id][date] = action
-        save_calendar_data(data)
+        calendar_store.set_task(plant_id, date, action)
         logger.info(f"Added calendar entry for plant {plant_id} on {date}")
         return jsonify(success=True)
     except Exception as e:
@@ -385,23 +773,33 @@ def add_calendar(plant_id):
 @app.route("/api/calendar/<plant_id>", methods=["DELETE"])
 def delete_calendar(plant_id):
     try:
-        data = load_calendar_data()
-        if plant_id in data:
-            del data[plant_id]
-            save_calendar_data(data)
+        if calendar_store.delete_plant(plant_id):
             logger.info(f"Deleted calendar for plant {plant_id}")
         return jsonify(success=True)
     except Exception as e:
         logger.error(f"Error deleting calendar for plant {plant_id}: {e}")
         return jsonify({"error": f"Failed to delete calendar: {str(e)}"}), 500
 
+def serve():
+    """Run the app: waitress thread pool in production, Flask's debug server in development"""
+    if SERVER_MODE == 'development':
+        logger.info("Starting Flask development server")
+        app.run(host='0.0.0.0', port=SERVER_PORT, debug=True, use_reloader=False, threaded=True)
+        return
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        logger.warning("waitress not installed (pip install waitress); using Flask's threaded server")
+        app.run(host='0.0.0.0', port=SERVER_PORT, threaded=True)
+        return
+    logger.info(f"Starting waitress with {SERVER_THREADS} threads")
+    waitress_serve(app, host='0.0.0.0', port=SERVER_PORT, threads=SERVER_THREADS)
+
 if __name__ == '__main__':
     try:
-        setup_gpio()
-        logger.info("Starting Flask server")
-        app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False)
+        create_app()
+        serve()
     except Exception as e:
         logger.error(f"Failed to start Flask server: {e}")
     finally:
-        GPIO.cleanup()
-        logger.info("GPIO cleanup completed")
\ No newline at end of file
+        shutdown()
\ No newline at end of file
@@ -0,0 +1,33 @@
+"""
+Crash-safe file helpers shared by the plant app's storage modules.
+"""
+
+import json
+import os
+
+
+def fsync_dir(path):
+    """Flush a directory entry so a rename survives power loss"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_json(path, data, **dump_kwargs):
+    """Write `data` to `path` via temp file + rename so readers never see a partial file"""
+    directory = os.path.dirname(path) or '.'
+    tmp_path = f"{path}.tmp"
+    dump_kwargs.setdefault('separators', (',', ':'))
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, **dump_kwargs)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_dir(directory)
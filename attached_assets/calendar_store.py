@@ -0,0 +1,330 @@
+"""
+Append-only calendar storage for the plant app.
+
+The calendar is kept in memory as {plant_id: {date: task}} with a reverse
+index of date -> plant ids. Every edit is appended as one JSON line to a
+write-ahead log next to the snapshot file, so a single edit costs one small
+append instead of a full rewrite. Memory is only updated once the append has
+succeeded, so a failed write leaves no trace of the edit. The log is folded back into the snapshot
+(written atomically via a temp file and os.replace) once it grows past
+`compact_every` records.
+
+Every write bumps a store-wide version and stamps the plants it touched,
+which readers use as ETags. Sorted date lists are built lazily on the first
+range query after a change, so month and "upcoming" reads are a bisect plus
+a slice rather than a scan of every task.
+"""
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+from atomic_io import atomic_write_json
+from metrics import STORAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class CalendarStore:
+    """Indexed calendar with O(1) appends and periodic compaction"""
+
+    def __init__(self, path, compact_every=1000, fsync=True):
+        self.path = path
+        self.log_path = f"{path}.log"
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self._lock = threading.RLock()
+        self._by_plant = {}
+        self._by_date = {}
+        self._log_records = 0
+        self._log_file = None
+        self._sorted_by_plant = {}
+        self._sorted_dates = None
+        self._changed = {}
+        self.version = 0
+        self.modified = time.time()
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+    def _load(self):
+        with STORAGE_SECONDS.time(file='calendar', op='load'):
+            self._read_files()
+
+        logger.info(f"Calendar loaded: {len(self._by_plant)} plants, {self._log_records} pending log records")
+
+        if self._log_records >= self.compact_every:
+            self.compact()
+
+    def _read_files(self):
+        snapshot = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    snapshot = json.load(f) or {}
+            except json.JSONDecodeError as e:
+                logger.error(f"Calendar snapshot unreadable, starting empty: {e}")
+                snapshot = {}
+
+        for plant_id, tasks in snapshot.items():
+            for date, task in tasks.items():
+                self._apply_set(plant_id, date, task)
+
+        if os.path.exists(self.log_path):
+            good_offset = 0
+            torn = False
+            with open(self.log_path, 'rb') as f:
+                for line_no, line in enumerate(f, 1):
+                    # Only a newline-terminated record was completely written
+                    complete = line.endswith(b'\n')
+                    if complete and not line.strip():
+                        good_offset += len(line)
+                        continue
+                    try:
+                        record = json.loads(line) if complete else None
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        record = None
+                    if record is None:
+                        # A torn final write from a crash; everything before it is intact
+                        logger.warning(f"Ignoring truncated calendar log record at line {line_no}")
+                        torn = True
+                        break
+                    self._replay(record)
+                    self._log_records += 1
+                    good_offset += len(line)
+            if torn:
+                # Cut the torn tail off so new appends don't land behind (or glued onto) it
+                # and get discarded along with it on the next load
+                with open(self.log_path, 'r+b') as f:
+                    f.truncate(good_offset)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+        mtimes = [os.path.getmtime(p) for p in (self.path, self.log_path) if os.path.exists(p)]
+        if mtimes:
+            self.modified = max(mtimes)
+
+    def _replay(self, record):
+        op = record.get('op')
+        if op == 'set':
+            self._apply_set(record['plant'], record['date'], record['task'])
+        elif op == 'del':
+            self._apply_remove(record['plant'], record['date'])
+        elif op == 'drop':
+            self._apply_drop(record['plant'])
+        elif op == 'batch':
+            for inner in record['records']:
+                self._replay(inner)
+
+    # ------------------------------------------------------------------
+    # In-memory index maintenance
+    # ------------------------------------------------------------------
+    def _apply_set(self, plant_id, date, task):
+        tasks = self._by_plant.setdefault(plant_id, {})
+        if date not in tasks:
+            self._sorted_by_plant.pop(plant_id, None)
+            if date not in self._by_date:
+                self._sorted_dates = None
+        tasks[date] = task
+        self._by_date.setdefault(date, set()).add(plant_id)
+
+    def _apply_remove(self, plant_id, date):
+        tasks = self._by_plant.get(plant_id)
+        if tasks is None or tasks.pop(date, None) is None:
+            return False
+        self._sorted_by_plant.pop(plant_id, None)
+        plants_on_date = self._by_date.get(date)
+        if plants_on_date is not None:
+            plants_on_date.discard(plant_id)
+            if not plants_on_date:
+                del self._by_date[date]
+                self._sorted_dates = None
+        return True
+
+    def _apply_drop(self, plant_id):
+        tasks = self._by_plant.pop(plant_id, None)
+        if tasks is None:
+            return False
+        self._sorted_by_plant.pop(plant_id, None)
+        for date in tasks:
+            plants_on_date = self._by_date.get(date)
+            if plants_on_date is not None:
+                plants_on_date.discard(plant_id)
+                if not plants_on_date:
+                    del self._by_date[date]
+                    self._sorted_dates = None
+        return True
+
+    def _touch(self, plant_ids):
+        self.version += 1
+        self.modified = time.time()
+        for plant_id in plant_ids:
+            self._changed[plant_id] = (self.version, self.modified)
+
+    # ------------------------------------------------------------------
+    # Write-ahead log
+    # ------------------------------------------------------------------
+    def _append(self, records):
+        """Log the records, then apply them to memory; raises (changing nothing) if the write fails"""
+        with STORAGE_SECONDS.time(file='calendar', op='append'):
+            if self._log_file is None:
+                self._log_file = open(self.log_path, 'a')
+            size = os.fstat(self._log_file.fileno()).st_size
+            try:
+                self._log_file.write(''.join(json.dumps(r, separators=(',', ':')) + '\n' for r in records))
+                self._log_file.flush()
+                if self.fsync:
+                    os.fsync(self._log_file.fileno())
+            except OSError:
+                self._truncate_log(size)
+                raise
+        for record in records:
+            self._replay(record)
+        self._touch({inner['plant'] for r in records for inner in r.get('records', [r])})
+        self._log_records += len(records)
+        if self._log_records >= self.compact_every:
+            self.compact()
+
+    def _truncate_log(self, size):
+        """Cut off a partly written record so the next append starts on a fresh line"""
+        try:
+            self._log_file.close()
+        except OSError:
+            pass
+        self._log_file = None
+        try:
+            with open(self.log_path, 'r+b') as f:
+                f.truncate(size)
+        except OSError as e:
+            logger.error(f"Could not trim failed calendar log write: {e}")
+
+    def compact(self):
+        """Fold the log into a fresh snapshot and truncate the log"""
+        with self._lock:
+            with STORAGE_SECONDS.time(file='calendar', op='save'):
+                atomic_write_json(self.path, self._by_plant)
+            # Replaying the old log over the new snapshot is idempotent, so a
+            # crash between the rename and the truncate loses nothing.
+            if self._log_file is not None:
+                self._log_file.close()
+                self._log_file = None
+            with open(self.log_path, 'w') as f:
+                f.flush()
+                os.fsync(f.fileno())
+            logger.info(f"Calendar compacted ({self._log_records} log records folded)")
+            self._log_records = 0
+
+    def close(self):
+        with self._lock:
+            if self._log_file is not None:
+                self._log_file.close()
+                self._log_file = None
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def get_plant(self, plant_id):
+        """Return a copy of {date: task} for one plant"""
+        with self._lock:
+            return dict(self._by_plant.get(plant_id, {}))
+
+    def snapshot(self):
+        """Return a copy of the whole calendar as {plant_id: {date: task}}"""
+        with self._lock:
+            return {plant_id: dict(tasks) for plant_id, tasks in self._by_plant.items()}
+
+    def plants_on(self, date):
+        """Return the ids of plants with a task on `date`"""
+        with self._lock:
+            return set(self._by_date.get(date, ()))
+
+    def plant_version(self, plant_id):
+        """(version, timestamp) of the last write touching `plant_id`"""
+        with self._lock:
+            return self._changed.get(plant_id, (0, self.modified))
+
+    def _plant_dates(self, plant_id):
+        dates = self._sorted_by_plant.get(plant_id)
+        if dates is None:
+            dates = sorted(self._by_plant.get(plant_id, ()))
+            self._sorted_by_plant[plant_id] = dates
+        return dates
+
+    def get_range(self, plant_id, start, end):
+        """Return {date: task} for one plant with start <= date <= end (YYYY-MM-DD strings)"""
+        with self._lock:
+            dates = self._plant_dates(plant_id)
+            tasks = self._by_plant.get(plant_id, {})
+            lo = bisect.bisect_left(dates, start)
+            hi = bisect.bisect_right(dates, end)
+            return {date: tasks[date] for date in dates[lo:hi]}
+
+    def upcoming(self, start, end, limit=None):
+        """Tasks for all plants between start and end as [{date, plant_id, task}], by date"""
+        with self._lock:
+            if self._sorted_dates is None:
+                self._sorted_dates = sorted(self._by_date)
+            dates = self._sorted_dates
+            lo = bisect.bisect_left(dates, start)
+            hi = bisect.bisect_right(dates, end)
+            result = []
+            for date in dates[lo:hi]:
+                for plant_id in sorted(self._by_date[date]):
+                    result.append({'date': date, 'plant_id': plant_id, 'task': self._by_plant[plant_id][date]})
+                    if limit is not None and len(result) >= limit:
+                        return result
+            return result
+
+    def set_task(self, plant_id, date, task):
+        with self._lock:
+            if self._by_plant.get(plant_id, {}).get(date) == task:
+                return
+            self._append([{'op': 'set', 'plant': plant_id, 'date': date, 'task': task}])
+
+    def set_tasks(self, plant_id, tasks):
+        """Set several {date: task} entries for a plant with a single log write"""
+        with self._lock:
+            records = [{'op': 'set', 'plant': plant_id, 'date': date, 'task': task}
+                       for date, task in tasks.items()]
+            if records:
+                self._append(records)
+
+    def set_many(self, tasks_by_plant, replace=False):
+        """Apply {plant_id: {date: task}} for many plants as one atomic log record.
+
+        With `replace`, each listed plant's existing tasks are dropped first.
+        The whole batch is a single line in the log, so after a crash either
+        all of it or none of it is replayed.
+        """
+        with self._lock:
+            records = []
+            for plant_id, tasks in tasks_by_plant.items():
+                if replace and plant_id in self._by_plant:
+                    records.append({'op': 'drop', 'plant': plant_id})
+                for date, task in tasks.items():
+                    records.append({'op': 'set', 'plant': plant_id, 'date': date, 'task': task})
+            if records:
+                self._append([{'op': 'batch', 'records': records}])
+            return len(records)
+
+    def remove_task(self, plant_id, date):
+        with self._lock:
+            if date in self._by_plant.get(plant_id, {}):
+                self._append([{'op': 'del', 'plant': plant_id, 'date': date}])
+                return True
+            return False
+
+    def delete_plant(self, plant_id):
+        with self._lock:
+            if plant_id in self._by_plant:
+                self._append([{'op': 'drop', 'plant': plant_id}])
+                return True
+            return False
+
+    def __contains__(self, plant_id):
+        with self._lock:
+            return plant_id in self._by_plant
@@ -0,0 +1,236 @@
+"""
+Long-lived camera worker for the plant app.
+
+The camera is opened and warmed up once, then a single worker thread
+drains a queue of capture jobs. Request handlers only enqueue a job and
+get its id back; concurrent requests for the same plant are coalesced into
+the job that is already waiting.
+"""
+
+import base64
+import collections
+import logging
+import os
+import queue
+import threading
+import uuid
+from datetime import datetime
+from time import perf_counter, sleep
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_SECONDS = REGISTRY.histogram('plant_app_camera_capture_seconds', 'Time to capture one photo', ['outcome'])
+
+# 8x8 green JPEG used by FakeCameraBackend when Pillow is not installed
+_PLACEHOLDER_JPEG = base64.b64decode(
+    "/9j/4AAQSkZJRgABAQAAAQABAAD/2wBDABALDA4MChAODQ4SERATGCgaGBYWGDEjJR0oOjM9PDkz"
+    "ODdASFxOQERXRTc4UG1RV19iZ2hnPk1xeXBkeFxlZ2P/2wBDARESEhgVGC8aGi9jQjhCY2NjY2Nj"
+    "Y2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2P/wAARCAAIAAgDASIA"
+    "AhEBAxEB/8QAHwAAAQUBAQEBAQEAAAAAAAAAAAECAwQFBgcICQoL/8QAtRAAAgEDAwIEAwUFBAQA"
+    "AAF9AQIDAAQRBRIhMUEGE1FhByJxFDKBkaEII0KxwRVS0fAkM2JyggkKFhcYGRolJicoKSo0NTY3"
+    "ODk6Q0RFRkdISUpTVFVWV1hZWmNkZWZnaGlqc3R1dnd4eXqDhIWGh4iJipKTlJWWl5iZmqKjpKWm"
+    "p6ipqrKztLW2t7i5usLDxMXGx8jJytLT1NXW19jZ2uHi4+Tl5ufo6erx8vP09fb3+Pn6/8QAHwEA"
+    "AwEBAQEBAQEBAQAAAAAAAAECAwQFBgcICQoL/8QAtREAAgECBAQDBAcFBAQAAQJ3AAECAxEEBSEx"
+    "BhJBUQdhcRMiMoEIFEKRobHBCSMzUvAVYnLRChYkNOEl8RcYGRomJygpKjU2Nzg5OkNERUZHSElK"
+    "U1RVVldYWVpjZGVmZ2hpanN0dXZ3eHl6goOEhYaHiImKkpOUlZaXmJmaoqOkpaanqKmqsrO0tba3"
+    "uLm6wsPExcbHyMnK0tPU1dbX2Nna4uPk5ebn6Onq8vP09fb3+Pn6/9oADAMBAAIRAxEAPwCpRRRX"
+    "Eeef/9k="
+)
+
+
+class PiCameraBackend:
+    """Keeps one PiCamera open for the lifetime of the process"""
+
+    def __init__(self, resolution=(1024, 768), warmup=2):
+        self.resolution = resolution
+        self.warmup = warmup
+        self._camera = None
+
+    def open(self):
+        from picamera import PiCamera
+        self._camera = PiCamera()
+        self._camera.resolution = self.resolution
+        sleep(self.warmup)  # Camera warm-up, paid once per process
+        logger.info("Camera initialized")
+
+    def capture(self, path):
+        if self._camera is None:
+            self.open()
+        self._camera.capture(path)
+
+    def close(self):
+        if self._camera is not None:
+            self._camera.close()
+            self._camera = None
+
+
+class FakeCameraBackend:
+    """Writes synthetic JPEGs so the capture path can run without hardware"""
+
+    def __init__(self, resolution=(1024, 768), delay=0):
+        self.resolution = resolution
+        self.delay = delay
+        self.frames = 0
+
+    def open(self):
+        pass
+
+    def capture(self, path):
+        if self.delay:
+            sleep(self.delay)
+        self.frames += 1
+        try:
+            from PIL import Image, ImageDraw
+        except ImportError:
+            with open(path, 'wb') as f:
+                f.write(_PLACEHOLDER_JPEG)
+            return
+        width, height = self.resolution
+        image = Image.new('RGB', self.resolution, (40, 30, 20))
+        draw = ImageDraw.Draw(image)
+        # A "plant" that grows a little with every frame
+        radius = min(width, height) // 8 + self.frames % (min(width, height) // 4)
+        draw.ellipse(
+            (width // 2 - radius, height // 2 - radius, width // 2 + radius, height // 2 + radius),
+            fill=(50, 160, 60)
+        )
+        image.save(path, 'JPEG', quality=80)
+
+    def close(self):
+        pass
+
+
+BACKENDS = {
+    'picamera': PiCameraBackend,
+    'fake': FakeCameraBackend,
+}
+
+
+def create_backend(name, **kwargs):
+    try:
+        return BACKENDS[name](**kwargs)
+    except KeyError:
+        raise ValueError(f"Unknown camera backend '{name}'")
+
+
+class CameraService:
+    """Serializes captures through one worker thread and tracks them as jobs"""
+
+    def __init__(self, backend, photo_folder, on_capture=None, max_jobs=200):
+        self.backend = backend
+        self.photo_folder = photo_folder
+        self.on_capture = on_capture
+        self.max_jobs = max_jobs
+        self._queue = queue.Queue()
+        self._jobs = collections.OrderedDict()
+        self._pending_by_plant = {}
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def start(self):
+        if self._worker is not None:
+            return
+        self._worker = threading.Thread(target=self._run, name='camera-worker', daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        if self._worker is None:
+            return
+        self._queue.put(None)
+        self._worker.join(timeout=10)
+        self._worker = None
+        self.backend.close()
+
+    def submit(self, plant_id):
+        """Queue a capture and return its job; a still-queued job for the same plant is reused"""
+        with self._lock:
+            pending_id = self._pending_by_plant.get(plant_id)
+            if pending_id in self._jobs:
+                return dict(self._jobs[pending_id])
+            job = {
+                'id': uuid.uuid4().hex[:12],
+                'plant_id': plant_id,
+                'status': 'queued',
+                'filename': None,
+                'error': None,
+                'created_at': datetime.now().isoformat(),
+            }
+            self._jobs[job['id']] = job
+            self._pending_by_plant[plant_id] = job['id']
+            self._trim_jobs()
+        self._queue.put(job['id'])
+        return dict(job)
+
+    def _trim_jobs(self):
+        """Forget the oldest finished jobs; with none left, fail the oldest queued one"""
+        while len(self._jobs) > self.max_jobs:
+            finished = next((job_id for job_id, job in self._jobs.items()
+                             if job['status'] in ('done', 'failed')), None)
+            if finished is not None:
+                del self._jobs[finished]
+                continue
+            oldest = next((job for job in self._jobs.values() if job['status'] == 'queued'), None)
+            if oldest is not None:
+                # Kept so pollers see why it never ran; trimmed like any finished job later
+                oldest['status'] = 'failed'
+                oldest['error'] = 'evicted: capture queue full'
+                self._pending_by_plant.pop(oldest['plant_id'], None)
+            break
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _run(self):
+        try:
+            self.backend.open()
+        except Exception as e:
+            logger.error(f"Camera initialization failed: {e}")
+
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                break
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job['status'] != 'queued':
+                    continue
+                self._pending_by_plant.pop(job['plant_id'], None)
+                job['status'] = 'running'
+            self._capture(job)
+
+    def _capture(self, job):
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        photo_name = f"{job['plant_id']}_{timestamp}.jpg"
+        path = os.path.join(self.photo_folder, photo_name)
+        suffix = 0
+        while os.path.exists(path):
+            # Two captures for one plant within the same second
+            suffix += 1
+            photo_name = f"{job['plant_id']}_{timestamp}-{suffix}.jpg"
+            path = os.path.join(self.photo_folder, photo_name)
+        started = perf_counter()
+        try:
+            self.backend.capture(path)
+            CAPTURE_SECONDS.observe(perf_counter() - started, outcome='ok')
+            logger.info(f"Photo captured: {path}")
+        except Exception as e:
+            CAPTURE_SECONDS.observe(perf_counter() - started, outcome='error')
+            logger.error(f"Failed to capture photo: {e}")
+            with self._lock:
+                job['status'] = 'failed'
+                job['error'] = str(e)
+            return
+
+        with self._lock:
+            job['status'] = 'done'
+            job['filename'] = photo_name
+
+        if self.on_capture is not None:
+            try:
+                self.on_capture(dict(job), path)
+            except Exception as e:
+                logger.error(f"Post-capture hook failed for {photo_name}: {e}")
@@ -0,0 +1,108 @@
+"""
+Relay access for the plant app.
+
+`GpioRelays` drives the relay board through RPi.GPIO. `SimulatedRelays`
+keeps pin states in memory, so the app imports and runs on any Linux box
+(pair it with CAMERA_BACKEND=fake). The "auto" backend uses GPIO when
+RPi.GPIO is installed and the simulation otherwise. RPi.GPIO itself is
+imported on first use.
+"""
+
+import importlib.util
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class GpioRelays:
+    """Relay outputs on RPi.GPIO pins (BCM numbering)"""
+
+    simulated = False
+
+    def __init__(self):
+        self._module = None
+
+    @property
+    def _gpio(self):
+        if self._module is None:
+            import RPi.GPIO as GPIO
+            self._module = GPIO
+        return self._module
+
+    def setup(self, pins):
+        self._gpio.setwarnings(False)
+        self._gpio.setmode(self._gpio.BCM)
+        for pin in pins:
+            self._gpio.setup(pin, self._gpio.OUT, initial=self._gpio.LOW)
+
+    def toggle(self, pin):
+        is_on = not self._gpio.input(pin)
+        self._gpio.output(pin, is_on)
+        return is_on
+
+    def set(self, pin, is_on):
+        self._gpio.output(pin, bool(is_on))
+
+    def state(self, pin):
+        return bool(self._gpio.input(pin))
+
+    def cleanup(self):
+        self._gpio.cleanup()
+
+
+class SimulatedRelays:
+    """In-memory relay bank for running the app without a Pi"""
+
+    simulated = True
+
+    def __init__(self):
+        self.states = {}
+        self.switches = 0
+        self._lock = threading.Lock()
+
+    def setup(self, pins):
+        with self._lock:
+            for pin in pins:
+                self.states[pin] = False
+
+    def toggle(self, pin):
+        with self._lock:
+            is_on = self.states[pin] = not self.states.get(pin, False)
+            self.switches += 1
+            return is_on
+
+    def set(self, pin, is_on):
+        with self._lock:
+            if self.states.get(pin, False) != bool(is_on):
+                self.switches += 1
+            self.states[pin] = bool(is_on)
+
+    def state(self, pin):
+        with self._lock:
+            return self.states.get(pin, False)
+
+    def cleanup(self):
+        with self._lock:
+            self.states.clear()
+
+
+RELAY_BACKENDS = {
+    'gpio': GpioRelays,
+    'simulated': SimulatedRelays,
+}
+
+
+def create_relays(name='auto'):
+    if name == 'auto':
+        try:
+            if importlib.util.find_spec('RPi.GPIO') is not None:
+                return GpioRelays()
+        except ImportError:
+            pass  # no RPi package at all
+        logger.warning("RPi.GPIO not available; using simulated relays")
+        return SimulatedRelays()
+    try:
+        return RELAY_BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown hardware backend '{name}'")
@@ -0,0 +1,213 @@
+"""
+Background thumbnail and timelapse pipeline for captured photos.
+
+Each new photo is decoded once (using JPEG draft mode, so the decoder
+itself downscales) and saved as a set of smaller thumbnails. The medium
+thumbnail is then appended as a frame to the plant's timelapse, a plain
+MJPEG stream plus a small text index of frame offsets: adding a frame is
+one append and nothing already in the timelapse is re-encoded.
+"""
+
+import importlib.util
+import logging
+import os
+import queue
+import threading
+
+# Pillow is imported on the worker thread with the first photo; only check it's there
+HAS_PIL = importlib.util.find_spec('PIL') is not None
+
+logger = logging.getLogger(__name__)
+
+# Largest first: each size is derived from the one before it
+THUMBNAIL_SIZES = {
+    'medium': (640, 480),
+    'small': (160, 120),
+}
+TIMELAPSE_SIZE = 'medium'
+
+
+class ImagePipeline:
+    """Makes thumbnails and extends per-plant timelapses on a worker thread"""
+
+    def __init__(self, photo_folder, output_folder, sizes=THUMBNAIL_SIZES,
+                 timelapse_size=TIMELAPSE_SIZE, quality=80):
+        self.photo_folder = photo_folder
+        self.output_folder = output_folder
+        self.sizes = sizes
+        self.timelapse_size = timelapse_size
+        self.quality = quality
+        self.timelapse_folder = os.path.join(output_folder, 'timelapse')
+        for size in sizes:
+            os.makedirs(os.path.join(output_folder, size), exist_ok=True)
+        os.makedirs(self.timelapse_folder, exist_ok=True)
+        self._queue = queue.Queue()
+        self._lock = threading.RLock()
+        self._timelapse_frames = {}
+        self._worker = None
+        if not HAS_PIL:
+            logger.warning("Pillow not installed; thumbnails and timelapses are disabled")
+
+    def start(self):
+        if self._worker is not None or not HAS_PIL:
+            return
+        self._worker = threading.Thread(target=self._run, name='image-pipeline', daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        if self._worker is None:
+            return
+        self._queue.put(None)
+        self._worker.join(timeout=30)
+        self._worker = None
+
+    def submit(self, filename, plant_id):
+        """Queue a freshly captured photo for thumbnails and its timelapse frame"""
+        if HAS_PIL:
+            self._queue.put((filename, plant_id))
+
+    def backfill(self, photos):
+        """Queue (filename, plant_id) pairs, oldest first, that are missing any output"""
+        queued = 0
+        for filename, plant_id in photos:
+            if (not all(os.path.exists(self.thumbnail_path(size, filename)) for size in self.sizes)
+                    or filename not in self._frames(plant_id)):
+                self.submit(filename, plant_id)
+                queued += 1
+        if queued:
+            logger.info(f"Queued {queued} photos for thumbnails/timelapse")
+        return queued
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            filename, plant_id = item
+            try:
+                self.process(filename, plant_id)
+            except Exception as e:
+                logger.error(f"Image pipeline failed for {filename}: {e}")
+
+    def process(self, filename, plant_id):
+        self.make_thumbnails(filename)
+        self.append_frame(plant_id, filename)
+
+    # ------------------------------------------------------------------
+    # Thumbnails
+    # ------------------------------------------------------------------
+    def thumbnail_path(self, size, filename):
+        return os.path.join(self.output_folder, size, filename)
+
+    def make_thumbnails(self, filename):
+        """Decode the photo once and write every thumbnail size"""
+        from PIL import Image
+        source = os.path.join(self.photo_folder, filename)
+        with Image.open(source) as image:
+            largest = max(self.sizes.values())
+            image.draft('RGB', largest)  # let the JPEG decoder downscale by 1/2, 1/4 or 1/8
+            image = image.convert('RGB')
+        for size, dimensions in self.sizes.items():
+            image.thumbnail(dimensions)
+            path = self.thumbnail_path(size, filename)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            image.save(tmp_path, 'JPEG', quality=self.quality, optimize=True)
+            os.replace(tmp_path, path)
+
+    def ensure_thumbnail(self, size, filename):
+        """Path of a thumbnail, rendering it now if the worker hasn't yet; None if impossible"""
+        if size not in self.sizes:
+            return None
+        path = self.thumbnail_path(size, filename)
+        if os.path.exists(path):
+            return path
+        if not HAS_PIL or not os.path.exists(os.path.join(self.photo_folder, filename)):
+            return None
+        self.make_thumbnails(filename)
+        return path
+
+    # ------------------------------------------------------------------
+    # Timelapse
+    # ------------------------------------------------------------------
+    def _timelapse_paths(self, plant_id):
+        base = os.path.join(self.timelapse_folder, plant_id)
+        return base + '.mjpeg', base + '.idx'
+
+    def _frames(self, plant_id):
+        """[(offset, length, filename)] for a plant, loaded from its index on first use"""
+        with self._lock:
+            frames = self._timelapse_frames.get(plant_id)
+            if frames is None:
+                frames = self._timelapse_frames[plant_id] = _FrameList(self._load_index(plant_id))
+            return frames
+
+    def _load_index(self, plant_id):
+        _, index_path = self._timelapse_paths(plant_id)
+        frames = []
+        try:
+            with open(index_path, 'r') as f:
+                for line in f:
+                    parts = line.rstrip('\n').split(' ', 2)
+                    if len(parts) == 3:
+                        frames.append((int(parts[0]), int(parts[1]), parts[2]))
+        except FileNotFoundError:
+            pass
+        return frames
+
+    def append_frame(self, plant_id, filename):
+        """Append the photo's timelapse-size thumbnail to the plant's MJPEG; returns False if present"""
+        frames = self._frames(plant_id)
+        if filename in frames:
+            return False
+        with open(self.thumbnail_path(self.timelapse_size, filename), 'rb') as f:
+            frame = f.read()
+        video_path, index_path = self._timelapse_paths(plant_id)
+        with self._lock:
+            with open(video_path, 'ab') as video:
+                offset = video.tell()
+                video.write(frame)
+                video.flush()
+                os.fsync(video.fileno())
+            # Written after the frame, so a crash never indexes a partial frame
+            with open(index_path, 'a') as index:
+                index.write(f"{offset} {len(frame)} {filename}\n")
+            frames.append((offset, len(frame), filename))
+        return True
+
+    def frame_count(self, plant_id):
+        return len(self._frames(plant_id))
+
+    def timelapse_path(self, plant_id):
+        video_path, _ = self._timelapse_paths(plant_id)
+        return video_path if os.path.exists(video_path) else None
+
+    def timelapse_frames(self, plant_id, start=0, limit=None):
+        """Yield the plant's timelapse frames (JPEG bytes) from index `start`, oldest first"""
+        with self._lock:
+            items = self._frames(plant_id).items
+            frames = items[start:] if limit is None else items[start:start + limit]
+        if not frames:
+            return
+        video_path, _ = self._timelapse_paths(plant_id)
+        with open(video_path, 'rb') as video:
+            for offset, length, _ in frames:
+                video.seek(offset)
+                yield video.read(length)
+
+
+class _FrameList:
+    """Frame index entries plus a filename set for O(1) duplicate checks"""
+
+    def __init__(self, items):
+        self.items = items
+        self.names = {name for _, _, name in items}
+
+    def append(self, item):
+        self.items.append(item)
+        self.names.add(item[2])
+
+    def __contains__(self, filename):
+        return filename in self.names
+
+    def __len__(self):
+        return len(self.items)
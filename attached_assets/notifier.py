@@ -0,0 +1,327 @@
+"""
+Background Telegram notification dispatcher.
+
+Messages are spooled as small JSON files so they survive restarts, then a
+worker thread drains the spool over one pooled HTTP session. Messages that
+arrive together are batched: text-only messages become digests of up to
+Telegram's message length and photos are sent as albums. Sends are rate limited, and failures are
+retried with exponential backoff (honouring Telegram's retry_after).
+Spool files that can't be read or sent are moved to `failed/` rather than
+retried forever. `requests` is imported with the first send, not with this module.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from atomic_io import atomic_write_json
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API = "https://api.telegram.org"
+
+TELEGRAM_SECONDS = REGISTRY.histogram('plant_app_telegram_request_seconds', 'Telegram Bot API call duration',
+                                      ['method', 'outcome'])
+MAX_ALBUM_SIZE = 10  # Telegram's sendMediaGroup limit
+MAX_MESSAGE_LENGTH = 4096
+
+
+class TelegramDispatcher:
+    """Queues Telegram messages on disk and sends them from a worker thread"""
+
+    def __init__(self, token, chat_id, spool_dir, api_base=TELEGRAM_API,
+                 batch_window=2.0, min_interval=1.0, max_attempts=8,
+                 backoff_base=2.0, backoff_max=300.0, timeout=(5, 30)):
+        self.token = token
+        self.chat_id = chat_id
+        self.spool_dir = spool_dir
+        self.api_base = api_base.rstrip('/')
+        self.batch_window = batch_window
+        self.min_interval = min_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+
+        self._session = None
+
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._last_send = 0.0
+        self._worker = None
+
+        os.makedirs(spool_dir, exist_ok=True)
+        self._load_spool()
+
+    @property
+    def session(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._session = session
+        return self._session
+
+    @property
+    def enabled(self):
+        return bool(self.token and self.chat_id)
+
+    # ------------------------------------------------------------------
+    # Spool
+    # ------------------------------------------------------------------
+    def _load_spool(self):
+        for name in sorted(os.listdir(self.spool_dir)):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.spool_dir, name), 'r') as f:
+                    message = json.load(f)
+                if not isinstance(message, dict) or not isinstance(message.get('text'), str):
+                    raise ValueError("not a queued message")
+            except (OSError, ValueError) as e:
+                self._quarantine(name, e)
+                continue
+            message.setdefault('attempts', 0)
+            message.setdefault('next_attempt', 0)
+            self._pending[name] = message
+        if self._pending:
+            logger.info(f"Restored {len(self._pending)} queued Telegram messages")
+
+    def _persist(self, name, message):
+        atomic_write_json(os.path.join(self.spool_dir, name), message)
+
+    def _quarantine(self, name, error):
+        """Move a spool entry that can't be read or sent to failed/ and forget it"""
+        logger.error(f"Moving Telegram message {name} to failed/: {error}")
+        self._pending.pop(name, None)
+        failed_dir = os.path.join(self.spool_dir, 'failed')
+        try:
+            os.makedirs(failed_dir, exist_ok=True)
+            os.replace(os.path.join(self.spool_dir, name), os.path.join(failed_dir, name))
+        except OSError as e:
+            logger.error(f"Could not move {name} aside: {e}")
+
+    def _discard(self, name):
+        self._pending.pop(name, None)
+        try:
+            os.remove(os.path.join(self.spool_dir, name))
+        except FileNotFoundError:
+            pass
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def send(self, text, image_path=None):
+        """Queue a message (optionally with a photo) and return immediately"""
+        if not self.enabled:
+            logger.info(f"Telegram not configured, skipping message: {text}")
+            return None
+        message = {
+            'text': text,
+            'image_path': image_path,
+            'attempts': 0,
+            'next_attempt': 0,
+            'queued_at': time.time(),
+        }
+        name = f"{int(time.time() * 1000):013d}-{uuid.uuid4().hex[:8]}.json"
+        with self._lock:
+            self._persist(name, message)
+            self._pending[name] = message
+        self._wakeup.set()
+        return name
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def start(self):
+        if self._worker is not None:
+            return
+        self._stopped = False
+        self._worker = threading.Thread(target=self._run, name='telegram-dispatcher', daemon=True)
+        self._worker.start()
+
+    def stop(self, timeout=5):
+        """Stop the worker; unsent messages stay in the spool for next start"""
+        self._stopped = True
+        self._wakeup.set()
+        if self._worker is not None:
+            self._worker.join(timeout=timeout)
+            self._worker = None
+        if self._session is not None:
+            self._session.close()
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+    def _run(self):
+        while not self._stopped:
+            delay = self._next_due_in()
+            if delay is None:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                # Give a burst of notifications a moment to arrive so it can be batched
+                if not self._stopped and self.batch_window:
+                    time.sleep(self.batch_window)
+                continue
+            if delay > 0:
+                self._wakeup.wait(delay)
+                self._wakeup.clear()
+                continue
+            try:
+                self.dispatch_due()
+            except Exception as e:
+                # Keep the worker alive; whatever failed is retried on the next pass
+                logger.error(f"Telegram dispatcher error: {e}")
+                self._wakeup.wait(max(self.min_interval, 1.0))
+                self._wakeup.clear()
+
+    def _next_due_in(self):
+        with self._lock:
+            if not self._pending:
+                return None
+            return min(m['next_attempt'] for m in self._pending.values()) - time.time()
+
+    def dispatch_due(self):
+        """Send every message whose retry time has come, batched; returns the number sent"""
+        now = time.time()
+        with self._lock:
+            due = sorted((name, m) for name, m in self._pending.items() if m['next_attempt'] <= now)
+        photos, texts = [], []
+        for name, message in due:
+            if message.get('image_path') and os.path.exists(message['image_path']):
+                photos.append((name, message))
+            else:
+                texts.append((name, message))
+
+        sent = 0
+        for i in range(0, len(photos), MAX_ALBUM_SIZE):
+            sent += self._deliver(photos[i:i + MAX_ALBUM_SIZE], self._send_photos)
+        for digest in _digests(texts):
+            sent += self._deliver(digest, self._send_digest)
+        return sent
+
+    def _deliver(self, batch, sender):
+        import requests
+        self._throttle()
+        try:
+            sender([m for _, m in batch])
+        except (requests.RequestException, OSError) as e:
+            retry_after = _retry_after(e)
+            permanent = _is_permanent(e)
+            if permanent and len(batch) > 1:
+                # One bad caption or photo shouldn't sink the rest of the album or digest
+                return sum(self._deliver([item], sender) for item in batch)
+            with self._lock:
+                for name, message in batch:
+                    message['attempts'] += 1
+                    if permanent or message['attempts'] >= self.max_attempts:
+                        logger.error(f"Giving up on Telegram message {name} after {message['attempts']} attempts: {e}")
+                        self._discard(name)
+                        continue
+                    backoff = min(self.backoff_base ** message['attempts'], self.backoff_max)
+                    message['next_attempt'] = time.time() + max(backoff, retry_after or 0)
+                    self._persist(name, message)
+            logger.error(f"Telegram error: {e}")
+            return 0
+        except Exception as e:
+            # Not a network problem, so most likely something in the messages themselves:
+            # retry them one at a time and set aside the ones that still fail
+            if len(batch) > 1:
+                return sum(self._deliver([item], sender) for item in batch)
+            with self._lock:
+                self._quarantine(batch[0][0], e)
+            return 0
+
+        with self._lock:
+            for name, _ in batch:
+                self._discard(name)
+        return len(batch)
+
+    def _throttle(self):
+        wait = self._last_send + self.min_interval - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        self._last_send = time.time()
+
+    def _url(self, method):
+        return f"{self.api_base}/bot{self.token}/{method}"
+
+    def _post(self, method, **kwargs):
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            response = self.session.post(self._url(method), timeout=self.timeout, **kwargs)
+            response.raise_for_status()
+            outcome = 'ok'
+            return response
+        finally:
+            TELEGRAM_SECONDS.observe(time.perf_counter() - started, method=method, outcome=outcome)
+
+    def _send_digest(self, messages):
+        lines = [m['text'] for m in messages]
+        text = lines[0] if len(lines) == 1 else "\n".join(f"• {line}" for line in lines)
+        self._post('sendMessage', data={'chat_id': self.chat_id, 'text': text[:MAX_MESSAGE_LENGTH]})
+        logger.info(f"Sent Telegram message ({len(messages)} batched)")
+
+    def _send_photos(self, messages):
+        if len(messages) == 1:
+            message = messages[0]
+            with open(message['image_path'], 'rb') as photo:
+                self._post('sendPhoto', data={'chat_id': self.chat_id, 'caption': message['text']},
+                           files={'photo': photo})
+            logger.info(f"Sent Telegram photo: {message['image_path']}")
+            return
+
+        media = []
+        handles = {}
+        try:
+            for i, message in enumerate(messages):
+                key = f"photo{i}"
+                handles[key] = open(message['image_path'], 'rb')
+                media.append({'type': 'photo', 'media': f"attach://{key}", 'caption': message['text']})
+            self._post('sendMediaGroup', data={'chat_id': self.chat_id, 'media': json.dumps(media)},
+                       files=handles)
+        finally:
+            for handle in handles.values():
+                handle.close()
+        logger.info(f"Sent Telegram album with {len(messages)} photos")
+
+
+def _digests(texts):
+    """Split (name, message) pairs into runs whose digest fits in one Telegram message"""
+    digest, length = [], 0
+    for item in texts:
+        size = len(item[1]['text']) + 3  # "• " prefix and newline
+        if digest and length + size > MAX_MESSAGE_LENGTH:
+            yield digest
+            digest, length = [], 0
+        digest.append(item)
+        length += size
+    if digest:
+        yield digest
+
+
+def _retry_after(error):
+    response = getattr(error, 'response', None)
+    if response is None or response.status_code != 429:
+        return None
+    try:
+        return float(response.json().get('parameters', {}).get('retry_after', 0))
+    except (ValueError, AttributeError):
+        return None
+
+
+def _is_permanent(error):
+    """4xx other than 429 means the request itself is bad; retrying won't help"""
+    response = getattr(error, 'response', None)
+    return response is not None and 400 <= response.status_code < 500 and response.status_code != 429
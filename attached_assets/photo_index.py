@@ -0,0 +1,115 @@
+"""
+Persistent index of captured plant photos.
+
+Photo metadata lives in a small SQLite sidecar with B-tree indexes on
+(plant_id, taken_at) and taken_at, so "latest N photos for a plant" and
+"latest photo overall" are index seeks instead of a directory listing plus
+one stat() per file. The index can always be rebuilt from a directory scan.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS photos (
+    filename TEXT PRIMARY KEY,
+    plant_id TEXT NOT NULL,
+    taken_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_photos_plant_time ON photos (plant_id, taken_at DESC);
+CREATE INDEX IF NOT EXISTS idx_photos_time ON photos (taken_at DESC);
+"""
+
+
+def plant_id_from_filename(filename):
+    """Photos are saved as <plant_id>_<YYYYmmdd>_<HHMMSS>.jpg"""
+    parts = filename[:-len('.jpg')].rsplit('_', 2)
+    return parts[0] if len(parts) == 3 else None
+
+
+class PhotoIndex:
+    """SQLite-backed lookup of photos by plant and capture time"""
+
+    def __init__(self, db_path, photo_folder):
+        self.db_path = db_path
+        self.photo_folder = photo_folder
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+        if self.count() == 0 and any(f.endswith('.jpg') for f in os.listdir(photo_folder)):
+            self.rebuild()
+
+    def add(self, filename, plant_id, taken_at=None):
+        if taken_at is None:
+            taken_at = os.path.getmtime(os.path.join(self.photo_folder, filename))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO photos (filename, plant_id, taken_at) VALUES (?, ?, ?)",
+                (filename, plant_id, taken_at)
+            )
+            self._conn.commit()
+
+    def remove(self, filename):
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM photos WHERE filename = ?", (filename,))
+            self._conn.commit()
+            return cur.rowcount > 0
+
+    def latest(self, plant_id=None, limit=1):
+        """Return up to `limit` filenames, newest first, optionally for one plant"""
+        with self._lock:
+            if plant_id is None:
+                rows = self._conn.execute(
+                    "SELECT filename FROM photos ORDER BY taken_at DESC LIMIT ?", (limit,)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT filename FROM photos WHERE plant_id = ? ORDER BY taken_at DESC LIMIT ?",
+                    (plant_id, limit)
+                ).fetchall()
+        return [row[0] for row in rows]
+
+    def all(self):
+        """Every (filename, plant_id), oldest first"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT filename, plant_id FROM photos ORDER BY taken_at"
+            ).fetchall()
+
+    def count(self, plant_id=None):
+        with self._lock:
+            if plant_id is None:
+                return self._conn.execute("SELECT COUNT(*) FROM photos").fetchone()[0]
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM photos WHERE plant_id = ?", (plant_id,)
+            ).fetchone()[0]
+
+    def rebuild(self):
+        """Re-create the index from the photo folder"""
+        rows = []
+        with os.scandir(self.photo_folder) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.jpg'):
+                    continue
+                plant_id = plant_id_from_filename(entry.name)
+                if plant_id is None:
+                    continue
+                rows.append((entry.name, plant_id, entry.stat().st_mtime))
+        with self._lock:
+            self._conn.execute("DELETE FROM photos")
+            self._conn.executemany(
+                "INSERT INTO photos (filename, plant_id, taken_at) VALUES (?, ?, ?)", rows
+            )
+            self._conn.commit()
+        logger.info(f"Photo index rebuilt with {len(rows)} photos")
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,421 @@
+"""
+SQLite storage for plants and calendars.
+
+One database file in WAL mode replaces plants.json and calendar_data.json.
+Readers never block the writer and each other, every write is a short
+`BEGIN IMMEDIATE` transaction, so concurrent request threads can't lose
+each other's updates, and a read or write touches only the rows it needs
+through the primary keys and the (date, plant_id) and per-field plant
+indexes.
+
+`Database` hands out pooled connections. Each connection keeps its own
+cache of compiled statements, so the constant, parameterised SQL below is
+prepared once per connection rather than once per request. The schema is
+versioned with `PRAGMA user_version`: MIGRATIONS run in order, each in its
+own transaction, when the file is opened. `import_json_files` copies the old
+JSON data (calendar log included) in once, on first start.
+
+`SqlitePlantRegistry` and `SqliteCalendarStore` have the same methods as
+PlantRegistry and CalendarStore, so the app can use either.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+from calendar_store import CalendarStore
+from metrics import STORAGE_SECONDS
+from plant_registry import INDEXED_FIELDS
+
+logger = logging.getLogger(__name__)
+
+POOL_TIMEOUT = 10  # seconds to wait for a free connection
+
+# (version, script); append new versions, never edit a released one
+MIGRATIONS = [
+    (1, """
+        CREATE TABLE plants (
+            id TEXT PRIMARY KEY,
+            stage TEXT,
+            location TEXT,
+            strain_type TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX idx_plants_stage ON plants (stage);
+        CREATE INDEX idx_plants_location ON plants (location);
+        CREATE INDEX idx_plants_strain_type ON plants (strain_type);
+        CREATE TABLE calendar_tasks (
+            plant_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            task TEXT NOT NULL,
+            PRIMARY KEY (plant_id, date)
+        ) WITHOUT ROWID;
+        CREATE INDEX idx_calendar_date ON calendar_tasks (date, plant_id);
+        CREATE TABLE meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """),
+    (2, """
+        CREATE TABLE calendar_versions (
+            plant_id TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            modified REAL NOT NULL
+        );
+    """),
+]
+
+
+def migrate(conn):
+    """Bring the schema up to the newest version; returns the version applied last"""
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, script in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            conn.executescript(f"BEGIN IMMEDIATE; {script}; PRAGMA user_version = {version}; COMMIT;")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        logger.info(f"Database migrated to schema version {version}")
+        current = version
+    return current
+
+
+class Database:
+    """A bounded pool of WAL-mode SQLite connections to one file"""
+
+    def __init__(self, path, pool_size=4):
+        self.path = path
+        self.pool_size = pool_size
+        self._pool = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        with self.connection() as conn:
+            self.schema_version = migrate(conn)
+
+    def _connect(self):
+        # isolation_level=None: transactions are explicit (see transaction())
+        conn = sqlite3.connect(self.path, timeout=POOL_TIMEOUT, isolation_level=None,
+                               check_same_thread=False, cached_statements=128)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    @contextlib.contextmanager
+    def connection(self):
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if self._created < self.pool_size:
+                    self._created += 1
+                    conn = self._connect()
+            if conn is None:
+                try:
+                    conn = self._pool.get(timeout=POOL_TIMEOUT)
+                except queue.Empty:
+                    raise sqlite3.OperationalError("Timed out waiting for a database connection")
+        try:
+            yield conn
+        finally:
+            if self._closed:
+                conn.close()
+            else:
+                self._pool.put(conn)
+
+    @contextlib.contextmanager
+    def read(self, file):
+        with STORAGE_SECONDS.time(file=file, op='read'), self.connection() as conn:
+            yield conn
+
+    @contextlib.contextmanager
+    def transaction(self, file):
+        """A write transaction; takes the write lock up front so it never fails halfway on SQLITE_BUSY"""
+        with STORAGE_SECONDS.time(file=file, op='write'), self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def get_meta(self, key):
+        with self.read('meta') as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def _plant_row(plant):
+    return (plant['id'], *(plant.get(field) for field in INDEXED_FIELDS), json.dumps(plant))
+
+
+def import_json_files(db, plants_path, calendar_path):
+    """Copy plants.json and the calendar (snapshot plus log) into `db` once.
+
+    Runs only on a database that has never been imported into. The JSON
+    files are left in place; after the import they are no longer read.
+    """
+    if db.get_meta('json_import') is not None:
+        return False
+    plants = []
+    if os.path.exists(plants_path):
+        try:
+            with open(plants_path, 'r') as f:
+                plants = json.load(f) or []
+        except json.JSONDecodeError as e:
+            logger.error(f"Skipping unreadable {plants_path} during import: {e}")
+    calendar = {}
+    if os.path.exists(calendar_path) or os.path.exists(f"{calendar_path}.log"):
+        store = CalendarStore(calendar_path)
+        calendar = store.snapshot()
+        store.close()
+
+    tasks = [(plant_id, date, task) for plant_id, dates in calendar.items() for date, task in dates.items()]
+    with db.transaction('import') as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO plants (id, stage, location, strain_type, data) VALUES (?, ?, ?, ?, ?)",
+            [_plant_row(p) for p in plants]
+        )
+        conn.executemany("INSERT OR REPLACE INTO calendar_tasks (plant_id, date, task) VALUES (?, ?, ?)", tasks)
+        conn.execute("INSERT INTO meta (key, value) VALUES ('json_import', ?)",
+                     (json.dumps({'at': time.time(), 'plants': len(plants), 'tasks': len(tasks)}),))
+    logger.info(f"Imported {len(plants)} plants and {len(tasks)} calendar tasks from JSON")
+    return True
+
+
+class SqlitePlantRegistry:
+    """PlantRegistry's interface over the plants table"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def get(self, plant_id):
+        with self.db.read('plants') as conn:
+            row = conn.execute("SELECT data FROM plants WHERE id = ?", (plant_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def all(self):
+        with self.db.read('plants') as conn:
+            rows = conn.execute("SELECT data FROM plants ORDER BY rowid").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def find(self, **criteria):
+        """Return plants matching every indexed field given, e.g. find(stage='veg')"""
+        for field in criteria:
+            if field not in INDEXED_FIELDS:
+                raise ValueError(f"Field '{field}' is not indexed")
+        if not criteria:
+            return self.all()
+        # Column names come from INDEXED_FIELDS above, never from the request
+        where = ' AND '.join(f"{field} IS ?" for field in criteria)
+        with self.db.read('plants') as conn:
+            rows = conn.execute(f"SELECT data FROM plants WHERE {where} ORDER BY rowid",
+                                tuple(criteria.values())).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def add(self, plant):
+        try:
+            with self.db.transaction('plants') as conn:
+                conn.execute("INSERT INTO plants (id, stage, location, strain_type, data) VALUES (?, ?, ?, ?, ?)",
+                             _plant_row(plant))
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Plant {plant['id']} already exists")
+        return plant
+
+    def update(self, plant_id, **fields):
+        """Read-modify-write in one transaction, so concurrent updates can't overwrite each other"""
+        with self.db.transaction('plants') as conn:
+            row = conn.execute("SELECT data FROM plants WHERE id = ?", (plant_id,)).fetchone()
+            if row is None:
+                return None
+            plant = dict(json.loads(row[0]), **fields)
+            conn.execute("UPDATE plants SET stage = ?, location = ?, strain_type = ?, data = ? WHERE id = ?",
+                         (*_plant_row(plant)[1:], plant_id))
+        return plant
+
+    def remove(self, plant_id):
+        with self.db.transaction('plants') as conn:
+            return conn.execute("DELETE FROM plants WHERE id = ?", (plant_id,)).rowcount > 0
+
+    def flush(self):
+        """Writes are committed as they happen; kept for PlantRegistry compatibility"""
+
+    def close(self):
+        self.db.close()
+
+    def __contains__(self, plant_id):
+        with self.db.read('plants') as conn:
+            return conn.execute("SELECT 1 FROM plants WHERE id = ?", (plant_id,)).fetchone() is not None
+
+    def __iter__(self):
+        return iter(self.all())
+
+    def __len__(self):
+        with self.db.read('plants') as conn:
+            return conn.execute("SELECT COUNT(*) FROM plants").fetchone()[0]
+
+
+_UPSERT_TASK = """
+    INSERT INTO calendar_tasks (plant_id, date, task) VALUES (?, ?, ?)
+    ON CONFLICT (plant_id, date) DO UPDATE SET task = excluded.task WHERE task IS NOT excluded.task
+"""
+
+
+class SqliteCalendarStore:
+    """CalendarStore's interface over the calendar_tasks table.
+
+    The versions used for ETags live in the database and are bumped in the
+    writing transaction, so every process serving the file agrees on them.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._created = os.path.getmtime(db.path) if os.path.exists(db.path) else time.time()
+        # Shared ETag prefix for every process on this file; a new file starts a new epoch
+        with db.transaction('meta') as conn:
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('calendar_epoch', ?)",
+                         (uuid.uuid4().hex[:8],))
+        self.etag_epoch = db.get_meta('calendar_epoch')
+
+    def _touch(self, conn, plant_ids):
+        """Bump the store version and stamp `plant_ids`; call inside the write transaction"""
+        row = conn.execute("SELECT value FROM meta WHERE key = 'calendar_version'").fetchone()
+        version = (int(row[0]) if row else 0) + 1
+        modified = time.time()
+        conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                         [('calendar_version', str(version)), ('calendar_modified', repr(modified))])
+        conn.executemany("INSERT OR REPLACE INTO calendar_versions (plant_id, version, modified) VALUES (?, ?, ?)",
+                         [(plant_id, version, modified) for plant_id in plant_ids])
+
+    def _store_version(self):
+        with self.db.read('calendar') as conn:
+            meta = dict(conn.execute(
+                "SELECT key, value FROM meta WHERE key IN ('calendar_version', 'calendar_modified')"
+            ))
+        return int(meta.get('calendar_version', 0)), float(meta.get('calendar_modified', self._created))
+
+    @property
+    def version(self):
+        return self._store_version()[0]
+
+    @property
+    def modified(self):
+        return self._store_version()[1]
+
+    def get_plant(self, plant_id):
+        """Return {date: task} for one plant"""
+        with self.db.read('calendar') as conn:
+            return dict(conn.execute("SELECT date, task FROM calendar_tasks WHERE plant_id = ? ORDER BY date",
+                                     (plant_id,)))
+
+    def snapshot(self):
+        with self.db.read('calendar') as conn:
+            result = {}
+            for plant_id, date, task in conn.execute("SELECT plant_id, date, task FROM calendar_tasks"):
+                result.setdefault(plant_id, {})[date] = task
+            return result
+
+    def plants_on(self, date):
+        """Return the ids of plants with a task on `date`"""
+        with self.db.read('calendar') as conn:
+            return {row[0] for row in conn.execute("SELECT plant_id FROM calendar_tasks WHERE date = ?", (date,))}
+
+    def plant_version(self, plant_id):
+        """(version, timestamp) of the last write touching `plant_id`"""
+        with self.db.read('calendar') as conn:
+            row = conn.execute("SELECT version, modified FROM calendar_versions WHERE plant_id = ?",
+                               (plant_id,)).fetchone()
+        return tuple(row) if row else (0, self.modified)
+
+    def get_range(self, plant_id, start, end):
+        """Return {date: task} for one plant with start <= date <= end (YYYY-MM-DD strings)"""
+        with self.db.read('calendar') as conn:
+            return dict(conn.execute(
+                "SELECT date, task FROM calendar_tasks WHERE plant_id = ? AND date BETWEEN ? AND ? ORDER BY date",
+                (plant_id, start, end)
+            ))
+
+    def upcoming(self, start, end, limit=None):
+        """Tasks for all plants between start and end as [{date, plant_id, task}], by date"""
+        with self.db.read('calendar') as conn:
+            rows = conn.execute(
+                "SELECT date, plant_id, task FROM calendar_tasks WHERE date BETWEEN ? AND ? "
+                "ORDER BY date, plant_id LIMIT ?",
+                (start, end, -1 if limit is None else limit)
+            ).fetchall()
+        return [{'date': date, 'plant_id': plant_id, 'task': task} for date, plant_id, task in rows]
+
+    def set_task(self, plant_id, date, task):
+        with self.db.transaction('calendar') as conn:
+            if conn.execute(_UPSERT_TASK, (plant_id, date, task)).rowcount:
+                self._touch(conn, [plant_id])
+
+    def set_tasks(self, plant_id, tasks):
+        """Set several {date: task} entries for a plant in one transaction"""
+        if not tasks:
+            return
+        with self.db.transaction('calendar') as conn:
+            if conn.executemany(_UPSERT_TASK, [(plant_id, d, t) for d, t in tasks.items()]).rowcount:
+                self._touch(conn, [plant_id])
+
+    def set_many(self, tasks_by_plant, replace=False):
+        """Apply {plant_id: {date: task}} for many plants in one transaction.
+
+        With `replace`, each listed plant's existing tasks are deleted first.
+        Returns the number of plants cleared plus tasks written, as CalendarStore does.
+        """
+        records = 0
+        with self.db.transaction('calendar') as conn:
+            for plant_id, tasks in tasks_by_plant.items():
+                if replace and conn.execute("DELETE FROM calendar_tasks WHERE plant_id = ?", (plant_id,)).rowcount:
+                    records += 1
+                conn.executemany(_UPSERT_TASK, [(plant_id, d, t) for d, t in tasks.items()])
+                records += len(tasks)
+            if records:
+                self._touch(conn, tasks_by_plant)
+        return records
+
+    def remove_task(self, plant_id, date):
+        with self.db.transaction('calendar') as conn:
+            removed = conn.execute("DELETE FROM calendar_tasks WHERE plant_id = ? AND date = ?",
+                                   (plant_id, date)).rowcount > 0
+            if removed:
+                self._touch(conn, [plant_id])
+        return removed
+
+    def delete_plant(self, plant_id):
+        with self.db.transaction('calendar') as conn:
+            removed = conn.execute("DELETE FROM calendar_tasks WHERE plant_id = ?", (plant_id,)).rowcount > 0
+            if removed:
+                self._touch(conn, [plant_id])
+        return removed
+
+    def close(self):
+        self.db.close()
+
+    def __contains__(self, plant_id):
+        with self.db.read('calendar') as conn:
+            return conn.execute("SELECT 1 FROM calendar_tasks WHERE plant_id = ? LIMIT 1",
+                                (plant_id,)).fetchone() is not None
@@ -0,0 +1,179 @@
+"""
+In-memory plant registry with write-behind persistence.
+
+Plants are held in an id -> plant dict with secondary indexes on stage,
+location and strain_type. Mutations only mark the registry dirty; a
+background thread coalesces them and rewrites plants.json atomically at
+most once per `flush_interval` seconds, so request handlers never wait on
+disk I/O.
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+
+from atomic_io import atomic_write_json
+from metrics import STORAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+INDEXED_FIELDS = ('stage', 'location', 'strain_type')
+
+
+class PlantRegistry:
+    """Constant-time plant lookups backed by a batched JSON flusher"""
+
+    def __init__(self, path, flush_interval=1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._io_lock = threading.Lock()
+        self._by_id = {}
+        self._indexes = {field: {} for field in INDEXED_FIELDS}
+        self._dirty = False
+        self._wakeup = threading.Event()
+        self._stopped = False
+
+        for plant in self._load():
+            self._insert(plant)
+        logger.info(f"Plant registry loaded {len(self._by_id)} plants")
+
+        self._flusher = threading.Thread(target=self._flush_loop, name='plant-registry-flush', daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def _load(self):
+        try:
+            if os.path.exists(self.path):
+                with STORAGE_SECONDS.time(file='plants', op='load'), open(self.path, 'r') as f:
+                    return json.load(f)
+            logger.info("Plants file not found, returning empty list")
+            return []
+        except json.JSONDecodeError as e:
+            logger.error(f"Error loading plants: {e}")
+            return []
+
+    # ------------------------------------------------------------------
+    # Index maintenance
+    # ------------------------------------------------------------------
+    def _insert(self, plant):
+        self._by_id[plant['id']] = plant
+        for field in INDEXED_FIELDS:
+            value = plant.get(field)
+            # dicts keep insertion order, so index buckets double as ordered sets
+            self._indexes[field].setdefault(value, {})[plant['id']] = plant
+
+    def _unindex(self, plant):
+        for field in INDEXED_FIELDS:
+            bucket = self._indexes[field].get(plant.get(field))
+            if bucket is not None:
+                bucket.pop(plant['id'], None)
+                if not bucket:
+                    del self._indexes[field][plant.get(field)]
+
+    # ------------------------------------------------------------------
+    # Write-behind persistence
+    # ------------------------------------------------------------------
+    def _mark_dirty(self):
+        self._dirty = True
+        self._wakeup.set()
+
+    def _flush_loop(self):
+        while not self._stopped:
+            self._wakeup.wait()
+            if self._stopped:
+                break
+            # Let a burst of writes land before paying for one rewrite
+            self._wakeup.clear()
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Persist pending changes now"""
+        with self._io_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                snapshot = [dict(p) for p in self._by_id.values()]
+                self._dirty = False
+            try:
+                with STORAGE_SECONDS.time(file='plants', op='save'):
+                    atomic_write_json(self.path, snapshot, indent=2, separators=None)
+                logger.info(f"Plants saved successfully ({len(snapshot)} plants)")
+            except Exception as e:
+                logger.error(f"Error saving plants: {e}")
+                with self._lock:
+                    self._dirty = True
+
+    def close(self):
+        """Stop the flusher and write out anything still pending"""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._wakeup.set()
+        self.flush()
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def get(self, plant_id):
+        return self._by_id.get(plant_id)
+
+    def all(self):
+        with self._lock:
+            return list(self._by_id.values())
+
+    def find(self, **criteria):
+        """Return plants matching every indexed field given, e.g. find(stage='veg')"""
+        with self._lock:
+            buckets = []
+            for field, value in criteria.items():
+                if field not in self._indexes:
+                    raise ValueError(f"Field '{field}' is not indexed")
+                buckets.append(self._indexes[field].get(value, {}))
+            if not buckets:
+                return list(self._by_id.values())
+            buckets.sort(key=len)
+            smallest, rest = buckets[0], buckets[1:]
+            return [p for pid, p in smallest.items() if all(pid in b for b in rest)]
+
+    def add(self, plant):
+        with self._lock:
+            if plant['id'] in self._by_id:
+                raise ValueError(f"Plant {plant['id']} already exists")
+            self._insert(plant)
+            self._mark_dirty()
+        return plant
+
+    def update(self, plant_id, **fields):
+        """Replace the plant with an updated copy, so readers never see a half-applied update"""
+        with self._lock:
+            plant = self._by_id.get(plant_id)
+            if plant is None:
+                return None
+            self._unindex(plant)
+            plant = dict(plant, **fields)
+            self._insert(plant)
+            self._mark_dirty()
+            return plant
+
+    def remove(self, plant_id):
+        with self._lock:
+            plant = self._by_id.pop(plant_id, None)
+            if plant is None:
+                return False
+            self._unindex(plant)
+            self._mark_dirty()
+            return True
+
+    def __contains__(self, plant_id):
+        return plant_id in self._by_id
+
+    def __iter__(self):
+        return iter(self.all())
+
+    def __len__(self):
+        return len(self._by_id)
@@ -0,0 +1,85 @@
+"""
+Expands stage presets into dated calendar tasks.
+
+A timeline is a chain of stages (e.g. seed -> veg -> flower), each lasting
+a number of days. The chain is first flattened into one list of
+(day offset, task) pairs, and that template is then shifted to each start
+date with plain integer arithmetic on date ordinals. Templates and their
+expansions are memoized, so scheduling a whole tent that starts on the same
+day expands the timeline once.
+"""
+
+import functools
+from datetime import date, datetime
+
+DEFAULT_STAGE_DURATIONS = {
+    'seed': 7,
+    'veg': 28,
+    'flower': 56,
+}
+
+
+class PlanError(ValueError):
+    """Invalid stages, durations or dates in a scheduling request"""
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        raise PlanError(f"Invalid date '{value}' (expected YYYY-MM-DD)")
+
+
+class SchedulePlanner:
+    """Turns (start date, stage chain, durations) into {YYYY-MM-DD: task}"""
+
+    def __init__(self, presets, default_durations=DEFAULT_STAGE_DURATIONS):
+        self.presets = presets
+        self.default_durations = default_durations
+        self._template = functools.lru_cache(maxsize=64)(self._build_template)
+        self._expand = functools.lru_cache(maxsize=256)(self._expand_template)
+
+    def _build_template(self, stages, durations):
+        """Flatten a stage chain into ((day_offset, task), ...), merging same-day tasks"""
+        by_day = {}
+        stage_start = 0
+        for i, stage in enumerate(stages):
+            last = i == len(stages) - 1
+            duration = dict(durations).get(stage, self.default_durations.get(stage))
+            for entry in self.presets[stage]:
+                # A stage's tasks stop when the next stage begins; the last stage runs to completion
+                if not last and duration is not None and entry['offset'] >= duration:
+                    continue
+                by_day.setdefault(stage_start + entry['offset'], []).append(entry['task'])
+            if not last:
+                stage_start += duration
+        return tuple((day, "; ".join(tasks)) for day, tasks in sorted(by_day.items()))
+
+    def _expand_template(self, template, start_ordinal):
+        return {date.fromordinal(start_ordinal + day).isoformat(): task for day, task in template}
+
+    def validate(self, stages, durations=None):
+        if not stages:
+            raise PlanError("At least one stage is required")
+        for stage in stages:
+            if stage not in self.presets:
+                raise PlanError(f"Unknown stage '{stage}'")
+        for stage, days in (durations or {}).items():
+            if stage not in self.presets:
+                raise PlanError(f"Unknown stage '{stage}' in durations")
+            if not isinstance(days, int) or isinstance(days, bool) or days <= 0:
+                raise PlanError(f"Duration for '{stage}' must be a positive number of days")
+        for stage in stages[:-1]:
+            if stage not in (durations or {}) and stage not in self.default_durations:
+                raise PlanError(f"No duration given for stage '{stage}'")
+
+    def plan(self, start, stages, durations=None):
+        """Tasks for one plant; `start` is a date or YYYY-MM-DD string"""
+        stages = tuple(stages)
+        durations = tuple(sorted((durations or {}).items()))
+        self.validate(stages, dict(durations))
+        if not isinstance(start, date):
+            start = parse_date(start)
+        template = self._template(stages, durations)
+        # Callers may mutate the result, so hand out a copy of the memoized expansion
+        return dict(self._expand(template, start.toordinal()))
@@ -0,0 +1,272 @@
+"""
+Local time-series storage for sensor readings.
+
+Samples live in SQLite (WAL mode) in a `samples` table clustered on
+(series_id, ts), next to minute, hour and day rollup tables that hold
+count/sum/min/max per bucket. Writes are buffered in memory and flushed
+once a second in one transaction: the raw rows, plus one upsert per touched
+bucket, pre-aggregated in Python from the rows that were actually new, so a
+replayed sample (same series and timestamp) is not counted twice. Raw samples and the
+finer rollups are pruned after their retention window.
+
+A range query picks the coarsest table that still resolves the requested
+number of points and groups it in SQL, so a year of 1 Hz data charts from
+a few hundred day rows instead of 31 million samples.
+"""
+
+import logging
+import math
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    UNIQUE (source, metric)
+);
+CREATE TABLE IF NOT EXISTS samples (
+    series_id INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (series_id, ts)
+) WITHOUT ROWID;
+"""
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    series_id INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    PRIMARY KEY (series_id, bucket)
+) WITHOUT ROWID;
+"""
+
+# (bucket seconds, table); raw samples are resolution 0
+ROLLUPS = ((60, 'rollup_minute'), (3600, 'rollup_hour'), (86400, 'rollup_day'))
+
+DEFAULT_RETENTION = {
+    0: 7 * 86400,
+    60: 90 * 86400,
+    3600: 2 * 365 * 86400,
+    86400: None,  # kept forever
+}
+
+PRUNE_INTERVAL = 3600
+
+
+class SensorStore:
+    """Buffered SQLite time-series store with minute/hour/day rollups"""
+
+    def __init__(self, path, retention=None, flush_interval=1.0, max_pending=5000):
+        self.path = path
+        self.retention = dict(DEFAULT_RETENTION, **(retention or {}))
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._lock = threading.Lock()        # guards the pending buffer and latest values
+        self._write_lock = threading.Lock()  # one writer transaction at a time
+        self._pending = []
+        self._latest = {}
+        self._series = {}
+        self._local = threading.local()
+        self._last_prune = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+        self._conn = self._connect()
+        self._conn.executescript(SCHEMA + ''.join(ROLLUP_SCHEMA.format(table=t) for _, t in ROLLUPS))
+        for series_id, source, metric in self._conn.execute("SELECT id, source, metric FROM series"):
+            self._series[(source, metric)] = series_id
+            row = self._conn.execute(
+                "SELECT ts, value FROM samples WHERE series_id = ? ORDER BY ts DESC LIMIT 1", (series_id,)
+            ).fetchone()
+            if row:
+                self._latest[(source, metric)] = (row[0] / 1000, row[1])
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self):
+        """Per-thread read connection, so chart queries never wait on a flush"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # ------------------------------------------------------------------
+    # Background flushing
+    # ------------------------------------------------------------------
+    def start(self):
+        self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._thread.start()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+                if time.time() - self._last_prune >= PRUNE_INTERVAL:
+                    self.prune()
+            except Exception as e:
+                logger.error(f"Sensor store flush failed: {e}")
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+        with self._write_lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # Ingest
+    # ------------------------------------------------------------------
+    def add(self, values, timestamp=None, source=''):
+        """Record {metric: number} taken at `timestamp` (epoch seconds, default now).
+
+        Raises ValueError, recording nothing, if any value or the timestamp is NaN or infinite.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        values = {metric: float(value) for metric, value in values.items()}
+        for metric, value in values.items():
+            if not math.isfinite(value):
+                raise ValueError(f"{metric} must be a finite number, got {value}")
+        if not math.isfinite(timestamp):
+            raise ValueError(f"timestamp must be finite, got {timestamp}")
+        ts = int(timestamp * 1000)
+        with self._lock:
+            for metric, value in values.items():
+                self._pending.append((source, metric, ts, value))
+                latest = self._latest.get((source, metric))
+                if latest is None or latest[0] <= timestamp:
+                    self._latest[(source, metric)] = (timestamp, value)
+            full = len(self._pending) >= self.max_pending
+        if full:
+            # Back-pressure: the producer pays for the flush instead of growing the buffer
+            self.flush()
+
+    def flush(self):
+        """Write buffered samples and their rollups in one transaction; returns how many were new"""
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return 0
+            rows = []
+            buckets = {res: {} for res, _ in ROLLUPS}
+            with self._conn:
+                for source, metric, ts, value in pending:
+                    series_id = self._series_id(source, metric)
+                    if not self._conn.execute(
+                        "INSERT OR IGNORE INTO samples (series_id, ts, value) VALUES (?, ?, ?)", (series_id, ts, value)
+                    ).rowcount:
+                        continue
+                    rows.append((series_id, ts, value))
+                    for res, acc in buckets.items():
+                        key = (series_id, ts // 1000 // res * res)
+                        agg = acc.get(key)
+                        if agg is None:
+                            acc[key] = [1, value, value, value]
+                        else:
+                            agg[0] += 1
+                            agg[1] += value
+                            agg[2] = min(agg[2], value)
+                            agg[3] = max(agg[3], value)
+                for res, table in ROLLUPS:
+                    self._conn.executemany(
+                        f"INSERT INTO {table} (series_id, bucket, count, sum, min, max) VALUES (?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT (series_id, bucket) DO UPDATE SET count = count + excluded.count, "
+                        "sum = sum + excluded.sum, min = MIN(min, excluded.min), max = MAX(max, excluded.max)",
+                        [(sid, bucket, *agg) for (sid, bucket), agg in buckets[res].items()]
+                    )
+            return len(rows)
+
+    def _series_id(self, source, metric):
+        series_id = self._series.get((source, metric))
+        if series_id is None:
+            cur = self._conn.execute("INSERT INTO series (source, metric) VALUES (?, ?)", (source, metric))
+            series_id = self._series[(source, metric)] = cur.lastrowid
+        return series_id
+
+    def prune(self, now=None):
+        """Delete raw samples and rollup buckets older than their retention window"""
+        now = time.time() if now is None else now
+        deleted = 0
+        with self._write_lock, self._conn:
+            for series_id in list(self._series.values()):
+                keep = self.retention.get(0)
+                if keep:
+                    deleted += self._conn.execute(
+                        "DELETE FROM samples WHERE series_id = ? AND ts < ?",
+                        (series_id, int((now - keep) * 1000))
+                    ).rowcount
+                for res, table in ROLLUPS:
+                    keep = self.retention.get(res)
+                    if keep:
+                        deleted += self._conn.execute(
+                            f"DELETE FROM {table} WHERE series_id = ? AND bucket < ?",
+                            (series_id, int(now - keep))
+                        ).rowcount
+        self._last_prune = now
+        if deleted:
+            logger.info(f"Pruned {deleted} expired sensor rows")
+        return deleted
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def latest(self, source=''):
+        """{metric: (timestamp, value)} of the newest sample per metric, including unflushed ones"""
+        with self._lock:
+            return {metric: v for (src, metric), v in self._latest.items() if src == source}
+
+    def metrics(self, source=''):
+        return sorted(metric for src, metric in self._series if src == source)
+
+    def _pick_resolution(self, start, end, max_points, now):
+        """Coarsest stored resolution that still gives about `max_points` points over [start, end)"""
+        step = max(1, math.ceil((end - start) / max_points))
+        choice = None
+        for res in (0,) + tuple(r for r, _ in ROLLUPS):
+            keep = self.retention.get(res)
+            if keep is not None and start < now - keep:
+                continue  # already pruned at this resolution
+            if choice is None or res <= step:
+                choice = res
+        if choice is None:
+            choice = ROLLUPS[-1][0]
+        if choice:
+            step = max(choice, math.ceil(step / choice) * choice)
+        return choice, step
+
+    def query(self, metric, start, end, source='', max_points=500, now=None):
+        """Downsampled series over [start, end) as {'step': seconds, 'points': [[t, avg, min, max, count]]}"""
+        now = time.time() if now is None else now
+        series_id = self._series.get((source, metric))
+        resolution, step = self._pick_resolution(start, end, max_points, now)
+        if series_id is None:
+            return {'step': step, 'resolution': resolution, 'points': []}
+        conn = self._reader()
+        if resolution == 0:
+            rows = conn.execute(
+                "SELECT ts / 1000 / ? * ? AS b, AVG(value), MIN(value), MAX(value), COUNT(*) FROM samples "
+                "WHERE series_id = ? AND ts >= ? AND ts < ? GROUP BY b ORDER BY b",
+                (step, step, series_id, int(start * 1000), int(end * 1000))
+            ).fetchall()
+        else:
+            table = dict(ROLLUPS)[resolution]
+            rows = conn.execute(
+                f"SELECT bucket / ? * ? AS b, SUM(sum) / SUM(count), MIN(min), MAX(max), SUM(count) FROM {table} "
+                "WHERE series_id = ? AND bucket >= ? AND bucket < ? GROUP BY b ORDER BY b",
+                (step, step, series_id, int(start) // resolution * resolution, int(end))
+            ).fetchall()
+        return {'step': step, 'resolution': resolution, 'points': [list(row) for row in rows]}
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Telegram Bot API, for exercising the notifier and
+benchmarks without network access.
+
+    python3 telegram_stub.py --port 8081
+    TELEGRAM_API_BASE=http://127.0.0.1:8081 python3 app.py
+
+Every call to /bot<token>/<method> is recorded and answered with {"ok": true}.
+`--fail-every N` answers every Nth call with 429 to exercise backoff.
+"""
+
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class TelegramStub:
+    """Threaded stub server; `calls` holds (method, content_length) per request"""
+
+    def __init__(self, host='127.0.0.1', port=0, fail_every=0, retry_after=1):
+        self.calls = []
+        self.fail_every = fail_every
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                self.rfile.read(length)
+                method = self.path.rsplit('/', 1)[-1]
+                with stub._lock:
+                    stub.calls.append((method, length))
+                    count = len(stub.calls)
+                if stub.fail_every and count % stub.fail_every == 0:
+                    self._reply(429, {'ok': False, 'error_code': 429,
+                                      'parameters': {'retry_after': stub.retry_after}})
+                else:
+                    self._reply(200, {'ok': True, 'result': {}})
+
+            def _reply(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Telegram Bot API stub")
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--fail-every', type=int, default=0)
+    args = parser.parse_args()
+    stub = TelegramStub(port=args.port, fail_every=args.fail_every)
+    print(f"Telegram stub listening on {stub.url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Flask app's routes against a synthetic dataset.
+
+    python3 benchmarks/bench_app.py --plants 10000 --photos 100000
+    python3 benchmarks/bench_app.py --plants 100000 --iterations 2000 --concurrency 4
+
+The app runs in-process through Flask's test client, with simulated relays,
+the fake camera and a local Telegram stub, on a throwaway data directory.
+Plants, calendars (one generated seed -> veg -> flower timeline per plant)
+and photo files are created up front. Each scenario then runs
+`--iterations` requests against random plants.
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from common import APP_DIR, measure, print_table, save_results
+
+TEMPLATES = {
+    'index.html': 'index_1753626982463.html',
+    'plant.html': 'plant_1753626982464.html',
+}
+
+
+def load_app(data_dir, telegram_url, storage='sqlite'):
+    """Import app.py configured for a headless run on `data_dir`"""
+    os.environ.update({
+        'PLANT_APP_DIR': data_dir,
+        'STORAGE_BACKEND': storage,
+        'HARDWARE_BACKEND': 'simulated',
+        'CAMERA_BACKEND': 'fake',
+        'TELEGRAM_BOT_TOKEN': 'bench-token',
+        'TELEGRAM_CHAT_ID': '1',
+        'TELEGRAM_API_BASE': telegram_url,
+    })
+    sys.path.insert(0, APP_DIR)
+    import importlib
+    app = importlib.import_module('app_1753626715233')
+    app.create_app()
+    # The templates ship with upload suffixes; serve them under the names the routes use
+    template_dir = os.path.join(data_dir, 'templates')
+    os.makedirs(template_dir, exist_ok=True)
+    for name, source in TEMPLATES.items():
+        shutil.copy(os.path.join(APP_DIR, source), os.path.join(template_dir, name))
+    app.app.template_folder = template_dir
+    return app
+
+
+def seed(app, plant_count, photo_count):
+    started = time.perf_counter()
+    stages = list(app.STAGE_PRESETS)
+    plant_ids = []
+    for i in range(plant_count):
+        plant_id = f"b{i:07d}"
+        app.plants.add({'id': plant_id, 'name': f"Plant {i}", 'strain_type': 'hybrid',
+                        'location': f"tent-{i % 20}", 'stage': stages[i % len(stages)]})
+        plant_ids.append(plant_id)
+    app.plants.flush()
+
+    batch = {}
+    for i, plant_id in enumerate(plant_ids):
+        start = f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}"
+        batch[plant_id] = app.schedule_planner.plan(start, ['seed', 'veg', 'flower'])
+        if len(batch) == 1000:
+            app.calendar_store.set_many(batch)
+            batch = {}
+    if batch:
+        app.calendar_store.set_many(batch)
+
+    for i in range(photo_count):
+        plant_id = plant_ids[i % len(plant_ids)]
+        name = f"{plant_id}_2025{i % 12 + 1:02d}{i % 28 + 1:02d}_{i // 3600 % 24:02d}{i // 60 % 60:02d}{i % 60:02d}.jpg"
+        open(os.path.join(app.PHOTO_FOLDER, name), 'wb').close()
+    app.photo_index.rebuild()
+    return plant_ids, time.perf_counter() - started
+
+
+def scenarios(app, plant_ids, rng):
+    client = app.app.test_client()
+    pick = lambda: rng.choice(plant_ids)
+    etags = {}
+
+    def ok(response, *statuses):
+        return response.status_code in (statuses or (200,))
+
+    def view_plant(i):
+        return ok(client.get(f"/plant/{pick()}"))
+
+    def calendar_full(i):
+        return ok(client.get(f"/api/calendar/{pick()}"))
+
+    def calendar_month(i):
+        return ok(client.get(f"/api/calendar/{pick()}?month=2025-{i % 12 + 1:02d}"))
+
+    def calendar_revalidate(i):
+        plant_id = plant_ids[i % 100]
+        headers = {'If-None-Match': etags[plant_id]} if plant_id in etags else {}
+        response = client.get(f"/api/calendar/{plant_id}", headers=headers)
+        if response.status_code == 200:
+            etags[plant_id] = response.headers.get('ETag')
+        return ok(response, 200, 304)
+
+    def calendar_upcoming(i):
+        return ok(client.get(f"/api/calendar/upcoming?start=2025-{i % 12 + 1:02d}-01&days=7&limit=500"))
+
+    def calendar_update(i):
+        return ok(client.put(f"/api/calendar/{pick()}", json={'date': f"2025-06-{i % 28 + 1:02d}",
+                                                              'action': f"Note {i}"}))
+
+    def calendar_generate(i):
+        return ok(client.post(f"/api/calendar/generate/{pick()}",
+                              json={'start_date': '2025-03-01', 'stage': 'veg'}))
+
+    def add_plant(i):
+        return ok(client.post('/add-plant', data={'name': f"New {i}", 'strain_type': 'indica',
+                                                  'location': 'tent-1', 'stage': 'veg'}), 302)
+
+    def capture(i):
+        return ok(client.post(f"/capture/{pick()}", headers={'Accept': 'application/json'}), 202)
+
+    return {
+        'GET /plant/<id>': view_plant,
+        'GET /api/calendar/<id>': calendar_full,
+        'GET /api/calendar/<id>?month': calendar_month,
+        'GET /api/calendar/<id> (revalidate)': calendar_revalidate,
+        'GET /api/calendar/upcoming': calendar_upcoming,
+        'PUT /api/calendar/<id>': calendar_update,
+        'POST /api/calendar/generate/<id>': calendar_generate,
+        'POST /add-plant': add_plant,
+        'POST /capture/<id>': capture,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Flask app routes")
+    parser.add_argument('--plants', type=int, default=10000)
+    parser.add_argument('--photos', type=int, default=10000)
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=1, help="request threads per scenario")
+    parser.add_argument('--only', action='append', help="run only scenarios containing this text")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--storage', choices=['sqlite', 'json'], default='sqlite',
+                        help="plant and calendar storage backend")
+    parser.add_argument('--output', help="result file (default: benchmarks/results/app-<time>.json)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, APP_DIR)
+    from telegram_stub import TelegramStub
+    telegram = TelegramStub().start()
+    data_dir = tempfile.mkdtemp(prefix='plant-bench-')
+    app = None
+    try:
+        app = load_app(data_dir, telegram.url, args.storage)
+        plant_ids, seed_seconds = seed(app, args.plants, args.photos)
+        print(f"Seeded {len(plant_ids)} plants with calendars and {app.photo_index.count()} photos "
+              f"in {seed_seconds:.1f}s")
+
+        rng = random.Random(args.seed)
+        results = {}
+        for name, operation in scenarios(app, plant_ids, rng).items():
+            if args.only and not any(text in name for text in args.only):
+                continue
+            results[name] = measure(operation, args.iterations, concurrency=args.concurrency)
+            print(f"  {name}: p50 {results[name]['p50_ms']} ms, p99 {results[name]['p99_ms']} ms")
+
+        print_table(results)
+        params = {'plants': args.plants, 'photos': args.photos, 'iterations': args.iterations,
+                  'concurrency': args.concurrency, 'seed': args.seed, 'storage': args.storage,
+                  'seed_seconds': round(seed_seconds, 2)}
+        print(f"Saved {save_results('app', params, results, args.output)}")
+    finally:
+        if app is not None:
+            app.shutdown()
+        telegram.stop()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
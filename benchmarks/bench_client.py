@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Benchmark pi_client's monitoring cycle against a local stub of the web API.
+
+    python3 benchmarks/bench_client.py --tents 1 --cycles 200
+    python3 benchmarks/bench_client.py --tents 20 --latency-ms 40 --change-every 5
+
+Each cycle is one PiPlantMonitor.run_monitoring_cycle(): read every tent's
+(simulated) sensors, upload the batch, report rule changes and sync the
+device list. The stub answers /api/sensor-data/bulk, /api/devices (with
+ETags) and PUT /api/devices/<id>. It can add a fixed delay per request to
+mimic a remote server, and it flips one device every --change-every
+cycles, so some syncs download a new list instead of getting a 304.
+With --wire auto the stub also accepts and serves the compact binary
+format, and the report shows the bytes each way for either setting.
+"""
+
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from common import CLIENT_DIR, measure, print_table, save_results
+
+sys.path.insert(0, CLIENT_DIR)
+import wire_format
+
+
+class StubApi:
+    """Threaded stand-in for the endpoints a monitoring cycle calls"""
+
+    def __init__(self, devices, latency=0.0, compact=False):
+        self.devices = devices
+        self.latency = latency
+        self.compact = compact
+        self.version = 1
+        self.readings = 0
+        self.requests = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; don't let Nagle hold the body back
+            disable_nagle_algorithm = True
+
+            def _body(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                with stub._lock:
+                    stub.bytes_in += len(body)
+                if self.headers.get('Content-Encoding') == 'gzip':
+                    body = gzip.decompress(body)
+                if self.headers.get('Content-Type') == wire_format.READINGS_TYPE:
+                    return wire_format.decode_readings(body)
+                return json.loads(body or b'null')
+
+            def _reply(self, status, body=None, headers=None, content_type='application/json'):
+                if isinstance(body, bytes):
+                    payload = body
+                else:
+                    payload = b'' if body is None else json.dumps(body).encode()
+                with stub._lock:
+                    stub.bytes_out += len(payload)
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _handle(self, method):
+                if stub.latency:
+                    time.sleep(stub.latency)
+                with stub._lock:
+                    stub.requests += 1
+                if method == 'POST' and self.path == '/api/sensor-data/bulk':
+                    batch = self._body()
+                    with stub._lock:
+                        stub.readings += len(batch['readings'])
+                    headers = {'Accept-Post': f"application/json, {wire_format.READINGS_TYPE}"} if stub.compact else {}
+                    return self._reply(201, {'accepted': len(batch['readings'])}, headers)
+                if method == 'GET' and self.path == '/api/devices':
+                    with stub._lock:
+                        etag = f'"{stub.version}"'
+                        devices = [dict(d) for d in stub.devices]
+                    if self.headers.get('If-None-Match') == etag:
+                        return self._reply(304)
+                    if stub.compact and wire_format.DEVICES_TYPE in self.headers.get('Accept', ''):
+                        return self._reply(200, wire_format.encode_devices(devices), {'ETag': etag},
+                                           content_type=wire_format.DEVICES_TYPE)
+                    return self._reply(200, devices, {'ETag': etag})
+                if method == 'PUT' and self.path.startswith('/api/devices/'):
+                    self._body()
+                    return self._reply(200, {})
+                self._reply(404, {'error': 'Not found'})
+
+            def do_GET(self):
+                self._handle('GET')
+
+            def do_POST(self):
+                self._handle('POST')
+
+            def do_PUT(self):
+                self._handle('PUT')
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def flip(self):
+        """Toggle one device so the next sync sees a changed list"""
+        with self._lock:
+            device = self.devices[self.version % len(self.devices)]
+            device['isOn'] = not device['isOn']
+            self.version += 1
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pi_client monitoring cycle")
+    parser.add_argument('--tents', type=int, default=1, help="simulated device groups per client")
+    parser.add_argument('--cycles', type=int, default=200)
+    parser.add_argument('--latency-ms', type=float, default=0, help="added delay per stub request")
+    parser.add_argument('--change-every', type=int, default=10,
+                        help="flip a device on the server every N cycles (0 = never)")
+    parser.add_argument('--wire', choices=('json', 'auto'), default='json',
+                        help="pi_client WIRE_FORMAT; with auto the stub speaks the compact format too")
+    parser.add_argument('--output', help="result file (default: benchmarks/results/client-<time>.json)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='pi-client-bench-')
+    with contextlib.redirect_stdout(io.StringIO()):
+        import pi_client
+        from device_groups import simulated_groups
+    pi_client.BUFFER_FILE = os.path.join(work_dir, 'reading_buffer.db')
+    pi_client.PHOTO_SPOOL_DIR = os.path.join(work_dir, 'photo_spool')
+    pi_client.STATS_FILE = os.path.join(work_dir, 'client_stats.json')
+    pi_client.WIRE_FORMAT = args.wire
+
+    devices = [{'id': f"{tent}-{kind}", 'deviceType': kind, 'isOn': False, 'deviceGroup': f"sim-{tent}"}
+               for tent in range(1, args.tents + 1) for kind in ('light', 'fan', 'pump')]
+    stub = StubApi(devices, latency=args.latency_ms / 1000, compact=args.wire == 'auto').start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        monitor = pi_client.PiPlantMonitor(simulated_groups(args.tents, seed=1), api_base=stub.url,
+                                           client_id='bench')
+    monitor.longpoll_supported = False
+
+    def cycle(i):
+        if args.change_every and i % args.change_every == 0:
+            stub.flip()
+        # The client narrates every step; keep that out of the timings and the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            monitor.run_monitoring_cycle()
+        return len(monitor.buffer) == 0
+
+    try:
+        results = {f"run_monitoring_cycle ({args.tents} tents)": measure(cycle, args.cycles, warmup=5)}
+    finally:
+        with contextlib.redirect_stdout(io.StringIO()):
+            monitor.cleanup()
+        stub.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_table(results)
+    print(f"Stub received {stub.requests} requests and {stub.readings} readings")
+    print(f"Body bytes: {stub.bytes_in} uploaded, {stub.bytes_out} downloaded ({args.wire})")
+    params = {'tents': args.tents, 'cycles': args.cycles, 'latency_ms': args.latency_ms,
+              'change_every': args.change_every, 'wire': args.wire}
+    print(f"Saved {save_results('client', params, results, args.output)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Measure how long the Flask app takes to import, start and answer.
+
+    python3 benchmarks/bench_startup.py --runs 20
+    python3 benchmarks/bench_startup.py --importtime 15
+
+Each run starts a fresh interpreter on an empty data directory. It imports
+app.py, calls create_app() and serves one GET /health through the test
+client, timing each phase separately. With --importtime N, one more run
+under `python -X importtime` lists the N modules with the largest
+cumulative import time, so a heavy module-level import stands out.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import APP_DIR, print_table, save_results, summarize
+
+CHILD = """
+import json, time
+started = time.perf_counter()
+import app_1753626715233 as plant_app
+imported = time.perf_counter()
+plant_app.create_app()
+created = time.perf_counter()
+status = plant_app.app.test_client().get('/health').status_code
+answered = time.perf_counter()
+plant_app.shutdown()
+print(json.dumps({'import': imported - started, 'create_app': created - imported,
+                  'first_request': answered - created, 'status': status}))
+"""
+
+PHASES = {
+    'import app': 'import',
+    'create_app()': 'create_app',
+    'first GET /health': 'first_request',
+}
+
+
+def child_env(data_dir):
+    env = dict(os.environ, PLANT_APP_DIR=data_dir, HARDWARE_BACKEND='simulated', CAMERA_BACKEND='fake')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [APP_DIR, os.environ.get('PYTHONPATH')]))
+    return env
+
+
+def run_once(extra_args=()):
+    data_dir = tempfile.mkdtemp(prefix='plant-startup-')
+    try:
+        result = subprocess.run([sys.executable, *extra_args, '-c', CHILD], env=child_env(data_dir),
+                                cwd=data_dir, capture_output=True, text=True, timeout=120)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"App failed to start:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(stderr, count):
+    """(cumulative µs, module) from -X importtime output, largest first"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        rows.append((int(cumulative), name))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark app startup")
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--importtime', type=int, default=0, metavar='N',
+                        help="also list the N slowest imports (python -X importtime)")
+    parser.add_argument('--output', help="result file (default: benchmarks/results/startup-<time>.json)")
+    args = parser.parse_args()
+
+    samples = {name: [] for name in PHASES}
+    started = time.perf_counter()
+    for _ in range(args.runs):
+        timings, _ = run_once()
+        if timings['status'] != 200:
+            raise RuntimeError(f"/health answered {timings['status']}")
+        for name, key in PHASES.items():
+            samples[name].append(timings[key])
+    wall = time.perf_counter() - started
+    results = {name: summarize(values, wall) for name, values in samples.items()}
+    print_table(results)
+
+    if args.importtime:
+        _, stderr = run_once(['-X', 'importtime'])
+        print(f"\nSlowest imports (cumulative):")
+        for cumulative, name in slowest_imports(stderr, args.importtime):
+            print(f"  {cumulative / 1000:8.1f} ms  {name.strip()}")
+
+    params = {'runs': args.runs}
+    print(f"Saved {save_results('startup', params, results, args.output)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Compare the compact binary wire format with JSON for pi_client traffic.
+
+    python3 benchmarks/bench_wire.py
+    python3 benchmarks/bench_wire.py --batches 1,50,500 --devices 30 --sampled
+
+Payloads are sensor batches shaped like ReadingBuffer's (sequence numbers,
+ISO timestamps 30 s apart, slowly drifting integer readings, plant and
+device group ids) and device lists shaped like GET /api/devices, both as a
+full list and as the one-device delta a toggle produces. For each payload
+the body size is printed for JSON and the compact format, raw and gzipped,
+and encoding and decoding are timed the way each body travels: sensor
+batches gzipped, device responses not. With --sampled every reading also
+carries per-window sampler stats, which the compact format stores as JSON.
+"""
+
+import argparse
+import gzip
+import json
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+
+from common import CLIENT_DIR, measure, print_table, save_results
+
+sys.path.insert(0, CLIENT_DIR)
+import wire_format
+
+
+def make_readings(count, sampled=False, seed=1):
+    rng = random.Random(seed)
+    started = datetime.now(timezone.utc)
+    temperature, humidity, moisture = 24.0, 55.0, 40.0
+    readings = []
+    for i in range(count):
+        temperature += rng.uniform(-0.3, 0.3)
+        humidity += rng.uniform(-1, 1)
+        moisture -= rng.uniform(0, 0.2)
+        reading = {
+            'temperature': int(temperature),
+            'humidity': int(humidity),
+            'soilMoisture': int(moisture),
+            'plantId': 'c6f1d2a4-5b7e-4c38-9f0a-1d2e3f4a5b6c',
+            'deviceGroup': 'tent-1',
+            'seq': 48210 + i,
+            'recordedAt': (started + timedelta(seconds=30 * i)).isoformat(),
+        }
+        if sampled:
+            reading['stats'] = {
+                channel: {'min': value - 0.4, 'max': value + 0.5, 'mean': value + rng.random() / 10,
+                          'stddev': rng.random() / 4, 'filtered': value, 'count': 60}
+                for channel, value in (('temperature', temperature), ('humidity', humidity))
+            }
+        readings.append(reading)
+    return readings
+
+
+def make_devices(count, seed=1):
+    rng = random.Random(seed)
+    kinds = ('light', 'fan', 'pump', 'heater', 'humidifier')
+    toggled = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [{
+        'id': f"{rng.getrandbits(128):032x}",
+        'plantId': None,
+        'deviceGroup': f"tent-{i // len(kinds) + 1}",
+        'deviceType': kinds[i % len(kinds)],
+        'name': f"{kinds[i % len(kinds)].title()} {i // len(kinds) + 1}",
+        'isOn': rng.random() < 0.5,
+        'autoMode': False,
+        'wattage': 600 if i % len(kinds) == 0 else None,
+        'distanceFromPlant': 45 if i % len(kinds) == 0 else None,
+        'isDimmable': i % len(kinds) == 0,
+        'currentIntensity': 100,
+        'lastToggled': (toggled + timedelta(minutes=37 * i)).isoformat(timespec='milliseconds'),
+    } for i in range(count)]
+
+
+def json_body(payload):
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+
+def sizes(json_bytes, compact_bytes):
+    return {
+        'json': len(json_bytes),
+        'json+gzip': len(gzip.compress(json_bytes)),
+        'compact': len(compact_bytes),
+        'compact+gzip': len(gzip.compress(compact_bytes)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the compact wire format against JSON")
+    parser.add_argument('--batches', default='1,50,500', help="sensor batch sizes, comma-separated")
+    parser.add_argument('--devices', type=int, default=30, help="devices in the full device list")
+    parser.add_argument('--sampled', action='store_true', help="attach sampler stats to every reading")
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--output', help="result file (default: benchmarks/results/wire-<time>.json)")
+    args = parser.parse_args()
+
+    results = {}
+    size_rows = {}
+
+    def scenario(name, operation, body_bytes):
+        results[name] = measure(lambda i: operation(), args.iterations)
+        results[name]['bytes'] = body_bytes
+
+    for count in [int(n) for n in args.batches.split(',')]:
+        readings = make_readings(count, sampled=args.sampled)
+        label = f"{count} readings"
+        batch = {'sourceId': 'pi-tent-1', 'readings': readings}
+        as_json = gzip.compress(json_body(batch))
+        as_compact = gzip.compress(wire_format.encode_readings('pi-tent-1', readings))
+        size_rows[label] = sizes(json_body(batch), wire_format.encode_readings('pi-tent-1', readings))
+        scenario(f"encode json+gzip ({label})", lambda: gzip.compress(json_body(batch)), len(as_json))
+        scenario(f"encode compact+gzip ({label})",
+                 lambda: gzip.compress(wire_format.encode_readings('pi-tent-1', readings)), len(as_compact))
+        scenario(f"decode json+gzip ({label})", lambda: json.loads(gzip.decompress(as_json)), len(as_json))
+        scenario(f"decode compact+gzip ({label})",
+                 lambda: wire_format.decode_readings(gzip.decompress(as_compact)), len(as_compact))
+
+    devices = make_devices(args.devices)
+    for label, listed, full in ((f"{args.devices} devices", devices, True), ("1 device delta", devices[:1], False)):
+        as_json = json_body(listed)
+        as_compact = wire_format.encode_devices(listed, full=full)
+        size_rows[label] = sizes(as_json, as_compact)
+        scenario(f"encode json ({label})", lambda: json_body(listed), len(as_json))
+        scenario(f"encode compact ({label})", lambda: wire_format.encode_devices(listed, full=full),
+                 len(as_compact))
+        scenario(f"decode json ({label})", lambda: json.loads(as_json), len(as_json))
+        scenario(f"decode compact ({label})", lambda: wire_format.decode_devices(as_compact), len(as_compact))
+
+    print(f"{'payload bytes':<24} {'json':>9} {'json+gzip':>10} {'compact':>9} {'compact+gzip':>13}")
+    for label, row in size_rows.items():
+        print(f"{label:<24} {row['json']:>9} {row['json+gzip']:>10} {row['compact']:>9} {row['compact+gzip']:>13}")
+    print()
+    print_table(results)
+
+    params = {'batches': args.batches, 'devices': args.devices, 'sampled': args.sampled,
+              'iterations': args.iterations}
+    print(f"Saved {save_results('wire', params, results, args.output)}")
+
+
+if __name__ == '__main__':
+    main()
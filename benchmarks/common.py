@@ -0,0 +1,110 @@
+"""
+Timing and result helpers shared by the benchmark scripts.
+
+Each scenario is timed per call with time.perf_counter and summarised as
+p50/p90/p99/max latency in milliseconds plus throughput. A run is saved
+as one JSON file in benchmarks/results/, named after the suite and the
+start time. It carries the git commit and machine details, so
+compare.py can line up two runs.
+"""
+
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+APP_DIR = os.path.join(ROOT, 'attached_assets')
+CLIENT_DIR = os.path.join(ROOT, 'pi-integration')
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    rank = min(len(sorted_values), max(1, math.ceil(pct / 100 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+def summarize(durations, wall_seconds, errors=0):
+    durations = sorted(durations)
+    ms = lambda seconds: None if seconds is None else round(seconds * 1000, 3)
+    return {
+        'count': len(durations),
+        'errors': errors,
+        'p50_ms': ms(percentile(durations, 50)),
+        'p90_ms': ms(percentile(durations, 90)),
+        'p99_ms': ms(percentile(durations, 99)),
+        'max_ms': ms(durations[-1] if durations else None),
+        'mean_ms': ms(sum(durations) / len(durations) if durations else None),
+        'throughput_per_s': round(len(durations) / wall_seconds, 1) if wall_seconds > 0 else None,
+    }
+
+
+def measure(operation, iterations, warmup=10, concurrency=1):
+    """Call operation(i) `iterations` times; a falsy return or an exception counts as an error"""
+    for i in range(warmup):
+        operation(i)
+
+    def timed(i):
+        start = time.perf_counter()
+        try:
+            ok = operation(i)
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, bool(ok)
+
+    started = time.perf_counter()
+    if concurrency <= 1:
+        samples = [timed(i) for i in range(iterations)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(timed, range(iterations)))
+    wall = time.perf_counter() - started
+    return summarize([d for d, _ in samples], wall, errors=sum(1 for _, ok in samples if not ok))
+
+
+def git_revision():
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                  capture_output=True, text=True, timeout=10).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True, timeout=10).stdout.strip()
+        return f"{revision}{'-dirty' if dirty else ''}" if revision else None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def save_results(suite, params, results, output=None):
+    """Write one run to benchmarks/results/ (or `output`) and return the path"""
+    started = datetime.now(timezone.utc)
+    run = {
+        'suite': suite,
+        'timestamp': started.isoformat(),
+        'git': git_revision(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'params': params,
+        'results': results,
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{suite}-{started.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, 'w') as f:
+        json.dump(run, f, indent=2)
+    return output
+
+
+def print_table(results):
+    print(f"{'scenario':<40} {'n':>6} {'err':>4} {'p50 ms':>9} {'p99 ms':>9} {'ops/s':>9}")
+    for name, r in results.items():
+        print(f"{name:<40} {r['count']:>6} {r['errors']:>4} {r['p50_ms']:>9} {r['p99_ms']:>9} "
+              f"{r['throughput_per_s']:>9}")
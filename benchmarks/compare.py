@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Compare two benchmark result files.
+
+    python3 benchmarks/compare.py results/app-20250101-120000.json results/app-20250102-090000.json
+
+Prints p50/p99 and throughput for every scenario in both runs, with the
+change in percent. Exits with status 1 when any p99 got slower by more
+than --threshold percent, so the script can gate CI.
+"""
+
+import argparse
+import json
+import sys
+
+
+def change(old, new):
+    if old in (None, 0) or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def fmt(pct):
+    return '' if pct is None else f"{pct:+.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark runs")
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help="p99 slowdown (percent) counted as a regression")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    if baseline.get('params') != candidate.get('params'):
+        print(f"Warning: runs used different parameters:\n  {baseline.get('params')}\n  {candidate.get('params')}")
+
+    print(f"baseline  {baseline.get('git')} {baseline.get('timestamp')}")
+    print(f"candidate {candidate.get('git')} {candidate.get('timestamp')}")
+    print(f"{'scenario':<40} {'p50 old':>8} {'new':>8} {'change':>8} {'p99 old':>8} {'new':>8} {'change':>8} "
+          f"{'ops/s':>8}")
+    regressions = []
+    for name, new in candidate['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            print(f"{name:<40} (new) p50 {new['p50_ms']} p99 {new['p99_ms']}")
+            continue
+        p99_change = change(old['p99_ms'], new['p99_ms'])
+        print(f"{name:<40} {old['p50_ms']:>8} {new['p50_ms']:>8} {fmt(change(old['p50_ms'], new['p50_ms'])):>8} "
+              f"{old['p99_ms']:>8} {new['p99_ms']:>8} {fmt(p99_change):>8} "
+              f"{fmt(change(old['throughput_per_s'], new['throughput_per_s'])):>8}")
+        if p99_change is not None and p99_change > args.threshold:
+            regressions.append(name)
+
+    if regressions:
+        print(f"\np99 regressions over {args.threshold}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
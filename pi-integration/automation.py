@@ -0,0 +1,152 @@
+"""
+On-device automation rules.
+
+Rules are plain dicts (usually from the client config) and are compiled
+once into small closures, so evaluating a sensor sample is a handful of
+comparisons with no parsing. Two kinds are supported:
+
+    {"device": "fan", "when": "humidity > 70", "hysteresis": 5}
+        on above 70, off again at or below 65, unchanged in between
+
+    {"device": "pump", "when": "soilMoisture < 30", "pulse_seconds": 5, "max_per_hour": 4}
+        run the pump for 5 s while the soil is dry, at most 4 times per hour
+
+When several rules drive the same device it is on if any rule wants it on,
+and off only once none of them is holding it.
+"""
+
+import collections
+import operator
+import re
+import time
+
+CONDITION = re.compile(r'^\s*(\w+)\s*(<=|>=|<|>)\s*(-?\d+(?:\.\d+)?)\s*$')
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+}
+
+
+def parse_condition(text):
+    """'humidity > 70' -> ('humidity', '>', 70.0)"""
+    match = CONDITION.match(text)
+    if not match:
+        raise ValueError(f"Invalid rule condition '{text}' (expected e.g. 'humidity > 70')")
+    sensor, op, value = match.groups()
+    return sensor, op, float(value)
+
+
+def compile_threshold(sensor, op, threshold, hysteresis=0):
+    """Build decide(reading) -> True (on), False (off) or None (inside the dead band / no value)"""
+    on = OPERATORS[op]
+    release = threshold - hysteresis if op in ('>', '>=') else threshold + hysteresis
+
+    def decide(reading):
+        value = reading.get(sensor)
+        if value is None:
+            return None
+        if on(value, threshold):
+            return True
+        if not on(value, release):
+            return False
+        return None
+
+    return decide
+
+
+class ThresholdRule:
+    """Holds a device on while a condition holds, with a hysteresis band"""
+
+    def __init__(self, device, decide):
+        self.device = device
+        self.decide = decide
+
+    def evaluate(self, reading, now):
+        return self.decide(reading)
+
+    def deadline(self):
+        return None
+
+
+class PulseRule:
+    """Runs a device for a fixed time when a condition holds, rate limited per hour"""
+
+    def __init__(self, device, decide, pulse_seconds, max_per_hour):
+        self.device = device
+        self.decide = decide
+        self.pulse_seconds = pulse_seconds
+        self.max_per_hour = max_per_hour
+        self.starts = collections.deque()
+        self.until = None
+
+    def evaluate(self, reading, now):
+        if self.until is not None:
+            if now < self.until:
+                return True
+            self.until = None
+            return False
+        if self.decide(reading) is not True:
+            return False
+        while self.starts and now - self.starts[0] >= 3600:
+            self.starts.popleft()
+        if len(self.starts) >= self.max_per_hour:
+            return False
+        self.starts.append(now)
+        self.until = now + self.pulse_seconds
+        return True
+
+    def deadline(self):
+        return self.until
+
+
+def compile_rule(spec):
+    try:
+        device = spec['device']
+        sensor, op, threshold = parse_condition(spec['when'])
+    except KeyError as e:
+        raise ValueError(f"Rule {spec} is missing {e}")
+    if 'pulse_seconds' in spec:
+        decide = compile_threshold(sensor, op, threshold)
+        return PulseRule(device, decide, float(spec['pulse_seconds']), int(spec.get('max_per_hour', 4)))
+    decide = compile_threshold(sensor, op, threshold, float(spec.get('hysteresis', 0)))
+    return ThresholdRule(device, decide)
+
+
+class RuleEngine:
+    """Evaluates a compiled rule set against sensor readings"""
+
+    def __init__(self, specs):
+        self.rules = [compile_rule(spec) for spec in specs]
+        self.devices = frozenset(rule.device for rule in self.rules)
+
+    def evaluate(self, reading, now=None, enabled=None):
+        """Desired {device: is_on} for this reading; devices no rule has an opinion on are omitted.
+
+        Pass an empty reading to advance timers (e.g. end a pump pulse) between samples.
+        `enabled(device)` can switch rules off per device.
+        """
+        now = time.monotonic() if now is None else now
+        desired = {}
+        held = set()
+        for rule in self.rules:
+            if enabled is not None and not enabled(rule.device):
+                continue
+            decision = rule.evaluate(reading, now)
+            if decision is None:
+                held.add(rule.device)
+            elif decision:
+                desired[rule.device] = True
+            else:
+                desired.setdefault(rule.device, False)
+        # A rule inside its dead band keeps the device as it is unless another rule turns it on
+        for device in held:
+            if desired.get(device) is False:
+                del desired[device]
+        return desired
+
+    def next_deadline(self):
+        """Monotonic time at which a running pulse must end, or None"""
+        deadlines = [d for d in (rule.deadline() for rule in self.rules) if d is not None]
+        return min(deadlines) if deadlines else None
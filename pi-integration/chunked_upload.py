@@ -0,0 +1,231 @@
+"""
+Resumable, chunked photo uploads.
+
+A photo is uploaded from its file on disk one chunk at a time, so memory
+use is bounded by the chunk size, not the image size. The upload id is
+chosen by the client and recorded in a small state file next to the
+photo before the first byte is sent; after a dropped connection (or a
+restart) the client asks the server how much it already has and continues
+from there.
+
+Each upload also carries an upload key, a SHA-256 of the plant id and the
+photo's bytes. The server remembers the keys of finished uploads, so if the
+final acknowledgement is lost and the upload is started again, it answers
+with the stored photo instead of accepting the same bytes a second time.
+Requests the server rejects outright (4xx other than timeouts, conflicts and
+rate limits) are not retried; the photo is moved to `rejected/` in the
+spool, which keeps only the most recent few.
+
+Protocol (see server/routes.ts and upload_stub.py):
+    POST  /api/photos/uploads             {uploadId, uploadKey, plantId, size, filename}
+                                          -> {offset} or {offset, complete, photo}
+    GET   /api/photos/uploads/<id>        -> {offset, size}
+    PATCH /api/photos/uploads/<id>        Upload-Offset: N, octet-stream body
+                                          -> {offset, complete[, photo]} or 409 {offset}
+"""
+
+import hashlib
+import json
+import os
+import time
+import uuid
+
+import requests
+
+CHUNK_SIZE = 256 * 1024
+RETRYABLE_STATUS = (408, 409, 425, 429)
+REJECTED_KEEP = 20  # rejected photos kept for inspection
+
+
+class UploadNotSupported(Exception):
+    """The server has no chunked upload endpoint"""
+
+
+class UploadRejected(Exception):
+    """The server refused the upload and retrying would not change that"""
+
+
+class ChunkedUploader:
+    """Uploads spooled photos in chunks and resumes interrupted uploads"""
+
+    def __init__(self, session, api_base, spool_dir, chunk_size=CHUNK_SIZE,
+                 timeout=(10, 30), max_retries=5):
+        self.session = session
+        self.api_base = api_base.rstrip('/')
+        self.spool_dir = spool_dir
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        os.makedirs(spool_dir, exist_ok=True)
+
+    def _url(self, upload_id=None):
+        base = f"{self.api_base}/api/photos/uploads"
+        return f"{base}/{upload_id}" if upload_id else base
+
+    def upload_key(self, path, plant_id):
+        """SHA-256 of the plant id and the photo, read a chunk at a time"""
+        digest = hashlib.sha256(f"{plant_id}\n".encode('utf-8'))
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def enqueue(self, path, plant_id):
+        """Record a spooled photo as pending upload and return its state"""
+        state = {
+            'uploadId': uuid.uuid4().hex,
+            'uploadKey': self.upload_key(path, plant_id),
+            'path': path,
+            'plantId': plant_id,
+            'size': os.path.getsize(path),
+        }
+        with open(path + '.upload', 'w') as f:
+            json.dump(state, f)
+        return state
+
+    def pending(self):
+        states = []
+        for name in sorted(os.listdir(self.spool_dir)):
+            if not name.endswith('.upload'):
+                continue
+            try:
+                with open(os.path.join(self.spool_dir, name), 'r') as f:
+                    states.append(json.load(f))
+            except (OSError, ValueError):
+                os.remove(os.path.join(self.spool_dir, name))
+        return states
+
+    def upload(self, path, plant_id):
+        """Upload a spooled photo; it is deleted once the server has all of it"""
+        return self.send(self.enqueue(path, plant_id))
+
+    def resume_pending(self):
+        """Finish uploads left over from earlier failures or restarts; returns how many completed"""
+        done = 0
+        for state in self.pending():
+            if not os.path.exists(state['path']):
+                os.remove(state['path'] + '.upload')
+                continue
+            try:
+                self.send(state)
+            except UploadRejected as e:
+                print(f"✗ {e}; moved it to {os.path.join(self.spool_dir, 'rejected')}")
+                continue
+            done += 1
+        return done
+
+    def send(self, state):
+        """Upload (or continue uploading) one photo; returns the server's photo record.
+
+        If the server already has the photo (its final acknowledgement was
+        lost), it is recognised by the upload key and not sent again. Raises
+        UploadRejected, after moving the photo to rejected/, when the server
+        refuses it for good.
+        """
+        offset, photo = None, None
+        attempts = 0
+        with open(state['path'], 'rb') as f:
+            while photo is None and (offset is None or offset < state['size']):
+                try:
+                    if offset is None:
+                        offset, photo = self._create(state)
+                        continue
+                    f.seek(offset)
+                    chunk = f.read(self.chunk_size)
+                    response = self.session.patch(
+                        self._url(state['uploadId']),
+                        data=chunk,
+                        headers={'Upload-Offset': str(offset), 'Content-Type': 'application/octet-stream'},
+                        timeout=self.timeout
+                    )
+                    if response.status_code == 409:
+                        offset = response.json().get('offset')
+                        if offset is None:
+                            # An earlier attempt at this chunk is still being written
+                            time.sleep(1)
+                            offset = self._offset(state)
+                        continue
+                    if response.status_code == 404:
+                        # Finished by an earlier attempt or dropped by the server: start again by key
+                        offset = None
+                        continue
+                    self._check(response, state)
+                    body = response.json()
+                    attempts = 0
+                    offset = body['offset']
+                    if body.get('complete'):
+                        photo = body.get('photo')
+                except requests.RequestException as e:
+                    attempts += 1
+                    if attempts > self.max_retries:
+                        raise
+                    print(f"✗ Upload interrupted at {offset}/{state['size']} bytes ({e}), retrying")
+                    time.sleep(min(2 ** attempts, 30))
+                    if offset is not None:
+                        try:
+                            offset = self._offset(state)
+                        except requests.RequestException:
+                            pass
+        self.discard(state)
+        return photo
+
+    def _create(self, state):
+        """Start the upload, or find it again; returns (offset, photo) with photo set once it is stored"""
+        if 'uploadKey' not in state:
+            # State files written before upload keys existed
+            state['uploadKey'] = self.upload_key(state['path'], state['plantId'])
+        response = self.session.post(self._url(), json={
+            'uploadId': state['uploadId'],
+            'uploadKey': state['uploadKey'],
+            'plantId': state['plantId'],
+            'size': state['size'],
+            'filename': os.path.basename(state['path']),
+        }, timeout=self.timeout)
+        if response.status_code == 404:
+            raise UploadNotSupported()
+        self._check(response, state)
+        body = response.json()
+        return body['offset'], body.get('photo') if body.get('complete') else None
+
+    def _check(self, response, state):
+        """raise_for_status, except that a 4xx retrying can't fix abandons the upload"""
+        if 400 <= response.status_code < 500 and response.status_code not in RETRYABLE_STATUS:
+            try:
+                error = response.json().get('error')
+            except ValueError:
+                error = None
+            self.reject(state)
+            raise UploadRejected(f"Server rejected upload of {os.path.basename(state['path'])}: "
+                                 f"{response.status_code} {error or response.reason}")
+        response.raise_for_status()
+
+    def _offset(self, state):
+        response = self.session.get(self._url(state['uploadId']), timeout=self.timeout)
+        if response.status_code == 404:
+            return None
+        self._check(response, state)
+        return response.json()['offset']
+
+    def reject(self, state):
+        """Forget an upload the server refused, keeping its photo in rejected/ (the newest REJECTED_KEEP)"""
+        rejected_dir = os.path.join(self.spool_dir, 'rejected')
+        os.makedirs(rejected_dir, exist_ok=True)
+        try:
+            os.replace(state['path'], os.path.join(rejected_dir, os.path.basename(state['path'])))
+        except FileNotFoundError:
+            pass
+        try:
+            os.remove(state['path'] + '.upload')
+        except FileNotFoundError:
+            pass
+        kept = sorted(os.scandir(rejected_dir), key=lambda entry: entry.stat().st_mtime)
+        for entry in kept[:-REJECTED_KEEP]:
+            os.remove(entry.path)
+
+    def discard(self, state):
+        """Forget a finished upload and delete its spooled photo"""
+        for path in (state['path'] + '.upload', state['path']):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
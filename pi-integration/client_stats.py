@@ -0,0 +1,164 @@
+"""
+Counters and timings for the Pi client.
+
+`ClientStats` keeps running counters (uploads, failures), gauges (readings
+buffered) and timing summaries (count, total, max and p50/p99 over the
+last 512 samples) in memory. After every cycle it writes them atomically
+to a small JSON file that `cat`, `jq` or a cron job can read. With
+STATS_PORT set it also serves them: Prometheus text on /metrics and the
+JSON on /stats.
+"""
+
+import collections
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RECENT_SAMPLES = 512
+
+
+class _Timing:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = collections.deque(maxlen=RECENT_SAMPLES)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def quantile(self, pct):
+        recent = sorted(self.recent)
+        return recent[min(len(recent) - 1, int(len(recent) * pct))] if recent else None
+
+    def summary(self):
+        ms = lambda seconds: None if seconds is None else round(seconds * 1000, 2)
+        return {
+            'count': self.count,
+            'total_s': round(self.total, 3),
+            'max_ms': ms(self.max),
+            'p50_ms': ms(self.quantile(0.50)),
+            'p99_ms': ms(self.quantile(0.99)),
+        }
+
+
+class ClientStats:
+    """Thread-safe counters, gauges and timings with a JSON file and an optional HTTP view"""
+
+    def __init__(self, path=None, port=0):
+        self.path = path
+        self.started = time.time()
+        self._counters = collections.Counter()
+        self._gauges = {}
+        self._timings = collections.defaultdict(_Timing)
+        self._lock = threading.Lock()
+        self._server = None
+        if port:
+            self.serve(port)
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def set(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name, seconds):
+        with self._lock:
+            self._timings[name].add(seconds)
+
+    def timer(self, name):
+        return _Timer(self, name)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'updated': time.time(),
+                'uptime_s': round(time.time() - self.started, 1),
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges),
+                'timings': {name: t.summary() for name, t in self._timings.items()},
+            }
+
+    def write(self):
+        """Replace the stats file with the current snapshot (no-op without a path)"""
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.snapshot(), f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"✗ Could not write stats file: {e}")
+
+    def render_prometheus(self):
+        snap = self.snapshot()
+        lines = []
+        for name, value in sorted(snap['counters'].items()):
+            lines += [f"# TYPE pi_client_{name}_total counter", f"pi_client_{name}_total {value}"]
+        for name, value in sorted(snap['gauges'].items()):
+            lines += [f"# TYPE pi_client_{name} gauge", f"pi_client_{name} {value}"]
+        with self._lock:
+            timings = {name: (t.count, t.total, t.quantile(0.5), t.quantile(0.99))
+                       for name, t in self._timings.items()}
+        for name, (count, total, p50, p99) in sorted(timings.items()):
+            lines += [f"# TYPE pi_client_{name}_seconds summary",
+                      f"pi_client_{name}_seconds_count {count}",
+                      f"pi_client_{name}_seconds_sum {total}"]
+            for quantile, value in (('0.5', p50), ('0.99', p99)):
+                if value is not None:
+                    lines.append(f'pi_client_{name}_seconds{{quantile="{quantile}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port, host='0.0.0.0'):
+        stats = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body, content_type = stats.render_prometheus().encode(), 'text/plain; version=0.0.4'
+                elif self.path == '/stats':
+                    body, content_type = json.dumps(stats.snapshot()).encode(), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"📈 Stats served on port {self._server.server_address[1]} (/metrics, /stats)")
+
+    def close(self):
+        self.write()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class _Timer:
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stats.observe(self.name, time.perf_counter() - self.started)
+        return False
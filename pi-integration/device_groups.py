@@ -0,0 +1,207 @@
+"""
+Device groups (tents) for the Pi client.
+
+One Pi can drive several tents. Each group has its own relay pin map,
+sensor driver and the plant / deviceGroup it reports as, while the client
+shares one connection pool and one upload queue across all of them.
+
+Groups are described in a JSON file, for example:
+
+    {
+      "api_base": "https://your-app.onrender.com",
+      "groups": [
+        {"name": "tent-1", "device_group": "tent-1", "plant_id": "abc123",
+         "pins": {"light": 18, "fan": 19, "pump": 20},
+         "sensors": {"type": "dht22", "pin": 4}, "camera": true,
+         "rules": [{"device": "fan", "when": "humidity > 70", "hysteresis": 5}]},
+        {"name": "tent-2", "device_group": "tent-2",
+         "pins": {"light": 23, "fan": 24, "pump": 25},
+         "sensors": {"type": "simulated"}}
+      ]
+    }
+
+Add "hal": "simulated" (and optionally "simulation": {"seed": 1, "time_scale": 60})
+to run the same tents against the simulated hardware in hal.py.
+"""
+
+import json
+import threading
+import time
+
+from automation import RuleEngine
+from hal import create_hal, default_hal
+
+DEVICE_LABELS = {
+    'light': "💡 Light",
+    'fan': "🌀 Fan",
+    'pump': "💧 Pump",
+}
+
+
+class DeviceGroup:
+    """Relays, sensors and server identity for one tent"""
+
+    def __init__(self, name, pins, plant_id=None, device_group=None, sensors=None,
+                 camera=False, default=False, report_plant_id=True, rules=None, hal=None):
+        self.name = name
+        self.pins = dict(pins)
+        self.plant_id = plant_id
+        self.device_group = device_group
+        self.camera = camera
+        self.default = default
+        # Readings only reference the plant when the config names one explicitly
+        self.report_plant_id = report_plant_id
+        self.hal = hal or default_hal()
+        self.relays = self.hal.relays(self.pins)
+        self.sensors = self.hal.sensors(sensors, self.relays)
+        self.sampler = None
+        self.device_state = {}
+        self.frame_metrics = None
+        self.automation = RuleEngine(rules) if rules else None
+        # Server-side device ids and autoMode flags, learned from the device list
+        self.device_ids = {}
+        self.auto_mode = {}
+        self.pending_reports = {}
+        self._lock = threading.RLock()
+        self._timer = None
+
+    def setup(self):
+        self.relays.setup()
+
+    def read_sensors(self):
+        """Read sensor values as integers (the server stores integer columns)"""
+        try:
+            reading = self.sensors.read()
+            if reading is None:
+                return None
+            return {key: int(value) for key, value in reading.items()}
+        except Exception as e:
+            print(f"Error reading sensors ({self.name}): {e}")
+            return None
+
+    def sample(self):
+        """Read the sensors and run the local rules on the reading"""
+        reading = self.read_sensors()
+        if reading and self.automation is not None:
+            self.run_automation(reading)
+        return reading
+
+    def tag(self, reading):
+        """Attach the plant / device group this reading belongs to"""
+        if self.report_plant_id and self.plant_id:
+            reading['plantId'] = self.plant_id
+        if self.device_group:
+            reading['deviceGroup'] = self.device_group
+        if self.frame_metrics:
+            # Camera metrics ride along with the first reading after each capture
+            reading.update(self.frame_metrics)
+            self.frame_metrics = None
+        return reading
+
+    def owns(self, device):
+        if self.device_group and device.get('deviceGroup') == self.device_group:
+            return True
+        return bool(self.plant_id and device.get('plantId') == self.plant_id)
+
+    def control(self, device_type, is_on):
+        """Drive one relay; returns False for device types this group has no pin for"""
+        if device_type not in self.pins:
+            return False
+        label = DEVICE_LABELS.get(device_type, device_type)
+        self.relays.set(device_type, is_on)
+        mode = " (simulated)" if self.relays.simulated else ""
+        print(f"{label} [{self.name}]{mode}: {'ON' if is_on else 'OFF'}")
+        return True
+
+    def apply(self, device_type, is_on):
+        """Drive the relay only if its state changed since we last set it"""
+        with self._lock:
+            if self.device_state.get(device_type) == is_on:
+                return False
+            if not self.control(device_type, is_on):
+                return False
+            self.device_state[device_type] = is_on
+            return True
+
+    def automates(self, device_type):
+        """Local rules own a device unless the dashboard has switched its autoMode off"""
+        return (self.automation is not None and device_type in self.automation.devices
+                and self.auto_mode.get(device_type, True))
+
+    def sync(self, device):
+        """Apply one device from the server; rule-driven devices keep their local state"""
+        device_type = device['deviceType']
+        with self._lock:
+            if device.get('id'):
+                self.device_ids[device_type] = device['id']
+            if 'autoMode' in device:
+                self.auto_mode[device_type] = device['autoMode']
+            if self.automates(device_type):
+                return False
+            return self.apply(device_type, device['isOn'])
+
+    def run_automation(self, reading):
+        """Evaluate the rules and drive any outputs they change; pass {} to advance timers only"""
+        with self._lock:
+            desired = self.automation.evaluate(reading, enabled=self.automates)
+            for device_type, is_on in desired.items():
+                if self.apply(device_type, is_on):
+                    self.pending_reports[device_type] = is_on
+            self._schedule_wakeup()
+
+    def _schedule_wakeup(self):
+        """Re-run the rules when a pulse is due to end, however slowly we are sampling"""
+        deadline = self.automation.next_deadline()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if deadline is None:
+            return
+        self._timer = threading.Timer(max(0, deadline - time.monotonic()), self.run_automation, args=({},))
+        self._timer.daemon = True
+        self._timer.start()
+
+    def take_reports(self):
+        """State changes made by local rules since the last call, for reporting upstream"""
+        with self._lock:
+            reports, self.pending_reports = self.pending_reports, {}
+            return reports
+
+    def requeue_report(self, device_type, is_on):
+        with self._lock:
+            self.pending_reports.setdefault(device_type, is_on)
+
+    def stop(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+
+def load_config(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def groups_from_config(config):
+    hal = create_hal(config['hal'], **config.get('simulation', {})) if 'hal' in config else None
+    groups = []
+    for entry in config.get('groups', []):
+        entry = dict(entry)
+        name = entry.pop('name')
+        pins = entry.pop('pins')
+        groups.append(DeviceGroup(name, pins, hal=hal, **entry))
+    if not groups:
+        raise ValueError("Config defines no device groups")
+    if len(groups) == 1:
+        groups[0].default = True
+    return groups
+
+
+def simulated_groups(count, rules=None, seed=None, time_scale=1.0):
+    """`count` simulated tents (device groups sim-1..sim-N) for load testing against a server"""
+    hal = create_hal('simulated', seed=seed, time_scale=time_scale)
+    pins = {'light': 1, 'fan': 2, 'pump': 3}
+    return [DeviceGroup(f"sim-{i}", pins, device_group=f"sim-{i}", hal=hal, rules=rules,
+                        camera=(i == 1), default=(count == 1))
+            for i in range(1, count + 1)]
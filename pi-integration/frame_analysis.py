@@ -0,0 +1,141 @@
+"""
+Cheap per-frame analysis for the Pi camera.
+
+Each capture is decoded at a tiny size (the JPEG decoder downscales for
+free in draft mode) and reduced to a 64-bit difference hash, a 32x24
+grey thumbnail and two numbers: brightness and green-pixel coverage, both
+0-100. `ChangeDetector` compares a new frame against the last one that was
+uploaded and decides whether to upload it in full, as a smaller JPEG, or
+not at all. NumPy is used when installed; the pure-Python path gives the
+same numbers.
+"""
+
+import io
+
+from PIL import Image
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+THUMB_SIZE = (32, 24)
+HASH_SIZE = 8
+
+UPLOAD = 'upload'
+DOWNGRADE = 'downgrade'
+SKIP = 'skip'
+
+
+class Frame:
+    """Hash, grey thumbnail and metrics of one captured JPEG"""
+
+    def __init__(self, dhash, grey, brightness, green_coverage):
+        self.dhash = dhash
+        self.grey = grey
+        self.brightness = brightness
+        self.green_coverage = green_coverage
+
+    def metrics(self):
+        return {'brightness': self.brightness, 'greenCoverage': self.green_coverage}
+
+
+def _open(source):
+    """Open a JPEG given as bytes or as a file path"""
+    return Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+
+def analyze(source):
+    image = _open(source)
+    image.draft('RGB', (THUMB_SIZE[0] * 2, THUMB_SIZE[1] * 2))
+    rgb = image.convert('RGB').resize(THUMB_SIZE, Image.BILINEAR)
+    grey = rgb.convert('L')
+    hash_image = grey.resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR)
+    if HAS_NUMPY:
+        pixels = np.asarray(rgb, dtype=np.int16)
+        r, g, b = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+        green = (g > 40) & (g * 10 > r * 11) & (g * 10 > b * 11)
+        grey_values = np.asarray(grey, dtype=np.float32)
+        brightness = float(grey_values.mean()) * 100 / 255
+        coverage = float(green.mean()) * 100
+        h = np.asarray(hash_image, dtype=np.int16)
+        bits = (h[:, 1:] > h[:, :-1]).flatten()
+        dhash = int(''.join('1' if bit else '0' for bit in bits), 2)
+    else:
+        pixels = list(rgb.getdata())
+        green = sum(1 for r, g, b in pixels if g > 40 and g * 10 > r * 11 and g * 10 > b * 11)
+        grey_values = list(grey.getdata())
+        brightness = sum(grey_values) / len(grey_values) * 100 / 255
+        coverage = green * 100 / len(pixels)
+        h = list(hash_image.getdata())
+        width = HASH_SIZE + 1
+        dhash = 0
+        for row in range(HASH_SIZE):
+            for col in range(HASH_SIZE):
+                dhash = (dhash << 1) | (h[row * width + col + 1] > h[row * width + col])
+    return Frame(dhash, grey_values, int(round(brightness)), int(round(coverage)))
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def mean_abs_diff(a, b):
+    """Mean absolute difference of two grey thumbnails, as a percentage of full scale"""
+    if HAS_NUMPY:
+        return float(np.abs(a - b).mean()) * 100 / 255
+    return sum(abs(x - y) for x, y in zip(a, b)) / len(a) * 100 / 255
+
+
+def downscale(source, max_size=(640, 480), quality=60):
+    """Re-encode a capture smaller for 'nothing much changed' uploads; returns JPEG bytes"""
+    image = _open(source)
+    image.draft('RGB', max_size)
+    image = image.convert('RGB')
+    image.thumbnail(max_size)
+    out = io.BytesIO()
+    image.save(out, format='jpeg', quality=quality)
+    return out.getvalue()
+
+
+class ChangeDetector:
+    """Decides whether a frame differs enough from the last uploaded one to send it.
+
+    A frame is skipped when both its hash distance and pixel difference are
+    below the skip thresholds, downgraded when they are below the full
+    thresholds, and uploaded in full otherwise. After `max_skipped`
+    consecutive skips the next frame is sent anyway, so the server never
+    goes too long without a photo.
+    """
+
+    def __init__(self, skip_hash=4, skip_diff=2.0, full_hash=10, full_diff=6.0, max_skipped=5):
+        self.skip_hash = skip_hash
+        self.skip_diff = skip_diff
+        self.full_hash = full_hash
+        self.full_diff = full_diff
+        self.max_skipped = max_skipped
+        self.reference = None
+        self.skipped = 0
+
+    def check(self, frame):
+        """Return UPLOAD, DOWNGRADE or SKIP; the frame becomes the reference unless skipped"""
+        if self.reference is None:
+            decision = UPLOAD
+        else:
+            distance = hamming(frame.dhash, self.reference.dhash)
+            diff = mean_abs_diff(frame.grey, self.reference.grey)
+            if distance >= self.full_hash or diff >= self.full_diff:
+                decision = UPLOAD
+            elif distance >= self.skip_hash or diff >= self.skip_diff:
+                decision = DOWNGRADE
+            elif self.skipped >= self.max_skipped:
+                decision = DOWNGRADE
+            else:
+                decision = SKIP
+        if decision == SKIP:
+            self.skipped += 1
+        else:
+            self.skipped = 0
+            self.reference = frame
+        return decision
@@ -0,0 +1,332 @@
+"""
+Hardware abstraction for the Pi client: relays, sensors and the camera.
+
+`PiHardware` drives relays through RPi.GPIO, reads the configured sensor
+driver and opens the PiCamera. `SimulatedHardware` needs none of those:
+each tent gets a `SimulatedTent` whose relays feed a small physical model.
+Lights warm the air, and plants under light transpire. The fan pulls
+temperature and humidity back toward ambient. The pump wets the soil,
+which dries out over time. On top of that the sensors drift and read
+with noise.
+
+The model runs on an injectable clock with a seeded random generator, so
+a run is reproducible, and `time_scale` lets a load test cover a day of
+tent behaviour in minutes. Pick the backend with HAL_BACKEND
+("auto", "pi" or "simulated") or "hal" in the device group config.
+"""
+
+import io
+import math
+import os
+import random
+import threading
+import time
+
+DEFAULT_HAL = os.getenv('HAL_BACKEND', 'auto')
+
+
+class SimulatedSensors:
+    """Fixed readings - replace with your actual sensor code"""
+
+    def __init__(self, temperature=22, humidity=65, soil_moisture=45, **_):
+        self.values = {
+            "temperature": temperature,
+            "humidity": humidity,
+            "soilMoisture": soil_moisture,
+        }
+
+    def read(self):
+        return dict(self.values)
+
+
+class Dht22Sensors:
+    """DHT22 temperature/humidity on a GPIO pin; soil moisture stays simulated"""
+
+    def __init__(self, pin=4, soil_moisture=45, **_):
+        import adafruit_dht
+        import board
+        self._dht = adafruit_dht.DHT22(getattr(board, f"D{pin}"))
+        self.soil_moisture = soil_moisture
+
+    def read(self):
+        temperature = self._dht.temperature
+        humidity = self._dht.humidity
+        if temperature is None or humidity is None:
+            return None
+        return {
+            "temperature": temperature,
+            "humidity": humidity,
+            "soilMoisture": self.soil_moisture,
+        }
+
+
+SENSOR_DRIVERS = {
+    'simulated': SimulatedSensors,
+    'dht22': Dht22Sensors,
+}
+
+
+def create_sensors(config):
+    config = dict(config or {'type': 'simulated'})
+    kind = config.pop('type', 'simulated')
+    try:
+        return SENSOR_DRIVERS[kind](**config)
+    except KeyError:
+        raise ValueError(f"Unknown sensor type '{kind}'")
+
+
+# ----------------------------------------------------------------------
+# Real hardware
+# ----------------------------------------------------------------------
+class GpioRelays:
+    """Relay outputs on RPi.GPIO pins"""
+
+    simulated = False
+
+    def __init__(self, gpio, pins):
+        self._gpio = gpio
+        self.pins = dict(pins)
+
+    def setup(self):
+        for pin in self.pins.values():
+            self._gpio.setup(pin, self._gpio.OUT)
+
+    def set(self, device_type, is_on):
+        self._gpio.output(self.pins[device_type], is_on)
+
+
+class PiHardware:
+    """RPi.GPIO relays, configured sensor drivers and the PiCamera"""
+
+    name = 'pi'
+
+    def __init__(self):
+        import RPi.GPIO as GPIO
+        self._gpio = GPIO
+
+    def setup(self):
+        self._gpio.setmode(self._gpio.BCM)
+
+    def relays(self, pins):
+        return GpioRelays(self._gpio, pins)
+
+    def sensors(self, config, relays):
+        return create_sensors(config)
+
+    def camera(self, relays=None):
+        from picamera import PiCamera
+        camera = PiCamera()
+        time.sleep(2)  # Camera warm-up, paid once per process
+        return camera
+
+    def cleanup(self):
+        self._gpio.cleanup()
+
+
+# ----------------------------------------------------------------------
+# Simulation
+# ----------------------------------------------------------------------
+class ManualClock:
+    """A clock that only moves when told to, for deterministic runs"""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class SimulatedTent:
+    """Relays and sensors of one simulated tent, coupled by a first-order model.
+
+    Each quantity relaxes exponentially toward a target that depends on the
+    relay states; the time constants (seconds) are rough figures for a small
+    grow tent. `read()` advances the model to the current clock time.
+    """
+
+    simulated = True
+
+    HEAT_TAU = 900           # light on: air warms toward ambient + LIGHT_HEAT
+    VENT_TAU = 120           # fan on: air relaxes to ambient this quickly...
+    LEAK_TAU = 1800          # ...and this slowly with the fan off
+    TRANSPIRATION_TAU = 1200
+    LIGHT_HEAT = 7.0
+    FAN_HEAT_SHARE = 0.3     # share of the lamp's heat the fan cannot remove
+    TRANSPIRATION_HUMIDITY = 85.0
+    PUMP_RATE = 0.5          # soil moisture points per second of pumping
+    DRY_RATE = 2.0 / 3600    # points per second, doubled under light
+
+    def __init__(self, pins, temperature=None, humidity=None, soil_moisture=45,
+                 ambient_temperature=21.0, ambient_humidity=50.0,
+                 drift=0.02, noise=0.2, clock=time.monotonic, time_scale=1.0, rng=None, **_):
+        self.pins = dict(pins)
+        self.relay_state = {device: False for device in self.pins}
+        self.ambient_temperature = ambient_temperature
+        self.ambient_humidity = ambient_humidity
+        self.temperature = ambient_temperature if temperature is None else float(temperature)
+        self.humidity = ambient_humidity if humidity is None else float(humidity)
+        self.soil_moisture = float(soil_moisture)
+        self.drift = drift
+        self.noise = noise
+        self.clock = clock
+        self.time_scale = time_scale
+        self.rng = rng or random.Random()
+        self.offsets = {'temperature': 0.0, 'humidity': 0.0, 'soilMoisture': 0.0}
+        self.switches = 0
+        self._lock = threading.Lock()
+        self._last = clock()
+
+    # Relay interface
+    def setup(self):
+        pass
+
+    def set(self, device_type, is_on):
+        with self._lock:
+            self._advance()
+            if self.relay_state.get(device_type) != is_on:
+                self.switches += 1
+            self.relay_state[device_type] = is_on
+
+    # Sensor interface
+    def read(self):
+        with self._lock:
+            self._advance()
+            true_values = {
+                'temperature': self.temperature,
+                'humidity': self.humidity,
+                'soilMoisture': self.soil_moisture,
+            }
+            return {key: value + self.offsets[key] + self.rng.gauss(0, self.noise)
+                    for key, value in true_values.items()}
+
+    def _advance(self):
+        now = self.clock()
+        dt = (now - self._last) * self.time_scale
+        self._last = now
+        if dt <= 0:
+            return
+        light = self.relay_state.get('light', False)
+        fan = self.relay_state.get('fan', False)
+        pump = self.relay_state.get('pump', False)
+
+        vent_tau = self.VENT_TAU if fan else self.LEAK_TAU
+        temperature_target = self.ambient_temperature
+        if light:
+            temperature_target += self.LIGHT_HEAT * (self.FAN_HEAT_SHARE if fan else 1)
+        temperature_tau = self.HEAT_TAU if light and not fan else vent_tau
+        self.temperature = _relax(self.temperature, temperature_target, dt, temperature_tau)
+
+        humidity_target = self.ambient_humidity
+        humidity_tau = vent_tau
+        if light and not fan:
+            humidity_target, humidity_tau = self.TRANSPIRATION_HUMIDITY, self.TRANSPIRATION_TAU
+        self.humidity = _relax(self.humidity, humidity_target, dt, humidity_tau)
+
+        moisture = self.soil_moisture - self.DRY_RATE * (2 if light else 1) * dt
+        if pump:
+            moisture += self.PUMP_RATE * dt
+        self.soil_moisture = min(100.0, max(0.0, moisture))
+
+        # Sensor calibration wanders as a random walk
+        spread = self.drift * math.sqrt(dt / 60)
+        for key in self.offsets:
+            self.offsets[key] += self.rng.gauss(0, spread)
+
+
+def _relax(value, target, dt, tau):
+    return target + (value - target) * math.exp(-dt / tau)
+
+
+class SimulatedCamera:
+    """Writes synthetic JPEGs whose brightness follows the light relay of its tent"""
+
+    def __init__(self, tent=None, resolution=(640, 480)):
+        self.tent = tent
+        self.resolution = resolution
+        self.frames = 0
+
+    def capture(self, output, format='jpeg'):
+        from PIL import Image, ImageDraw
+        self.frames += 1
+        lit = self.tent is None or self.tent.relay_state.get('light', False)
+        scale = 1.0 if lit else 0.15
+        width, height = self.resolution
+        image = Image.new('RGB', self.resolution, tuple(int(c * scale) for c in (60, 45, 30)))
+        radius = min(width, height) // 8 + self.frames % (min(width, height) // 4)
+        ImageDraw.Draw(image).ellipse(
+            (width // 2 - radius, height // 2 - radius, width // 2 + radius, height // 2 + radius),
+            fill=tuple(int(c * scale) for c in (50, 170, 60))
+        )
+        if isinstance(output, str):
+            image.save(output, format='JPEG', quality=80)
+        else:
+            buffer = io.BytesIO()
+            image.save(buffer, format='JPEG', quality=80)
+            output.write(buffer.getvalue())
+
+    def close(self):
+        pass
+
+
+class SimulatedHardware:
+    """One SimulatedTent per device group, all on a shared clock and seed"""
+
+    name = 'simulated'
+
+    def __init__(self, seed=None, clock=time.monotonic, time_scale=1.0, **tent_defaults):
+        self.clock = clock
+        self.time_scale = time_scale
+        self.rng = random.Random(seed)
+        self.tent_defaults = tent_defaults
+        self.tents = []
+
+    def setup(self):
+        pass
+
+    def relays(self, pins):
+        tent = SimulatedTent(pins, clock=self.clock, time_scale=self.time_scale,
+                             rng=random.Random(self.rng.random()), **self.tent_defaults)
+        self.tents.append(tent)
+        return tent
+
+    def sensors(self, config, relays):
+        # Starting values come from the sensor config, e.g. {"type": "dht22", "soil_moisture": 30}
+        for key, value in (config or {}).items():
+            if key in ('temperature', 'humidity', 'soil_moisture'):
+                setattr(relays, key, float(value))
+        return relays
+
+    def camera(self, relays=None):
+        return SimulatedCamera(relays)
+
+    def cleanup(self):
+        pass
+
+
+def create_hal(name=DEFAULT_HAL, **options):
+    """'pi', 'simulated', or 'auto' (the Pi if RPi.GPIO imports, else the simulation)"""
+    if name == 'pi':
+        return PiHardware()
+    if name == 'simulated':
+        return SimulatedHardware(**options)
+    if name == 'auto':
+        try:
+            return PiHardware()
+        except ImportError:
+            print("Warning: RPi.GPIO not available. Running in simulation mode.")
+            return SimulatedHardware(**options)
+    raise ValueError(f"Unknown hardware backend '{name}'")
+
+
+_default_hal = None
+
+
+def default_hal():
+    """The process-wide HAL used by groups that are not given one"""
+    global _default_hal
+    if _default_hal is None:
+        _default_hal = create_hal()
+    return _default_hal
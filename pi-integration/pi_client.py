@@ -4,16 +4,22 @@ Raspberry Pi Client for Smart Plant Monitoring System
 This script runs on your Pi and connects to the web-based monitoring system.
 """
 
+import argparse
+import asyncio
 import requests
+from requests.adapters import HTTPAdapter
 import time
 import json
+import os
+import socket
+import threading
 from datetime import datetime
-try:
-    import RPi.GPIO as GPIO
-    HAS_GPIO = True
-except ImportError:
-    print("Warning: RPi.GPIO not available. Running in simulation mode.")
-    HAS_GPIO = False
+from reading_buffer import ReadingBuffer
+from sampler import SensorSampler
+from chunked_upload import ChunkedUploader, UploadNotSupported
+from client_stats import ClientStats
+from wire_format import DEVICES_TYPE, decode_devices
+from device_groups import DeviceGroup, groups_from_config, load_config, simulated_groups
 
 # Configuration
 API_BASE = "https://your-app.replit.app"  # Replace with your Replit app URL
@@ -25,115 +31,320 @@ FAN_PIN = 19
 PUMP_PIN = 20
 TEMP_SENSOR_PIN = 4
 
+# Offline buffering of sensor readings
+CLIENT_ID = socket.gethostname()  # Identifies this Pi so the server can de-duplicate replays
+# Buffer, photo spool and stats live outside the source checkout
+DATA_DIR = os.getenv('PI_CLIENT_DATA_DIR', os.path.expanduser("~/.local/share/plant-monitor"))
+BUFFER_FILE = os.path.join(DATA_DIR, "reading_buffer.db")
+BUFFER_MEMORY_CAP = 500      # readings kept in RAM before spilling to disk
+BUFFER_DISK_CAP = 100000     # readings kept on disk while offline (oldest dropped first)
+UPLOAD_BATCH_SIZE = 500
+
+# On-device sampling: read sensors this many times per second and upload only
+# per-window aggregates (min/max/mean/stddev/median-filtered). 0 = one reading per cycle.
+SAMPLE_RATE_HZ = 0
+
+# Device sync: "longpoll" reacts to dashboard changes in well under a second and
+# falls back to "poll" (conditional GET every DEVICE_INTERVAL) on servers without it
+DEVICE_SYNC = "longpoll"
+LONGPOLL_TIMEOUT = 25
+
+# Wire format: "auto" switches sensor uploads and device syncs to a compact binary
+# encoding (wire_format.py, a fraction of the JSON size) on servers that support it;
+# "json" always sends and asks for plain JSON
+WIRE_FORMAT = "auto"
+
+# Local automation rules for the default group, evaluated on every sensor sample even
+# while the server is unreachable. Examples:
+#   {"device": "fan", "when": "humidity > 70", "hysteresis": 5}
+#   {"device": "pump", "when": "soilMoisture < 30", "pulse_seconds": 5, "max_per_hour": 4}
+AUTOMATION_RULES = []
+
+# Compare each photo with the last one uploaded and skip (or send a smaller JPEG for)
+# near-identical frames, e.g. at night. Needs Pillow; brightness and green coverage of
+# every frame are reported with the next sensor reading.
+PHOTO_CHANGE_DETECTION = True
+
+# Photos are captured to PHOTO_SPOOL_DIR and uploaded in resumable chunks, so memory use
+# stays at one chunk and a dropped connection continues where it stopped. Servers without
+# /api/photos/uploads get a single multipart POST instead.
+PHOTO_SPOOL_DIR = os.path.join(DATA_DIR, "photo_spool")
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+# Cycle timings, upload counts and failures are written to STATS_FILE after every cycle
+# (None = off). Set STATS_PORT to also serve them: Prometheus text on /metrics, JSON on /stats.
+STATS_FILE = os.path.join(DATA_DIR, "client_stats.json")
+STATS_PORT = 0
+
+# Schedules (seconds)
+SENSOR_INTERVAL = 30
+DEVICE_INTERVAL = 30
+PHOTO_INTERVAL = 3600
+
+def legacy_group():
+    """The single tent described by the constants above (used when no --config is given)"""
+    return DeviceGroup(
+        "default",
+        {'light': LIGHT_PIN, 'fan': FAN_PIN, 'pump': PUMP_PIN},
+        plant_id=PLANT_ID,
+        sensors={'type': 'simulated', 'pin': TEMP_SENSOR_PIN},
+        camera=True,
+        default=True,
+        # PLANT_ID is a placeholder until edited; don't attach it to readings
+        report_plant_id=False,
+        rules=AUTOMATION_RULES,
+    )
+
 class PiPlantMonitor:
-    def __init__(self):
-        if HAS_GPIO:
-            GPIO.setmode(GPIO.BCM)
-            GPIO.setup(LIGHT_PIN, GPIO.OUT)
-            GPIO.setup(FAN_PIN, GPIO.OUT) 
-            GPIO.setup(PUMP_PIN, GPIO.OUT)
-            print("GPIO initialized")
-        else:
+    def __init__(self, groups=None, api_base=API_BASE, client_id=CLIENT_ID):
+        self.api_base = api_base.rstrip('/')
+        self.groups = groups or [legacy_group()]
+        # Devices that name no group go to the default group (if any); the legacy
+        # single-tent helpers below act on it, or on the first group
+        self.default_group = next((g for g in self.groups if g.default), None)
+        self.primary_group = self.default_group or self.groups[0]
+        self.camera_group = next((g for g in self.groups if g.camera), self.groups[0])
+        self.camera = None
+        self.change_detector = None
+        # One keep-alive connection pool shared by every request this client makes
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # All groups share one upload queue, so their readings go out in the same batches
+        os.makedirs(os.path.dirname(BUFFER_FILE), exist_ok=True)
+        self.buffer = ReadingBuffer(BUFFER_FILE, client_id, memory_cap=BUFFER_MEMORY_CAP,
+                                    disk_cap=BUFFER_DISK_CAP, wire_format=WIRE_FORMAT)
+        self.uploader = ChunkedUploader(self.session, self.api_base, PHOTO_SPOOL_DIR,
+                                        chunk_size=UPLOAD_CHUNK_SIZE)
+        self.chunked_uploads = True
+        self.device_etag = None
+        self.stats = ClientStats(STATS_FILE, port=STATS_PORT)
+        self.longpoll_supported = DEVICE_SYNC == "longpoll"
+        if SAMPLE_RATE_HZ > 0:
+            for group in self.groups:
+                group.sampler = SensorSampler(group.sample, rate_hz=SAMPLE_RATE_HZ,
+                                              window_seconds=SENSOR_INTERVAL)
+                group.sampler.start()
+            print(f"Sampling sensors at {SAMPLE_RATE_HZ} Hz")
+        # Groups usually share one HAL; set each backend up once
+        self.hals = list({id(group.hal): group.hal for group in self.groups}.values())
+        for hal in self.hals:
+            hal.setup()
+        for group in self.groups:
+            group.setup()
+        if all(hal.name == 'simulated' for hal in self.hals):
             print("Running in simulation mode - no actual GPIO control")
+        else:
+            print("GPIO initialized")
     
     def read_sensors(self):
-        """Read sensor values - replace with your actual sensor code"""
-        try:
-            # Simulate sensor readings or replace with actual sensor code
-            # Example for DHT22 temperature/humidity sensor:
-            # import Adafruit_DHT
-            # humidity, temperature = Adafruit_DHT.read_retry(Adafruit_DHT.DHT22, TEMP_SENSOR_PIN)
-            
-            # For now, return simulated values
-            temperature = 22  # Replace with actual reading
-            humidity = 65     # Replace with actual reading
-            soil_moisture = 45  # Replace with actual reading
-            
-            return {
-                "temperature": int(temperature),
-                "humidity": int(humidity),
-                "soilMoisture": int(soil_moisture)
-            }
-        except Exception as e:
-            print(f"Error reading sensors: {e}")
-            return None
+        """Read sensor values from the primary group"""
+        return self.primary_group.read_sensors()
+    
+    def collect_sensor_data(self, group=None):
+        """One reading per upload: the window aggregate when sampling, else a single read"""
+        group = group or self.primary_group
+        if group.sampler is None:
+            sensor_data = group.sample()
+        else:
+            stats = group.sampler.aggregate()
+            if not stats:
+                return None
+            sensor_data = {channel: int(round(s['filtered'])) for channel, s in stats.items()}
+            sensor_data['stats'] = stats
+        return group.tag(sensor_data) if sensor_data else None
+    
+    def collect_all_sensor_data(self):
+        """One reading from every group, ready to upload together"""
+        readings = []
+        for group in self.groups:
+            sensor_data = self.collect_sensor_data(group)
+            if sensor_data:
+                readings.append(sensor_data)
+        return readings
     
     def send_sensor_data(self, sensor_data):
-        """Send sensor data to web app"""
+        """Buffer one reading (or a list of them) and upload everything pending in compressed batches"""
+        readings = sensor_data if isinstance(sensor_data, list) else [sensor_data]
+        for reading in readings:
+            self.buffer.append(reading)
         try:
-            response = requests.post(
-                f"{API_BASE}/api/sensor-data",
-                json=sensor_data,
-                timeout=10
-            )
-            if response.status_code == 201:
-                print(f"✓ Sensor data sent: {sensor_data}")
-                return True
-            else:
-                print(f"✗ Failed to send sensor data: {response.status_code}")
-                return False
+            with self.stats.timer('sensor_upload'):
+                sent = self.buffer.flush(self.session, f"{self.api_base}/api/sensor-data/bulk",
+                                         batch_size=UPLOAD_BATCH_SIZE)
+            self.stats.incr('readings_uploaded', sent)
+            print(f"✓ Sensor data sent: {len(readings)} groups ({sent} readings uploaded)")
+            return True
         except Exception as e:
-            print(f"✗ Error sending sensor data: {e}")
+            self.stats.incr('sensor_upload_failures')
+            print(f"✗ Error sending sensor data, {len(self.buffer)} readings buffered: {e}")
             return False
+        finally:
+            self.stats.set('buffered_readings', len(self.buffer))
+            self.stats.set('sensor_upload_bytes', self.buffer.bytes_sent)
+    
+    def get_camera(self):
+        """Open the Pi camera once and keep it warm between captures"""
+        if self.camera is None:
+            self.camera = self.camera_group.hal.camera(self.camera_group.relays)
+            print("Camera initialized")
+        return self.camera
+    
+    def screen_photo(self, path):
+        """Run change detection on a spooled capture (shrinking it in place if asked); returns the decision"""
+        if not PHOTO_CHANGE_DETECTION:
+            return 'upload'
+        try:
+            import frame_analysis
+        except ImportError:
+            return 'upload'
+        frame = frame_analysis.analyze(path)
+        self.camera_group.frame_metrics = frame.metrics()
+        if self.change_detector is None:
+            self.change_detector = frame_analysis.ChangeDetector()
+        decision = self.change_detector.check(frame)
+        if decision == frame_analysis.DOWNGRADE:
+            smaller = frame_analysis.downscale(path)
+            with open(path, 'wb') as f:
+                f.write(smaller)
+        return decision
     
     def capture_photo(self):
-        """Capture photo using Pi camera and upload"""
+        """Capture a photo to the spool and upload it if the scene changed"""
         try:
-            from picamera import PiCamera
-            import io
-            
-            camera = PiCamera()
-            stream = io.BytesIO()
-            
-            # Capture image
-            camera.capture(stream, format='jpeg')
-            stream.seek(0)
+            camera = self.get_camera()
+            os.makedirs(PHOTO_SPOOL_DIR, exist_ok=True)
+            path = os.path.join(PHOTO_SPOOL_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg")
             
-            # Upload to web app
-            files = {'photo': ('plant_photo.jpg', stream, 'image/jpeg')}
-            data = {'plantId': PLANT_ID}
-            
-            response = requests.post(
-                f"{API_BASE}/api/photos",
-                files=files,
-                data=data,
-                timeout=30
-            )
-            
-            camera.close()
-            
-            if response.status_code == 201:
-                print("✓ Photo uploaded successfully")
+            # Capture straight to disk; the image is never held in memory as a whole
+            with self.stats.timer('photo_capture'):
+                camera.capture(path, format='jpeg')
+            decision = self.screen_photo(path)
+            if decision == 'skip':
+                os.remove(path)
+                self.stats.incr('photos_skipped')
+                print("⏭ Photo skipped: no visible change since the last upload")
                 return True
-            else:
-                print(f"✗ Failed to upload photo: {response.status_code}")
-                return False
+            
+            self.uploader.enqueue(path, self.camera_group.plant_id)
+            print(f"📸 Photo captured ({decision}, {os.path.getsize(path) // 1024} KB)")
+            return self.upload_photos()
                 
         except ImportError:
             print("Warning: PiCamera not available")
             return False
         except Exception as e:
+            self.stats.incr('photo_capture_failures')
             print(f"✗ Error capturing photo: {e}")
             return False
     
+    def upload_photos(self):
+        """Upload every spooled photo, resuming any upload that was interrupted earlier"""
+        with self.stats.timer('photo_upload'):
+            ok = self._upload_photos()
+        if not ok:
+            self.stats.incr('photo_upload_failures')
+        return ok
+    
+    def _upload_photos(self):
+        if self.chunked_uploads:
+            try:
+                done = self.uploader.resume_pending()
+                print(f"✓ Photo uploaded successfully ({done} sent)")
+                return True
+            except UploadNotSupported:
+                print("Server has no resumable upload endpoint, using single-request uploads")
+                self.chunked_uploads = False
+            except Exception as e:
+                print(f"✗ Photo upload interrupted, will resume next time: {e}")
+                return False
+        
+        for state in self.uploader.pending():
+            try:
+                with open(state['path'], 'rb') as photo:
+                    response = self.session.post(
+                        f"{self.api_base}/api/photos",
+                        files={'photo': ('plant_photo.jpg', photo, 'image/jpeg')},
+                        data={'plantId': state['plantId']},
+                        timeout=30
+                    )
+            except Exception as e:
+                print(f"✗ Error uploading photo: {e}")
+                return False
+            if response.status_code != 201:
+                print(f"✗ Failed to upload photo: {response.status_code}")
+                return False
+            self.uploader.discard(state)
+            print("✓ Photo uploaded successfully")
+        return True
+    
+    def group_for(self, device):
+        """The group a server device belongs to: by deviceGroup, then plantId, else the default group"""
+        for group in self.groups:
+            if group.owns(device):
+                return group
+        return self.default_group
+    
+    def apply_device_states(self, devices):
+        """Drive only the outputs whose state differs from what we last set"""
+        changed = 0
+        for device in devices:
+            group = self.group_for(device)
+            if group is not None and group.sync(device):
+                changed += 1
+        return changed
+    
+    def report_automation_changes(self):
+        """Tell the server about outputs the local rules switched; retried next cycle if offline"""
+        for group in self.groups:
+            for device_type, is_on in group.take_reports().items():
+                device_id = group.device_ids.get(device_type)
+                if device_id is None:
+                    # Not yet seen in the server's device list
+                    group.requeue_report(device_type, is_on)
+                    continue
+                try:
+                    response = self.session.put(f"{self.api_base}/api/devices/{device_id}",
+                                                json={'isOn': is_on}, timeout=10)
+                    response.raise_for_status()
+                    print(f"✓ Reported {device_type} [{group.name}]: {'ON' if is_on else 'OFF'}")
+                except Exception as e:
+                    group.requeue_report(device_type, is_on)
+                    self.stats.incr('automation_report_failures')
+                    print(f"✗ Error reporting {device_type} [{group.name}]: {e}")
+    
     def get_device_states(self):
-        """Get device states from web app and control hardware"""
+        """Get device states from web app (conditional GET) and control hardware"""
+        with self.stats.timer('device_sync'):
+            ok = self._get_device_states()
+        if not ok:
+            self.stats.incr('device_sync_failures')
+        return ok
+    
+    def _device_headers(self):
+        headers = {'If-None-Match': self.device_etag} if self.device_etag else {}
+        if WIRE_FORMAT == "auto":
+            headers['Accept'] = f"{DEVICES_TYPE}, application/json;q=0.5"
+        return headers
+    
+    def _apply_device_response(self, response):
+        """Apply a 200 device response: a full JSON list, or compact devices changed since our ETag"""
+        self.device_etag = response.headers.get('ETag')
+        self.stats.incr('device_sync_bytes', len(response.content))
+        if response.headers.get('Content-Type', '').startswith(DEVICES_TYPE):
+            devices = decode_devices(response.content)['devices']
+        else:
+            devices = response.json()
+        self.apply_device_states(devices)
+    
+    def _get_device_states(self):
         try:
-            response = requests.get(f"{API_BASE}/api/devices", timeout=10)
+            response = self.session.get(f"{self.api_base}/api/devices", headers=self._device_headers(), timeout=10)
+            if response.status_code == 304:
+                return True
             if response.status_code == 200:
-                devices = response.json()
-                
-                for device in devices:
-                    device_type = device['deviceType']
-                    is_on = device['isOn']
-                    
-                    if device_type == 'light':
-                        self.control_light(is_on)
-                    elif device_type == 'fan':
-                        self.control_fan(is_on)
-                    elif device_type == 'pump':
-                        self.control_pump(is_on)
-                
+                self._apply_device_response(response)
                 return True
             else:
                 print(f"✗ Failed to get device states: {response.status_code}")
@@ -143,62 +354,202 @@ class PiPlantMonitor:
             print(f"✗ Error getting device states: {e}")
             return False
     
+    def watch_device_states(self, timeout=LONGPOLL_TIMEOUT):
+        """Block until the server reports a device change (or timeout) and apply it.
+
+        Returns False when the server has no long-poll endpoint, so callers
+        can fall back to polling.
+        """
+        response = self.session.get(
+            f"{self.api_base}/api/devices/watch",
+            params={'timeout': timeout},
+            headers=self._device_headers(),
+            timeout=(10, timeout + 10)
+        )
+        if response.status_code == 404:
+            print("Server has no /api/devices/watch, falling back to polling")
+            self.longpoll_supported = False
+            return False
+        if response.status_code == 200:
+            self._apply_device_response(response)
+        elif response.status_code != 304:
+            response.raise_for_status()
+        return True
+    
+    def device_watch_loop(self, stop_event):
+        """Long-poll loop for a background thread; exits on stop or if unsupported"""
+        backoff = 1
+        while not stop_event.is_set() and self.longpoll_supported:
+            try:
+                self.watch_device_states()
+                backoff = 1
+            except Exception as e:
+                self.stats.incr('device_watch_errors')
+                print(f"✗ Device watch error: {e}")
+                stop_event.wait(backoff)
+                backoff = min(backoff * 2, DEVICE_INTERVAL)
+    
     def control_light(self, is_on):
         """Control grow light"""
-        if HAS_GPIO:
-            GPIO.output(LIGHT_PIN, is_on)
-            print(f"💡 Light: {'ON' if is_on else 'OFF'}")
-        else:
-            print(f"💡 Light (simulated): {'ON' if is_on else 'OFF'}")
+        self.primary_group.control('light', is_on)
     
     def control_fan(self, is_on):
         """Control ventilation fan"""
-        if HAS_GPIO:
-            GPIO.output(FAN_PIN, is_on)
-            print(f"🌀 Fan: {'ON' if is_on else 'OFF'}")
-        else:
-            print(f"🌀 Fan (simulated): {'ON' if is_on else 'OFF'}")
+        self.primary_group.control('fan', is_on)
     
     def control_pump(self, is_on):
         """Control water pump"""
-        if HAS_GPIO:
-            GPIO.output(PUMP_PIN, is_on)
-            print(f"💧 Pump: {'ON' if is_on else 'OFF'}")
-        else:
-            print(f"💧 Pump (simulated): {'ON' if is_on else 'OFF'}")
+        self.primary_group.control('pump', is_on)
     
     def run_monitoring_cycle(self):
         """Run one complete monitoring cycle"""
         print(f"\n--- Monitoring Cycle {datetime.now().strftime('%H:%M:%S')} ---")
         
-        # Read and send sensor data
-        sensor_data = self.read_sensors()
-        if sensor_data:
-            self.send_sensor_data(sensor_data)
-        
-        # Check device states and control hardware
-        self.get_device_states()
+        with self.stats.timer('cycle'):
+            # Read every group's sensors and send them in one upload
+            readings = self.collect_all_sensor_data()
+            if readings:
+                self.send_sensor_data(readings)
+            self.report_automation_changes()
+            
+            # Check device states and control hardware (the long-poll thread does this when active)
+            if not self.longpoll_supported:
+                self.get_device_states()
+        self.stats.write()
         
         print("--- Cycle Complete ---")
     
     def cleanup(self):
-        """Cleanup GPIO on exit"""
-        if HAS_GPIO:
-            GPIO.cleanup()
-            print("GPIO cleaned up")
+        """Cleanup GPIO, camera and connections on exit"""
+        for group in self.groups:
+            if group.sampler is not None:
+                group.sampler.stop()
+            group.stop()
+        self.session.close()
+        self.buffer.close()
+        if self.camera is not None:
+            self.camera.close()
+            self.camera = None
+        for hal in self.hals:
+            hal.cleanup()
+        self.stats.close()
+        print("Hardware cleaned up")
+
+class AsyncMonitorRunner:
+    """Runs sensor upload, device sync and photo upload as independent asyncio tasks.
+
+    Each blocking call runs in a worker thread over the monitor's shared
+    session, so a slow photo upload never delays relay control or sensor
+    reporting.
+    """
+
+    def __init__(self, monitor, sensor_interval=SENSOR_INTERVAL,
+                 device_interval=DEVICE_INTERVAL, photo_interval=PHOTO_INTERVAL):
+        self.monitor = monitor
+        self.sensor_interval = sensor_interval
+        self.device_interval = device_interval
+        self.photo_interval = photo_interval
+
+    async def sensor_cycle(self):
+        readings = await asyncio.to_thread(self.monitor.collect_all_sensor_data)
+        if readings:
+            await asyncio.to_thread(self.monitor.send_sensor_data, readings)
+        await asyncio.to_thread(self.monitor.report_automation_changes)
+
+    async def device_cycle(self):
+        await asyncio.to_thread(self.monitor.get_device_states)
+
+    async def device_watch(self):
+        """Long-poll for device changes back to back; falls back to polling if unsupported"""
+        backoff = 1
+        while self.monitor.longpoll_supported:
+            try:
+                await asyncio.to_thread(self.monitor.watch_device_states)
+                backoff = 1
+            except Exception as e:
+                self.monitor.stats.incr('device_watch_errors')
+                print(f"✗ Device watch error: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.device_interval)
+        await self._every(self.device_interval, self.device_cycle, "device")
+
+    async def photo_cycle(self):
+        await asyncio.to_thread(self.monitor.capture_photo)
+
+    async def _every(self, interval, cycle, name, initial_delay=0):
+        """Run `cycle` on a fixed schedule; a slow run delays only its own task"""
+        loop = asyncio.get_running_loop()
+        next_run = loop.time() + initial_delay
+        while True:
+            delay = next_run - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            started = loop.time()
+            try:
+                await cycle()
+            except Exception as e:
+                self.monitor.stats.incr(f"{name}_task_errors")
+                print(f"✗ {name} task error: {e}")
+            self.monitor.stats.observe(f"{name}_task", loop.time() - started)
+            await asyncio.to_thread(self.monitor.stats.write)
+            next_run = max(next_run + interval, loop.time())
+
+    async def run(self):
+        await asyncio.gather(
+            self._every(self.sensor_interval, self.sensor_cycle, "sensor"),
+            self.device_watch(),
+            self._every(self.photo_interval, self.photo_cycle, "photo", initial_delay=self.photo_interval),
+        )
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pi Plant Monitor client")
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help="run sensor, device and photo tasks concurrently with asyncio")
+    parser.add_argument('--config', metavar='PATH',
+                        help="JSON file describing the device groups (tents) this Pi drives")
+    parser.add_argument('--simulate', type=int, metavar='N',
+                        help="drive N simulated tents instead of real hardware (load testing)")
+    parser.add_argument('--time-scale', type=float, default=1.0,
+                        help="simulated seconds per real second with --simulate")
+    return parser.parse_args()
 
 def main():
     """Main monitoring loop"""
-    monitor = PiPlantMonitor()
+    args = parse_args()
+    if args.config:
+        config = load_config(args.config)
+        monitor = PiPlantMonitor(groups_from_config(config),
+                                 api_base=config.get('api_base', API_BASE),
+                                 client_id=config.get('client_id', CLIENT_ID))
+    elif args.simulate:
+        monitor = PiPlantMonitor(simulated_groups(args.simulate, rules=AUTOMATION_RULES,
+                                                  time_scale=args.time_scale))
+    else:
+        monitor = PiPlantMonitor()
     
     print("🌱 Starting Pi Plant Monitor")
-    print(f"🔗 Connected to: {API_BASE}")
-    print(f"🆔 Plant ID: {PLANT_ID}")
+    print(f"🔗 Connected to: {monitor.api_base}")
+    for group in monitor.groups:
+        print(f"🆔 {group.name}: plant {group.plant_id or '-'}, device group {group.device_group or '-'}")
     print("📊 Monitoring every 30 seconds...")
     print("📸 Photos every hour (if camera available)")
     print("Press Ctrl+C to stop\n")
     
+    if args.use_async:
+        print("⚡ Async mode: sensor, device and photo tasks run independently")
+        try:
+            asyncio.run(AsyncMonitorRunner(monitor).run())
+        except KeyboardInterrupt:
+            print("\n🛑 Stopping Pi Plant Monitor...")
+        finally:
+            monitor.cleanup()
+        return
+    
     photo_counter = 0
+    stop_event = threading.Event()
+    if monitor.longpoll_supported:
+        threading.Thread(target=monitor.device_watch_loop, args=(stop_event,), daemon=True).start()
+        print("⚡ Device changes are applied as soon as the server reports them")
     
     try:
         while True:
@@ -218,6 +569,7 @@ def main():
     except Exception as e:
         print(f"❌ Unexpected error: {e}")
     finally:
+        stop_event.set()
         monitor.cleanup()
 
 if __name__ == "__main__":
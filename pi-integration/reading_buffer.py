@@ -0,0 +1,196 @@
+"""
+Offline buffer for sensor readings.
+
+Readings are numbered with a per-client sequence number and held in memory
+until they are uploaded. If an upload fails, or more than `memory_cap`
+readings pile up, they spill into a small SQLite file capped at `disk_cap`
+rows (oldest dropped first), so nothing is lost across Wi-Fi outages or
+restarts. Batches go out gzip-compressed to /api/sensor-data/bulk; the
+server de-duplicates on (sourceId, seq), so replaying a batch is harmless.
+
+With wire_format='auto' batches start out as JSON and switch to the compact
+binary format (wire_format.py) once the server lists it in `Accept-Post`;
+a 415 switches back to JSON and resends the batch.
+"""
+
+import collections
+import gzip
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from wire_format import READINGS_TYPE, encode_readings
+
+SEQ_BLOCK = 1000  # sequence numbers reserved per disk write
+
+
+class ReadingBuffer:
+    """Memory-first, SQLite-backed ring buffer of numbered sensor readings"""
+
+    def __init__(self, path, source_id, memory_cap=500, disk_cap=100000, wire_format='auto'):
+        self.source_id = source_id
+        self.wire_format = wire_format
+        self.compact = False
+        self.bytes_sent = 0
+        self.memory_cap = memory_cap
+        self.disk_cap = disk_cap
+        self._lock = threading.Lock()
+        self._memory = collections.deque()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS readings (
+                seq INTEGER PRIMARY KEY,
+                payload TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+        """)
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'seq_reserved'").fetchone()
+        # Never reuse a number that may already have reached the server before a crash
+        self._next_seq = row[0] if row else 1
+        self._seq_reserved = self._next_seq
+        self.dropped = 0
+
+    # ------------------------------------------------------------------
+    # Buffering
+    # ------------------------------------------------------------------
+    def _take_seq(self):
+        if self._next_seq >= self._seq_reserved:
+            self._seq_reserved = self._next_seq + SEQ_BLOCK
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('seq_reserved', ?)", (self._seq_reserved,)
+            )
+            self._conn.commit()
+        seq = self._next_seq
+        self._next_seq += 1
+        return seq
+
+    def append(self, reading, recorded_at=None):
+        """Number a reading and hold it until the next flush"""
+        with self._lock:
+            record = dict(reading)
+            record['seq'] = self._take_seq()
+            record['recordedAt'] = (recorded_at or datetime.now(timezone.utc)).isoformat()
+            self._memory.append(record)
+            if len(self._memory) > self.memory_cap:
+                self._spill()
+            return record['seq']
+
+    def _spill(self):
+        """Move in-memory readings to disk, trimming the oldest beyond disk_cap"""
+        if not self._memory:
+            return
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO readings (seq, payload) VALUES (?, ?)",
+            [(r['seq'], json.dumps(r, separators=(',', ':'))) for r in self._memory]
+        )
+        self._memory.clear()
+        overflow = self._disk_count() - self.disk_cap
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM readings WHERE seq IN (SELECT seq FROM readings ORDER BY seq LIMIT ?)", (overflow,)
+            )
+            self.dropped += overflow
+        self._conn.commit()
+
+    def _disk_count(self):
+        return self._conn.execute("SELECT COUNT(*) FROM readings").fetchone()[0]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._memory) + self._disk_count()
+
+    # ------------------------------------------------------------------
+    # Upload
+    # ------------------------------------------------------------------
+    def _oldest(self, limit):
+        """Oldest readings first: anything on disk predates what is in memory"""
+        rows = self._conn.execute(
+            "SELECT payload FROM readings ORDER BY seq LIMIT ?", (limit,)
+        ).fetchall()
+        batch = [json.loads(row[0]) for row in rows]
+        for record in self._memory:
+            if len(batch) >= limit:
+                break
+            batch.append(record)
+        return batch
+
+    def _ack(self, acked_seq):
+        self._conn.execute("DELETE FROM readings WHERE seq <= ?", (acked_seq,))
+        self._conn.commit()
+        while self._memory and self._memory[0]['seq'] <= acked_seq:
+            self._memory.popleft()
+
+    def encode_batch(self, batch):
+        """(gzip-compressed body, content type) in the format currently negotiated"""
+        if self.compact:
+            return gzip.compress(encode_readings(self.source_id, batch)), READINGS_TYPE
+        body = json.dumps({'sourceId': self.source_id, 'readings': batch}, separators=(',', ':'))
+        return gzip.compress(body.encode('utf-8')), 'application/json'
+
+    def _negotiate(self, response):
+        """Switch formats on what the server says it accepts; True if the batch must be resent"""
+        if response.status_code == 415 and self.compact:
+            print("Server rejected compact sensor batches, falling back to JSON")
+            self.compact = False
+            return True
+        accepted = response.headers.get('Accept-Post', '')
+        if self.wire_format == 'auto' and not self.compact and READINGS_TYPE in accepted:
+            print("Server accepts compact sensor batches, switching from JSON")
+            self.compact = True
+        return False
+
+    def flush(self, session, url, batch_size=500, timeout=10):
+        """Upload buffered readings in batches; returns how many were acknowledged.
+
+        Network and server errors propagate after the unsent readings are
+        spilled to disk for the next attempt. A batch that is too large (413)
+        is retried in halves. A batch the server rejects as malformed (any
+        other 4xx except 404/408/429) is dropped so it cannot block the queue forever.
+        """
+        sent = 0
+        with self._lock:
+            while True:
+                batch = self._oldest(batch_size)
+                if not batch:
+                    break
+                body, content_type = self.encode_batch(batch)
+                try:
+                    response = session.post(
+                        url,
+                        data=body,
+                        headers={'Content-Type': content_type, 'Content-Encoding': 'gzip'},
+                        timeout=timeout
+                    )
+                except Exception:
+                    self._spill()
+                    raise
+                self.bytes_sent += len(body)
+                if self._negotiate(response):
+                    continue
+                if response.status_code == 413 and len(batch) > 1:
+                    batch_size = max(1, len(batch) // 2)
+                    print(f"Server refused {len(batch)} readings as too large, retrying {batch_size} at a time")
+                    continue
+                if 400 <= response.status_code < 500 and response.status_code not in (404, 408, 429):
+                    print(f"✗ Server rejected {len(batch)} readings ({response.status_code}), dropping batch")
+                    self.dropped += len(batch)
+                elif response.status_code >= 300:
+                    self._spill()
+                    response.raise_for_status()
+                    raise RuntimeError(f"Unexpected bulk upload status {response.status_code}")
+                else:
+                    sent += len(batch)
+                # Batches are in seq order, so everything up to the last one is settled
+                self._ack(batch[-1]['seq'])
+                if len(batch) < batch_size:
+                    break
+        return sent
+
+    def close(self):
+        with self._lock:
+            self._spill()
+            self._conn.close()
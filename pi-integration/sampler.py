@@ -0,0 +1,163 @@
+"""
+High-rate sensor sampling with on-device aggregation.
+
+A background thread reads the sensors at `rate_hz` into fixed-size,
+array-backed ring buffers (one per channel). Once per upload window the
+client calls `aggregate()`, which summarises everything sampled since the
+last call as min/max/mean/stddev plus a median-filtered value that rejects
+single-sample spikes. Only those aggregates leave the Pi. NumPy is used
+when installed; the pure-Python path gives the same numbers.
+"""
+
+import math
+import statistics
+import threading
+import time
+from array import array
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+MEDIAN_KERNEL = 5
+
+
+class RingBuffer:
+    """Fixed-capacity float buffer; the oldest samples are overwritten when full"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._data = array('d', bytes(8 * capacity))
+        self._start = 0
+        self._count = 0
+
+    def append(self, value):
+        end = (self._start + self._count) % self.capacity
+        self._data[end] = value
+        if self._count < self.capacity:
+            self._count += 1
+        else:
+            self._start = (self._start + 1) % self.capacity
+
+    def drain(self):
+        """Return samples oldest-first and empty the buffer"""
+        end = self._start + self._count
+        if end <= self.capacity:
+            values = self._data[self._start:end]
+        else:
+            values = self._data[self._start:] + self._data[:end - self.capacity]
+        self._start = 0
+        self._count = 0
+        return values
+
+    def __len__(self):
+        return self._count
+
+
+def median_filter(values, kernel=MEDIAN_KERNEL):
+    """Sliding median over `values`; the first and last kernel//2 samples pass through"""
+    n = len(values)
+    if n < kernel:
+        return list(values)
+    if HAS_NUMPY:
+        data = np.asarray(values)
+        core = np.median(np.lib.stride_tricks.sliding_window_view(data, kernel), axis=1)
+        half = kernel // 2
+        return np.concatenate((data[:half], core, data[n - half:])).tolist()
+    half = kernel // 2
+    core = [statistics.median(values[i - half:i + half + 1]) for i in range(half, n - half)]
+    return list(values[:half]) + core + list(values[n - half:])
+
+
+def summarize(values):
+    """min/max/mean/stddev/filtered for one channel's window of samples"""
+    n = len(values)
+    if n == 0:
+        return None
+    if HAS_NUMPY:
+        data = np.frombuffer(values, dtype=np.float64) if isinstance(values, array) else np.asarray(values)
+        stats = {
+            'min': float(data.min()),
+            'max': float(data.max()),
+            'mean': float(data.mean()),
+            'stddev': float(data.std()),
+        }
+    else:
+        mean = math.fsum(values) / n
+        stats = {
+            'min': min(values),
+            'max': max(values),
+            'mean': mean,
+            'stddev': math.sqrt(math.fsum((v - mean) ** 2 for v in values) / n),
+        }
+    filtered = median_filter(values)
+    stats['filtered'] = math.fsum(filtered) / len(filtered)
+    stats['count'] = n
+    return stats
+
+
+class SensorSampler:
+    """Reads `read_fn` at `rate_hz` on a background thread and aggregates per window"""
+
+    def __init__(self, read_fn, rate_hz=2.0, window_seconds=30):
+        self.read_fn = read_fn
+        self.rate_hz = rate_hz
+        # Headroom so a late aggregate() call does not lose the start of a window
+        self.capacity = max(1, int(rate_hz * window_seconds * 2))
+        self._buffers = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.errors = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='sensor-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def sample_once(self):
+        reading = self.read_fn()
+        if not reading:
+            self.errors += 1
+            return
+        with self._lock:
+            for channel, value in reading.items():
+                if value is None:
+                    continue
+                buffer = self._buffers.get(channel)
+                if buffer is None:
+                    buffer = self._buffers[channel] = RingBuffer(self.capacity)
+                buffer.append(float(value))
+
+    def _run(self):
+        period = 1.0 / self.rate_hz
+        next_tick = time.monotonic()
+        while not self._stopped.is_set():
+            try:
+                self.sample_once()
+            except Exception as e:
+                self.errors += 1
+                print(f"Error sampling sensors: {e}")
+            next_tick += period
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                # Sensor reads are slower than the requested rate; don't try to catch up
+                next_tick = time.monotonic()
+                delay = 0
+            self._stopped.wait(delay)
+
+    def aggregate(self):
+        """Summarise and clear the current window: {channel: stats} (empty if no samples)"""
+        with self._lock:
+            windows = {channel: buffer.drain() for channel, buffer in self._buffers.items()}
+        return {channel: summarize(values) for channel, values in windows.items() if len(values)}
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the web app's resumable photo upload endpoints, for
+testing pi_client uploads without the real server.
+
+    python3 upload_stub.py --port 8082 --dir /tmp/uploads --drop-every 3
+
+Chunks are appended to <dir>/<uploadId>.part and the file is renamed to
+<uploadId>.jpg once all bytes have arrived. `--drop-every N` closes the
+connection after storing every Nth chunk without answering, the way a
+flaky Wi-Fi link loses an acknowledgement.
+"""
+
+import argparse
+import json
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+UPLOAD_PATH = re.compile(r'^/api/photos/uploads(?:/([A-Za-z0-9-]{8,64}))?$')
+
+
+class UploadStub:
+    """Threaded stub server; `completed` lists (uploadId, plantId, path) per finished upload"""
+
+    def __init__(self, directory, host='127.0.0.1', port=0, drop_every=0):
+        self.directory = directory
+        self.drop_every = drop_every
+        self.uploads = {}
+        self.completed = []
+        self.completed_keys = {}
+        self.chunks = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _upload_id(self):
+                match = UPLOAD_PATH.match(self.path)
+                if not match:
+                    self._reply(404, {'error': 'Not found'})
+                    return False, None
+                return True, match.group(1)
+
+            def _body(self):
+                return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+            def do_POST(self):
+                ok, upload_id = self._upload_id()
+                if not ok:
+                    return
+                request = json.loads(self._body() or b'{}')
+                upload_id = request.get('uploadId')
+                if not upload_id or not request.get('plantId') or not request.get('size'):
+                    return self._reply(400, {'error': 'uploadId, plantId and size are required'})
+                with stub._lock:
+                    finished = stub.completed_keys.get(request.get('uploadKey'))
+                    if finished is not None:
+                        return self._reply(200, {'uploadId': finished['id'], 'offset': request['size'],
+                                                 'size': request['size'], 'complete': True, 'photo': finished})
+                    if upload_id in stub.uploads:
+                        upload = stub.uploads[upload_id]
+                        return self._reply(200, {'uploadId': upload_id, 'offset': stub._offset(upload_id),
+                                                 'size': upload['size']})
+                    stub.uploads[upload_id] = {'plantId': request['plantId'], 'size': request['size'],
+                                               'uploadKey': request.get('uploadKey')}
+                    open(stub._part(upload_id), 'wb').close()
+                self._reply(201, {'uploadId': upload_id, 'offset': 0, 'size': request['size']})
+
+            def do_GET(self):
+                ok, upload_id = self._upload_id()
+                if not ok:
+                    return
+                with stub._lock:
+                    upload = stub.uploads.get(upload_id)
+                    if upload is None:
+                        return self._reply(404, {'error': 'Upload not found'})
+                    self._reply(200, {'uploadId': upload_id, 'offset': stub._offset(upload_id),
+                                      'size': upload['size']})
+
+            def do_PATCH(self):
+                ok, upload_id = self._upload_id()
+                if not ok:
+                    return
+                chunk = self._body()
+                with stub._lock:
+                    upload = stub.uploads.get(upload_id)
+                    if upload is None:
+                        return self._reply(404, {'error': 'Upload not found'})
+                    offset = stub._offset(upload_id)
+                    if int(self.headers.get('Upload-Offset', -1)) != offset:
+                        return self._reply(409, {'error': 'Offset mismatch', 'offset': offset})
+                    if offset + len(chunk) > upload['size']:
+                        return self._reply(400, {'error': 'Chunk exceeds declared upload size', 'offset': offset})
+                    with open(stub._part(upload_id), 'ab') as f:
+                        f.write(chunk)
+                    offset += len(chunk)
+                    stub.chunks += 1
+                    body = {'uploadId': upload_id, 'offset': offset, 'size': upload['size'], 'complete': False}
+                    if offset == upload['size']:
+                        path = os.path.join(stub.directory, f"{upload_id}.jpg")
+                        os.replace(stub._part(upload_id), path)
+                        del stub.uploads[upload_id]
+                        stub.completed.append((upload_id, upload['plantId'], path))
+                        body.update(complete=True, photo={'id': upload_id, 'plantId': upload['plantId']})
+                        if upload['uploadKey']:
+                            stub.completed_keys[upload['uploadKey']] = body['photo']
+                    drop = stub.drop_every and stub.chunks % stub.drop_every == 0
+                if drop:
+                    # Stored, but the client never hears about it
+                    self.close_connection = True
+                    self.connection.close()
+                    return
+                self._reply(201 if body['complete'] else 200, body)
+
+            def _reply(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = None
+
+    def _part(self, upload_id):
+        return os.path.join(self.directory, f"{upload_id}.part")
+
+    def _offset(self, upload_id):
+        return os.path.getsize(self._part(upload_id))
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local resumable photo upload stub")
+    parser.add_argument('--port', type=int, default=8082)
+    parser.add_argument('--dir', default='uploads')
+    parser.add_argument('--drop-every', type=int, default=0)
+    args = parser.parse_args()
+    stub = UploadStub(args.dir, port=args.port, drop_every=args.drop_every)
+    print(f"Upload stub listening on {stub.url}, saving to {args.dir}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+"""
+Compact binary encoding for sensor batches and device lists.
+
+JSON repeats every key in every reading and spells numbers and timestamps
+out as text. This format stores a batch column by column instead: each key
+is written once, numbers become zigzag varints delta-encoded against the
+previous row (so sequence numbers and timestamps cost a byte or two),
+strings are dictionary-coded, and a bitmap marks the rows that lack a key.
+Batches are still gzip-compressed on the way out, like the JSON ones.
+
+    readings: application/vnd.growbud.readings+bin
+    devices:  application/vnd.growbud.devices+bin
+
+The server advertises compact sensor uploads in an `Accept-Post` header and
+sends the compact device form (only the devices that changed since the
+client's ETag) when the `Accept` header asks for it, so older servers keep
+speaking JSON. server/wireFormat.ts implements the same format.
+
+Null and missing keys are treated alike (the key is left out), and ISO
+timestamps keep millisecond precision.
+"""
+
+import json
+import math
+import re
+import struct
+from datetime import datetime, timedelta, timezone
+
+READINGS_TYPE = 'application/vnd.growbud.readings+bin'
+DEVICES_TYPE = 'application/vnd.growbud.devices+bin'
+
+MAGIC = b'GBW'
+VERSION = 1
+KIND_READINGS = 1
+KIND_DEVICES = 2
+
+# Column types
+INT, FIXED, FLOAT, BOOL, STR, TIME, JSON = range(7)
+
+MAX_INT = 2 ** 50  # deltas and zigzag of anything smaller stay exact as JS numbers
+MAX_DECIMALS = 6
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MILLISECOND = timedelta(milliseconds=1)
+TIMESTAMP = re.compile(r'^\d{4}-\d\d-\d\dT\d\d:\d\d')
+
+
+class WireFormatError(ValueError):
+    """The payload is not a valid compact batch"""
+
+
+# ----------------------------------------------------------------------
+# Primitives
+# ----------------------------------------------------------------------
+def _put_uvarint(out, value):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _put_deltas(out, values):
+    """Zigzag varints of each value minus the previous one"""
+    previous = 0
+    for value in values:
+        delta = value - previous
+        previous = value
+        zigzag = delta * 2 if delta >= 0 else -delta * 2 - 1
+        if zigzag < 0x80:
+            out.append(zigzag)
+        else:
+            _put_uvarint(out, zigzag)
+
+
+def _put_str(out, text):
+    data = text.encode('utf-8')
+    _put_uvarint(out, len(data))
+    out += data
+
+
+def _bitmap(flags):
+    bits = bytearray((len(flags) + 7) // 8)
+    for i, flag in enumerate(flags):
+        if flag:
+            bits[i >> 3] |= 1 << (i & 7)
+    return bits
+
+
+class _Reader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def byte(self):
+        value = self.data[self.pos]
+        self.pos += 1
+        return value
+
+    def take(self, length):
+        if self.pos + length > len(self.data):
+            raise IndexError("payload truncated")
+        chunk = self.data[self.pos:self.pos + length]
+        self.pos += length
+        return chunk
+
+    def uvarint(self):
+        data = self.data
+        result = shift = 0
+        while True:
+            byte = data[self.pos]
+            self.pos += 1
+            result |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def deltas(self, count):
+        values = []
+        previous = 0
+        for _ in range(count):
+            zigzag = self.uvarint()
+            previous += zigzag >> 1 if not zigzag & 1 else -((zigzag + 1) >> 1)
+            values.append(previous)
+        return values
+
+    def str(self):
+        return self.take(self.uvarint()).decode('utf-8')
+
+    def bitmap(self, count):
+        bits = self.take((count + 7) // 8)
+        return [bool(bits[i >> 3] & (1 << (i & 7))) for i in range(count)]
+
+
+# ----------------------------------------------------------------------
+# Columns
+# ----------------------------------------------------------------------
+def _to_millis(text):
+    moment = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    if moment.tzinfo is None:
+        raise ValueError("timestamp without a time zone")
+    return (moment - EPOCH) // MILLISECOND
+
+
+def _fixed_point(values):
+    """(decimals, scaled ints) if every value survives scaling by 10**decimals exactly"""
+    if not all(math.isfinite(v) for v in values):
+        return None
+    for decimals in range(1, MAX_DECIMALS + 1):
+        scale = 10 ** decimals
+        scaled = [round(v * scale) for v in values]
+        if all(abs(s) < MAX_INT and s / scale == v for s, v in zip(scaled, values)):
+            return decimals, scaled
+    return None
+
+
+def _column_type(values):
+    """Pick the tightest column type for the non-null values of one key"""
+    if all(type(v) is bool for v in values):
+        return BOOL, values
+    if all(type(v) is int and -MAX_INT < v < MAX_INT for v in values):
+        return INT, values
+    if all(type(v) in (int, float) for v in values):
+        fixed = _fixed_point(values)
+        return (FIXED, fixed) if fixed else (FLOAT, values)
+    if all(type(v) is str for v in values):
+        if all(TIMESTAMP.match(v) for v in values):
+            try:
+                return TIME, [_to_millis(v) for v in values]
+            except ValueError:
+                pass
+        return STR, values
+    return JSON, [json.dumps(v, separators=(',', ':')) for v in values]
+
+
+def _put_dictionary(out, values):
+    index = {}
+    for value in values:
+        index.setdefault(value, len(index))
+    _put_uvarint(out, len(index))
+    for value in index:
+        _put_str(out, value)
+    for value in values:
+        _put_uvarint(out, index[value])
+
+
+def _encode_records(out, records):
+    columns = {}
+    for record in records:
+        for key in record:
+            columns.setdefault(key, None)
+    columns = [(key, [record.get(key) for record in records]) for key in columns]
+    # A key that is null everywhere decodes the same as one that is absent
+    columns = [(key, column) for key, column in columns if any(v is not None for v in column)]
+
+    _put_uvarint(out, len(records))
+    _put_uvarint(out, len(columns))
+    for key, column in columns:
+        values = [v for v in column if v is not None]
+        kind, encoded = _column_type(values)
+        _put_str(out, key)
+        out.append(kind)
+        if len(values) == len(column):
+            out.append(0)
+        else:
+            out.append(1)
+            out += _bitmap([v is not None for v in column])
+
+        if kind in (INT, TIME):
+            _put_deltas(out, encoded)
+        elif kind == FIXED:
+            decimals, scaled = encoded
+            out.append(decimals)
+            _put_deltas(out, scaled)
+        elif kind == FLOAT:
+            out += struct.pack(f'<{len(encoded)}d', *encoded)
+        elif kind == BOOL:
+            out += _bitmap(encoded)
+        else:
+            _put_dictionary(out, encoded)
+
+
+def _decode_records(reader):
+    count = reader.uvarint()
+    records = [{} for _ in range(count)]
+    for _ in range(reader.uvarint()):
+        key = reader.str()
+        kind = reader.byte()
+        if reader.byte():
+            rows = [i for i, present in enumerate(reader.bitmap(count)) if present]
+        else:
+            rows = range(count)
+        size = len(rows)
+
+        if kind == INT:
+            values = reader.deltas(size)
+        elif kind == FIXED:
+            scale = 10 ** reader.byte()
+            values = [v / scale for v in reader.deltas(size)]
+        elif kind == TIME:
+            values = [(EPOCH + v * MILLISECOND).isoformat(timespec='milliseconds') for v in reader.deltas(size)]
+        elif kind == FLOAT:
+            values = struct.unpack(f'<{size}d', reader.take(size * 8))
+        elif kind == BOOL:
+            values = reader.bitmap(size)
+        elif kind in (STR, JSON):
+            dictionary = [reader.str() for _ in range(reader.uvarint())]
+            if kind == JSON:
+                dictionary = [json.loads(v) for v in dictionary]
+            values = [dictionary[reader.uvarint()] for _ in range(size)]
+        else:
+            raise WireFormatError(f"Unknown column type {kind} for {key!r}")
+
+        for row, value in zip(rows, values):
+            records[row][key] = value
+    return records
+
+
+# ----------------------------------------------------------------------
+# Messages
+# ----------------------------------------------------------------------
+def _header(kind):
+    out = bytearray(MAGIC)
+    out.append(VERSION)
+    out.append(kind)
+    return out
+
+
+def _open(data, kind):
+    reader = _Reader(data)
+    if bytes(reader.take(len(MAGIC))) != MAGIC:
+        raise WireFormatError("Not a compact batch")
+    version = reader.byte()
+    if version != VERSION:
+        raise WireFormatError(f"Unsupported format version {version}")
+    if reader.byte() != kind:
+        raise WireFormatError("Unexpected message kind")
+    return reader
+
+
+def _decoding(decode, data):
+    try:
+        return decode(data)
+    except WireFormatError:
+        raise
+    except (IndexError, UnicodeDecodeError, ValueError, struct.error) as e:
+        raise WireFormatError(f"Malformed compact batch: {e}") from e
+
+
+def encode_readings(source_id, readings):
+    """Encode a sensor batch ({'sourceId', 'readings'} in JSON) for /api/sensor-data/bulk"""
+    out = _header(KIND_READINGS)
+    _put_str(out, str(source_id))
+    _encode_records(out, readings)
+    return bytes(out)
+
+
+def decode_readings(data):
+    """Inverse of encode_readings: {'sourceId': ..., 'readings': [...]}"""
+    def decode(data):
+        reader = _open(data, KIND_READINGS)
+        source_id = reader.str()
+        return {'sourceId': source_id, 'readings': _decode_records(reader)}
+    return _decoding(decode, data)
+
+
+def encode_devices(devices, removed=(), full=True):
+    """Encode a device list, or with full=False the devices changed since the client's version"""
+    out = _header(KIND_DEVICES)
+    out.append(1 if full else 0)
+    _put_uvarint(out, len(removed))
+    for device_id in removed:
+        _put_str(out, str(device_id))
+    _encode_records(out, devices)
+    return bytes(out)
+
+
+def decode_devices(data):
+    """Inverse of encode_devices: {'full': bool, 'removed': [ids], 'devices': [...]}"""
+    def decode(data):
+        reader = _open(data, KIND_DEVICES)
+        full = bool(reader.byte() & 1)
+        removed = [reader.str() for _ in range(reader.uvarint())]
+        return {'full': full, 'removed': removed, 'devices': _decode_records(reader)}
+    return _decoding(decode, data)
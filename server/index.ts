@@ -4,6 +4,9 @@ import { setupVite, serveStatic, log } from "./vite";
 import { storage } from "./storage";
 
 const app = express();
+// Buffered sensor backlogs (up to 1000 readings with per-window stats) run to a few
+// hundred KB of JSON; parse them before the global parser's 100kb default applies
+app.use("/api/sensor-data/bulk", express.json({ limit: "5mb" }));
 app.use(express.json());
 app.use(express.urlencoded({ extended: false }));
 
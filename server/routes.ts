@@ -1,10 +1,13 @@
-import type { Express } from "express";
+import express, { type Express, type Request, type Response } from "express";
 import { createServer, type Server } from "http";
 import multer from "multer";
 import path from "path";
 import fs from "fs";
 import { promises as fsPromises } from "fs";
+import { EventEmitter } from "events";
+import { createHash } from "crypto";
 import { storage } from "./storage";
+import { WIRE_DEVICES_TYPE, WIRE_READINGS_TYPE, decodeReadings, encodeDevices } from "./wireFormat";
 import { 
   insertPlantSchema, 
   insertSensorDataSchema, 
@@ -43,6 +46,54 @@ const upload = multer({
   }
 });
 
+// Resumable chunked photo uploads: partial files and their metadata live here until complete
+const partialUploadDir = path.join(process.cwd(), 'uploads', 'photos', '.partial');
+const UPLOAD_CHUNK_LIMIT = 1024 * 1024; // largest chunk a client may send
+const uploadIdPattern = /^[A-Za-z0-9-]{8,64}$/;
+const uploadKeyPattern = /^[0-9a-f]{64}$/; // client's SHA-256 of plant id + photo
+const uploadsInProgress = new Set<string>(); // one chunk write per upload at a time
+
+interface PartialUpload {
+  uploadId: string;
+  uploadKey?: string;
+  plantId: string;
+  size: number;
+  extension: string;
+}
+
+function partialUploadPaths(uploadId: string) {
+  return {
+    meta: path.join(partialUploadDir, `${uploadId}.json`),
+    data: path.join(partialUploadDir, `${uploadId}.part`),
+  };
+}
+
+// Finished uploads are remembered by key, so a client that never saw the final
+// acknowledgement and starts over gets the stored photo instead of a second copy
+function completedUploadPath(uploadKey: string) {
+  return path.join(partialUploadDir, 'completed', `${uploadKey}.json`);
+}
+
+async function readCompletedUpload(uploadKey: string) {
+  try {
+    return JSON.parse(await fsPromises.readFile(completedUploadPath(uploadKey), 'utf8'));
+  } catch {
+    return undefined;
+  }
+}
+
+async function readPartialUpload(uploadId: string): Promise<{ upload: PartialUpload; offset: number } | undefined> {
+  if (!uploadIdPattern.test(uploadId)) return undefined;
+  const paths = partialUploadPaths(uploadId);
+  try {
+    const upload = JSON.parse(await fsPromises.readFile(paths.meta, 'utf8')) as PartialUpload;
+    const offset = (await fsPromises.stat(paths.data)).size;
+    return { upload, offset };
+  } catch {
+    return undefined;
+  }
+}
+
 // Configure multer for feeding schedule uploads
 const scheduleStorage = multer.diskStorage({
   destination: (req, file, cb) => {
@@ -150,6 +201,75 @@ const STAGE_PRESETS = {
   complete: CANNABIS_SCHEDULE.complete,
 };
 
+// Device state versioning: every device write bumps the version so clients can
+// use conditional GETs (ETag) or long-poll /api/devices/watch instead of polling.
+const deviceEvents = new EventEmitter();
+deviceEvents.setMaxListeners(0);
+const deviceBootId = Date.now().toString(36);
+let deviceVersion = 0;
+
+function deviceEtag() {
+  return `W/"devices-${deviceBootId}-${deviceVersion}"`;
+}
+
+function markDevicesChanged() {
+  deviceVersion++;
+  deviceEvents.emit("change");
+}
+
+// Compact device responses (see wireFormat.ts) carry only the devices that changed
+// since the list the client last received. Their ETag adds a hash of that list, and
+// the last few lists served in that form are kept by hash to diff against; anything
+// older gets the full list. Keying by content rather than version keeps the diff
+// right when a write lands between reading the version and reading the rows.
+const DEVICE_SNAPSHOT_HISTORY = 16;
+const deviceSnapshots = new Map<string, Map<string, string>>();
+
+function etagVersion(etag: string | undefined) {
+  const prefix = `W/"devices-${deviceBootId}-`;
+  if (!etag || !etag.startsWith(prefix)) return undefined;
+  return parseInt(etag.slice(prefix.length), 10);
+}
+
+function isCurrentDeviceEtag(etag: string | undefined) {
+  return etagVersion(etag) === deviceVersion;
+}
+
+function etagContentHash(etag: string | undefined) {
+  const match = etag?.match(/^W\/"devices-[^-"]+-\d+-([0-9a-f]+)"$/);
+  return match ? match[1] : undefined;
+}
+
+function sendDevices(req: Request, res: Response, devices: any[], etag: string) {
+  res.vary("Accept");
+  if (req.accepts(["application/json", WIRE_DEVICES_TYPE]) !== WIRE_DEVICES_TYPE) {
+    res.setHeader("ETag", etag);
+    return res.json(devices);
+  }
+
+  const snapshot = new Map<string, string>(devices.map((d) => [String(d.id), JSON.stringify(d)]));
+  const hash = createHash("sha1").update(JSON.stringify(devices)).digest("hex").slice(0, 16);
+  deviceSnapshots.delete(hash);
+  deviceSnapshots.set(hash, snapshot);
+  if (deviceSnapshots.size > DEVICE_SNAPSHOT_HISTORY) {
+    const oldest = deviceSnapshots.keys().next().value;
+    if (oldest !== undefined) deviceSnapshots.delete(oldest);
+  }
+  res.setHeader("ETag", `${etag.slice(0, -1)}-${hash}"`);
+
+  const sinceHash = etagContentHash(req.headers["if-none-match"]);
+  const base = sinceHash === undefined ? undefined : deviceSnapshots.get(sinceHash);
+  let body: Buffer;
+  if (base) {
+    const changed = devices.filter((d) => base.get(String(d.id)) !== snapshot.get(String(d.id)));
+    const removed = Array.from(base.keys()).filter((id) => !snapshot.has(id));
+    body = encodeDevices(changed, removed, false);
+  } else {
+    body = encodeDevices(devices);
+  }
+  res.type(WIRE_DEVICES_TYPE).send(body);
+}
+
 export async function registerRoutes(app: Express): Promise<Server> {
   // Plants endpoints
   app.get("/api/plants", async (req, res) => {
@@ -204,6 +324,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
       // First delete all related records
       await storage.deleteCalendarEventsByPlant(req.params.id);
       await storage.deleteDeviceStatesByPlant(req.params.id);
+      markDevicesChanged();
       await storage.deletePhotosByPlant(req.params.id);
       
       // Then delete the plant
@@ -388,6 +509,111 @@ export async function registerRoutes(app: Express): Promise<Server> {
     }
   });
 
+  // Resumable upload: create (idempotent for a client-chosen uploadId and uploadKey), then PATCH chunks at Upload-Offset
+  app.post("/api/photos/uploads", async (req, res) => {
+    try {
+      const { uploadId, uploadKey, plantId, size, filename } = req.body;
+      if (!uploadId || !uploadIdPattern.test(uploadId)) {
+        return res.status(400).json({ error: "A valid uploadId is required" });
+      }
+      if (uploadKey !== undefined && (typeof uploadKey !== 'string' || !uploadKeyPattern.test(uploadKey))) {
+        return res.status(400).json({ error: "uploadKey must be a hex SHA-256" });
+      }
+      if (!plantId) {
+        return res.status(400).json({ error: "Plant ID is required" });
+      }
+      if (!Number.isInteger(size) || size <= 0 || size > 10 * 1024 * 1024) {
+        return res.status(400).json({ error: "size must be between 1 byte and 10MB" });
+      }
+
+      const completed = uploadKey ? await readCompletedUpload(uploadKey) : undefined;
+      if (completed) {
+        return res.json({ uploadId: completed.uploadId, offset: size, size, complete: true, photo: completed.photo });
+      }
+
+      const existing = await readPartialUpload(uploadId);
+      if (existing) {
+        return res.json({ uploadId, offset: existing.offset, size: existing.upload.size, chunkSize: UPLOAD_CHUNK_LIMIT });
+      }
+
+      const extension = path.extname(filename || '') || '.jpg';
+      const paths = partialUploadPaths(uploadId);
+      await fsPromises.mkdir(partialUploadDir, { recursive: true });
+      await fsPromises.writeFile(paths.data, Buffer.alloc(0));
+      await fsPromises.writeFile(paths.meta, JSON.stringify({ uploadId, uploadKey, plantId, size, extension }));
+
+      res.status(201).json({ uploadId, offset: 0, size, chunkSize: UPLOAD_CHUNK_LIMIT });
+    } catch (error) {
+      console.error("Create upload error:", error);
+      res.status(500).json({ error: "Failed to start upload" });
+    }
+  });
+
+  app.get("/api/photos/uploads/:uploadId", async (req, res) => {
+    const partial = await readPartialUpload(req.params.uploadId);
+    if (!partial) {
+      return res.status(404).json({ error: "Upload not found" });
+    }
+    res.json({ uploadId: req.params.uploadId, offset: partial.offset, size: partial.upload.size });
+  });
+
+  app.patch(
+    "/api/photos/uploads/:uploadId",
+    express.raw({ type: 'application/octet-stream', limit: UPLOAD_CHUNK_LIMIT }),
+    async (req, res) => {
+      const { uploadId } = req.params;
+      if (uploadsInProgress.has(uploadId)) {
+        // A retried chunk raced the original request; the client re-reads the offset and continues
+        return res.status(409).json({ error: "Chunk already in progress" });
+      }
+      uploadsInProgress.add(uploadId);
+      try {
+        const partial = await readPartialUpload(uploadId);
+        if (!partial) {
+          return res.status(404).json({ error: "Upload not found" });
+        }
+        const { upload, offset } = partial;
+        const chunk = req.body as Buffer;
+        const clientOffset = parseInt(req.header('Upload-Offset') ?? '', 10);
+        if (!Buffer.isBuffer(chunk) || chunk.length === 0) {
+          return res.status(400).json({ error: "Chunk body must be application/octet-stream" });
+        }
+        if (clientOffset !== offset) {
+          // Client is behind or ahead (e.g. a lost acknowledgement); tell it where to continue
+          return res.status(409).json({ error: "Offset mismatch", offset });
+        }
+        if (offset + chunk.length > upload.size) {
+          return res.status(400).json({ error: "Chunk exceeds declared upload size", offset });
+        }
+
+        const paths = partialUploadPaths(uploadId);
+        await fsPromises.appendFile(paths.data, chunk);
+        const newOffset = offset + chunk.length;
+        if (newOffset < upload.size) {
+          return res.json({ uploadId, offset: newOffset, size: upload.size, complete: false });
+        }
+
+        const uniqueSuffix = Date.now() + '-' + Math.round(Math.random() * 1E9);
+        const filename = `plant-${uniqueSuffix}${upload.extension}`;
+        const finalPath = path.join(process.cwd(), 'uploads', 'photos', filename);
+        await fsPromises.rename(paths.data, finalPath);
+        await fsPromises.unlink(paths.meta);
+
+        const photo = await storage.createPhoto({ plantId: upload.plantId, filename, path: finalPath });
+        if (upload.uploadKey) {
+          await fsPromises.mkdir(path.dirname(completedUploadPath(upload.uploadKey)), { recursive: true });
+          await fsPromises.writeFile(completedUploadPath(upload.uploadKey), JSON.stringify({ uploadId, photo }));
+        }
+        res.status(201).json({ uploadId, offset: newOffset, size: upload.size, complete: true, photo });
+      } catch (error) {
+        console.error("Upload chunk error:", error);
+        res.status(500).json({ error: "Failed to store upload chunk" });
+      } finally {
+        uploadsInProgress.delete(uploadId);
+      }
+    }
+  );
+
   app.get("/api/photos/:id/file", async (req, res) => {
     try {
       const photo = await storage.getPhoto(req.params.id);
@@ -457,6 +683,41 @@ export async function registerRoutes(app: Express): Promise<Server> {
     }
   });
 
+  // Bulk ingestion for buffered client readings, as JSON or the compact binary
+  // format from wireFormat.ts (either may be gzip-encoded). Accept-Post tells
+  // clients the compact form is understood here.
+  app.post(
+    "/api/sensor-data/bulk",
+    express.raw({ type: WIRE_READINGS_TYPE, limit: "5mb" }),
+    async (req, res) => {
+      res.setHeader("Accept-Post", `application/json, ${WIRE_READINGS_TYPE}`);
+      if (!req.is(["application/json", WIRE_READINGS_TYPE])) {
+        return res.status(415).json({ error: `Send application/json or ${WIRE_READINGS_TYPE}` });
+      }
+      try {
+        const { sourceId, readings } = Buffer.isBuffer(req.body) ? decodeReadings(req.body) : req.body;
+        if (!sourceId || !Array.isArray(readings)) {
+          return res.status(400).json({ error: "sourceId and readings are required" });
+        }
+        if (readings.length > 1000) {
+          return res.status(413).json({ error: "At most 1000 readings per batch" });
+        }
+
+        const rows = readings.map((reading: any) => ({
+          ...insertSensorDataSchema.parse({ ...reading, sourceId, sequence: reading.seq }),
+          recordedAt: reading.recordedAt ? new Date(reading.recordedAt) : new Date(),
+        }));
+        const accepted = await storage.createSensorDataBulk(rows);
+        const ackedSeq = readings.reduce((max: number, r: any) => Math.max(max, r.seq ?? 0), 0);
+
+        res.status(201).json({ accepted, duplicates: rows.length - accepted, ackedSeq });
+      } catch (error) {
+        console.error("Bulk sensor data error:", error);
+        res.status(400).json({ error: "Invalid sensor data batch" });
+      }
+    }
+  );
+
   app.get("/api/sensor-data/history", async (req, res) => {
     try {
       const limit = req.query.limit ? parseInt(req.query.limit as string) : 100;
@@ -568,13 +829,54 @@ export async function registerRoutes(app: Express): Promise<Server> {
   // Device control endpoints
   app.get("/api/devices", async (req, res) => {
     try {
+      const etag = deviceEtag();
+      if (isCurrentDeviceEtag(req.headers["if-none-match"])) {
+        return res.status(304).end();
+      }
       const devices = await storage.getDeviceStates();
-      res.json(devices);
+      sendDevices(req, res, devices, etag);
     } catch (error) {
       res.status(500).json({ error: "Failed to fetch device states" });
     }
   });
 
+  // Long-poll: answers as soon as devices differ from the `If-None-Match` version,
+  // or with 304 after `timeout` seconds (max 60) if nothing changed
+  app.get("/api/devices/watch", async (req, res) => {
+    const since = req.headers["if-none-match"];
+    const timeoutSeconds = Math.min(parseInt(req.query.timeout as string) || 25, 60);
+
+    const respond = async () => {
+      try {
+        const etag = deviceEtag();
+        const devices = await storage.getDeviceStates();
+        sendDevices(req, res, devices, etag);
+      } catch (error) {
+        res.status(500).json({ error: "Failed to fetch device states" });
+      }
+    };
+
+    if (!isCurrentDeviceEtag(since)) {
+      return respond();
+    }
+
+    const onChange = () => {
+      cleanup();
+      respond();
+    };
+    const timer = setTimeout(() => {
+      cleanup();
+      res.status(304).end();
+    }, timeoutSeconds * 1000);
+    const cleanup = () => {
+      clearTimeout(timer);
+      deviceEvents.off("change", onChange);
+    };
+
+    deviceEvents.on("change", onChange);
+    req.on("close", cleanup);
+  });
+
   app.post("/api/devices", async (req, res) => {
     try {
       const { plantId, deviceGroup, deviceType, name, isOn = false, autoMode = false, wattage, distanceFromPlant } = req.body;
@@ -596,6 +898,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
       if (distanceFromPlant !== undefined) deviceData.distanceFromPlant = distanceFromPlant;
 
       const device = await storage.createDeviceState(deviceData);
+      markDevicesChanged();
       
       res.status(201).json(device);
     } catch (error) {
@@ -612,6 +915,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
       if (!updatedDevice) {
         return res.status(404).json({ error: "Device not found" });
       }
+      markDevicesChanged();
       
       res.json(updatedDevice);
     } catch (error) {
@@ -625,6 +929,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
       if (!deleted) {
         return res.status(404).json({ error: "Device not found" });
       }
+      markDevicesChanged();
       res.json({ success: true });
     } catch (error) {
       res.status(500).json({ error: "Failed to delete device" });
@@ -639,6 +944,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
       const newState = !currentState?.isOn;
       
       const updatedDevice = await storage.updateDeviceState(deviceType, newState as any);
+      markDevicesChanged();
       res.json(updatedDevice);
     } catch (error) {
       res.status(500).json({ error: "Failed to toggle device" });
@@ -46,6 +46,7 @@ export interface IStorage {
   // Sensor Data
   getLatestSensorData(): Promise<SensorData | undefined>;
   createSensorData(data: InsertSensorData): Promise<SensorData>;
+  createSensorDataBulk(readings: (InsertSensorData & { recordedAt?: Date })[]): Promise<number>;
   getSensorDataHistory(limit?: number): Promise<SensorData[]>;
 
   // Calendar Events
@@ -165,6 +166,16 @@ export class DatabaseStorage implements IStorage {
     return data;
   }
 
+  async createSensorDataBulk(readings: (InsertSensorData & { recordedAt?: Date })[]): Promise<number> {
+    if (readings.length === 0) return 0;
+    // Replayed batches hit the (source_id, sequence) unique index and are skipped
+    const inserted = await db.insert(sensorData)
+      .values(readings)
+      .onConflictDoNothing({ target: [sensorData.sourceId, sensorData.sequence] })
+      .returning({ id: sensorData.id });
+    return inserted.length;
+  }
+
   async getSensorDataHistory(limit = 100): Promise<SensorData[]> {
     return await db.select().from(sensorData).orderBy(sql`recorded_at DESC`).limit(limit);
   }
@@ -0,0 +1,332 @@
+// Compact binary encoding for sensor batches and device lists, shared with
+// pi-integration/wire_format.py (see that module for the rationale).
+//
+// A message is "GBW", a version byte, a kind byte and a kind-specific header,
+// followed by the records stored column by column: each key once, numbers as
+// zigzag varints delta-encoded against the previous row, strings
+// dictionary-coded, and a bitmap for rows that lack the key. Null and missing
+// keys are treated alike; timestamps keep millisecond precision.
+
+export const WIRE_READINGS_TYPE = "application/vnd.growbud.readings+bin";
+export const WIRE_DEVICES_TYPE = "application/vnd.growbud.devices+bin";
+
+const MAGIC = "GBW";
+const VERSION = 1;
+const KIND_READINGS = 1;
+const KIND_DEVICES = 2;
+
+enum Column {
+  Int = 0,
+  Fixed = 1,
+  Float = 2,
+  Bool = 3,
+  Str = 4,
+  Time = 5,
+  Json = 6,
+}
+
+const MAX_INT = 2 ** 50; // deltas and zigzag of anything smaller stay exact as JS numbers
+const MAX_DECIMALS = 6;
+const TIMESTAMP = /^\d{4}-\d\d-\d\dT\d\d:\d\d/;
+
+export class WireFormatError extends Error {}
+
+// ---------------------------------------------------------------------------
+// Primitives
+// ---------------------------------------------------------------------------
+class Writer {
+  bytes: number[] = [];
+
+  byte(value: number) {
+    this.bytes.push(value);
+  }
+
+  uvarint(value: number) {
+    while (value > 0x7f) {
+      this.bytes.push((value % 0x80) | 0x80);
+      value = Math.floor(value / 0x80);
+    }
+    this.bytes.push(value);
+  }
+
+  deltas(values: number[]) {
+    let previous = 0;
+    for (const value of values) {
+      const delta = value - previous;
+      previous = value;
+      this.uvarint(delta >= 0 ? delta * 2 : -delta * 2 - 1);
+    }
+  }
+
+  str(text: string) {
+    const data = Buffer.from(text, "utf8");
+    this.uvarint(data.length);
+    for (let i = 0; i < data.length; i++) this.bytes.push(data[i]);
+  }
+
+  bitmap(flags: boolean[]) {
+    const bits = new Array((flags.length + 7) >> 3).fill(0);
+    flags.forEach((flag, i) => {
+      if (flag) bits[i >> 3] |= 1 << (i & 7);
+    });
+    for (const b of bits) this.bytes.push(b);
+  }
+
+  toBuffer() {
+    return Buffer.from(this.bytes);
+  }
+}
+
+class Reader {
+  pos = 0;
+
+  constructor(private data: Buffer) {}
+
+  byte() {
+    if (this.pos >= this.data.length) throw new WireFormatError("Payload truncated");
+    return this.data[this.pos++];
+  }
+
+  take(length: number) {
+    if (this.pos + length > this.data.length) throw new WireFormatError("Payload truncated");
+    const chunk = this.data.subarray(this.pos, this.pos + length);
+    this.pos += length;
+    return chunk;
+  }
+
+  uvarint() {
+    let result = 0;
+    let multiplier = 1;
+    for (;;) {
+      const b = this.byte();
+      result += (b & 0x7f) * multiplier;
+      if (b < 0x80) return result;
+      multiplier *= 0x80;
+    }
+  }
+
+  deltas(count: number) {
+    const values: number[] = [];
+    let previous = 0;
+    for (let i = 0; i < count; i++) {
+      const zigzag = this.uvarint();
+      previous += zigzag % 2 === 0 ? zigzag / 2 : -(zigzag + 1) / 2;
+      values.push(previous);
+    }
+    return values;
+  }
+
+  str() {
+    return this.take(this.uvarint()).toString("utf8");
+  }
+
+  bitmap(count: number) {
+    const bits = this.take((count + 7) >> 3);
+    return Array.from({ length: count }, (_, i) => (bits[i >> 3] & (1 << (i & 7))) !== 0);
+  }
+}
+
+// ---------------------------------------------------------------------------
+// Columns
+// ---------------------------------------------------------------------------
+function toMillis(value: unknown) {
+  if (value instanceof Date) return value.getTime();
+  if (typeof value === "string" && TIMESTAMP.test(value) && /(Z|[+-]\d\d:?\d\d)$/.test(value)) {
+    const millis = Date.parse(value);
+    return Number.isNaN(millis) ? undefined : millis;
+  }
+  return undefined;
+}
+
+function fixedPoint(values: number[]): [number, number[]] | undefined {
+  if (!values.every(Number.isFinite)) return undefined;
+  for (let decimals = 1; decimals <= MAX_DECIMALS; decimals++) {
+    const scale = 10 ** decimals;
+    const scaled = values.map((v) => Math.round(v * scale));
+    if (scaled.every((s, i) => Math.abs(s) < MAX_INT && s / scale === values[i])) {
+      return [decimals, scaled];
+    }
+  }
+  return undefined;
+}
+
+function writeDictionary(out: Writer, values: string[]) {
+  const index = new Map<string, number>();
+  for (const value of values) {
+    if (!index.has(value)) index.set(value, index.size);
+  }
+  out.uvarint(index.size);
+  Array.from(index.keys()).forEach((value) => out.str(value));
+  for (const value of values) out.uvarint(index.get(value)!);
+}
+
+function writeColumn(out: Writer, values: unknown[]) {
+  if (values.every((v) => typeof v === "boolean")) {
+    out.byte(Column.Bool);
+    return () => out.bitmap(values as boolean[]);
+  }
+  if (values.every((v) => typeof v === "number")) {
+    const numbers = values as number[];
+    if (numbers.every((v) => Number.isInteger(v) && Math.abs(v) < MAX_INT)) {
+      out.byte(Column.Int);
+      return () => out.deltas(numbers);
+    }
+    const fixed = fixedPoint(numbers);
+    if (fixed) {
+      out.byte(Column.Fixed);
+      return () => {
+        out.byte(fixed[0]);
+        out.deltas(fixed[1]);
+      };
+    }
+    out.byte(Column.Float);
+    return () => {
+      const data = Buffer.alloc(numbers.length * 8);
+      numbers.forEach((v, i) => data.writeDoubleLE(v, i * 8));
+      for (let i = 0; i < data.length; i++) out.byte(data[i]);
+    };
+  }
+  const millis = values.map(toMillis);
+  if (millis.every((v) => v !== undefined)) {
+    out.byte(Column.Time);
+    return () => out.deltas(millis as number[]);
+  }
+  if (values.every((v) => typeof v === "string")) {
+    out.byte(Column.Str);
+    return () => writeDictionary(out, values as string[]);
+  }
+  out.byte(Column.Json);
+  return () => writeDictionary(out, values.map((v) => JSON.stringify(v)));
+}
+
+function encodeRecords(out: Writer, records: Record<string, unknown>[]) {
+  const keys = new Set<string>();
+  for (const record of records) {
+    for (const key of Object.keys(record)) keys.add(key);
+  }
+  // A key that is null everywhere decodes the same as one that is absent
+  const columns = Array.from(keys)
+    .map((key) => ({ key, column: records.map((r) => r[key]) }))
+    .filter(({ column }) => column.some((v) => v !== null && v !== undefined));
+
+  out.uvarint(records.length);
+  out.uvarint(columns.length);
+  for (const { key, column } of columns) {
+    const present = column.map((v) => v !== null && v !== undefined);
+    const values = column.filter((_, i) => present[i]);
+    out.str(key);
+    const writeValues = writeColumn(out, values);
+    if (values.length === column.length) {
+      out.byte(0);
+    } else {
+      out.byte(1);
+      out.bitmap(present);
+    }
+    writeValues();
+  }
+}
+
+function decodeRecords(reader: Reader) {
+  const count = reader.uvarint();
+  const records: Record<string, unknown>[] = Array.from({ length: count }, () => ({}));
+  const fieldCount = reader.uvarint();
+  for (let f = 0; f < fieldCount; f++) {
+    const key = reader.str();
+    const kind = reader.byte();
+    const rows = reader.byte()
+      ? reader.bitmap(count).flatMap((present, i) => (present ? [i] : []))
+      : Array.from({ length: count }, (_, i) => i);
+    const size = rows.length;
+
+    let values: unknown[];
+    switch (kind) {
+      case Column.Int:
+        values = reader.deltas(size);
+        break;
+      case Column.Fixed: {
+        const scale = 10 ** reader.byte();
+        values = reader.deltas(size).map((v) => v / scale);
+        break;
+      }
+      case Column.Time:
+        values = reader.deltas(size).map((v) => new Date(v).toISOString());
+        break;
+      case Column.Float: {
+        const data = reader.take(size * 8);
+        values = Array.from({ length: size }, (_, i) => data.readDoubleLE(i * 8));
+        break;
+      }
+      case Column.Bool:
+        values = reader.bitmap(size);
+        break;
+      case Column.Str:
+      case Column.Json: {
+        let dictionary: unknown[] = Array.from({ length: reader.uvarint() }, () => reader.str());
+        if (kind === Column.Json) dictionary = dictionary.map((v) => JSON.parse(v as string));
+        values = Array.from({ length: size }, () => {
+          const index = reader.uvarint();
+          if (index >= dictionary.length) throw new WireFormatError("Dictionary index out of range");
+          return dictionary[index];
+        });
+        break;
+      }
+      default:
+        throw new WireFormatError(`Unknown column type ${kind} for ${key}`);
+    }
+    rows.forEach((row, i) => {
+      records[row][key] = values[i];
+    });
+  }
+  return records;
+}
+
+// ---------------------------------------------------------------------------
+// Messages
+// ---------------------------------------------------------------------------
+function header(kind: number) {
+  const out = new Writer();
+  for (const c of MAGIC) out.byte(c.charCodeAt(0));
+  out.byte(VERSION);
+  out.byte(kind);
+  return out;
+}
+
+function open(data: Buffer, kind: number) {
+  const reader = new Reader(data);
+  if (reader.take(MAGIC.length).toString("latin1") !== MAGIC) {
+    throw new WireFormatError("Not a compact batch");
+  }
+  const version = reader.byte();
+  if (version !== VERSION) throw new WireFormatError(`Unsupported format version ${version}`);
+  if (reader.byte() !== kind) throw new WireFormatError("Unexpected message kind");
+  return reader;
+}
+
+export function encodeReadings(sourceId: string, readings: Record<string, unknown>[]) {
+  const out = header(KIND_READINGS);
+  out.str(String(sourceId));
+  encodeRecords(out, readings);
+  return out.toBuffer();
+}
+
+export function decodeReadings(data: Buffer) {
+  const reader = open(data, KIND_READINGS);
+  const sourceId = reader.str();
+  return { sourceId, readings: decodeRecords(reader) };
+}
+
+export function encodeDevices(devices: Record<string, unknown>[], removed: string[] = [], full = true) {
+  const out = header(KIND_DEVICES);
+  out.byte(full ? 1 : 0);
+  out.uvarint(removed.length);
+  removed.forEach((id) => out.str(String(id)));
+  encodeRecords(out, devices);
+  return out.toBuffer();
+}
+
+export function decodeDevices(data: Buffer) {
+  const reader = open(data, KIND_DEVICES);
+  const full = (reader.byte() & 1) === 1;
+  const removed = Array.from({ length: reader.uvarint() }, () => reader.str());
+  return { full, removed, devices: decodeRecords(reader) };
+}
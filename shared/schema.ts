@@ -1,5 +1,5 @@
 import { sql } from "drizzle-orm";
-import { pgTable, text, varchar, timestamp, integer, jsonb, boolean } from "drizzle-orm/pg-core";
+import { pgTable, text, varchar, timestamp, integer, jsonb, boolean, uniqueIndex } from "drizzle-orm/pg-core";
 import { createInsertSchema } from "drizzle-zod";
 import { z } from "zod";
 
@@ -31,8 +31,15 @@ export const sensorData = pgTable("sensor_data", {
   temperature: integer("temperature").notNull(),
   humidity: integer("humidity").notNull(),
   soilMoisture: integer("soil_moisture").notNull(),
+  sourceId: text("source_id"), // Uploading client, for idempotent bulk ingestion
+  sequence: integer("sequence"), // Per-source sequence number of the reading
+  stats: jsonb("stats"), // Per-channel min/max/mean/stddev when the client downsamples on-device
+  brightness: integer("brightness"), // 0-100, mean brightness of the latest camera frame
+  greenCoverage: integer("green_coverage"), // 0-100, % of the latest camera frame that is foliage
   recordedAt: timestamp("recorded_at").notNull().defaultNow(),
-});
+}, (table) => [
+  uniqueIndex("sensor_data_source_sequence_idx").on(table.sourceId, table.sequence),
+]);
 
 export const calendarEvents = pgTable("calendar_events", {
   id: varchar("id").primaryKey().default(sql`gen_random_uuid()`),